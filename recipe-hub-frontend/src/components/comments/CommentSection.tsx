@@ -1,28 +1,56 @@
 // src/components/comments/CommentSection.tsx
 
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { MessageSquare, Edit, Trash2 } from 'lucide-react';
 import { Comment } from '../../types/types';
 import { useAuth } from '../../context/AuthContext';
-import { CommentService } from '../../services/api';
+import { CommentService, getCursorFromUrl } from '../../services/api';
 
 interface CommentSectionProps {
   recipeId: number;
-  recipeComments: Comment[];
+  commentCount: number;
   onCommentUpdate: () => void;
 }
 
 const CommentSection: React.FC<CommentSectionProps> = ({
   recipeId,
-  recipeComments,
+  commentCount,
   onCommentUpdate,
 }) => {
   const { user } = useAuth();
+  const [comments, setComments] = useState<Comment[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingComments, setIsLoadingComments] = useState(false);
   const [newComment, setNewComment] = useState('');
   const [editingCommentId, setEditingCommentId] = useState<number | null>(null);
   const [editContent, setEditContent] = useState('');
   const [isSubmitting, setIsSubmitting] = useState(false);
 
+  // Load a page of comments: the newest ones, or the ones after the given cursor
+  const loadComments = async (cursor: string | null = null) => {
+    setIsLoadingComments(true);
+    try {
+      const response = await CommentService.getAll(recipeId, cursor);
+      const page = response.data.results;
+      setComments((current) => (cursor ? [...current, ...page] : page));
+      setNextCursor(getCursorFromUrl(response.data.next));
+    } catch (error) {
+      console.error('Failed to load comments:', error);
+    } finally {
+      setIsLoadingComments(false);
+    }
+  };
+
+  useEffect(() => {
+    loadComments();
+  }, [recipeId]);
+
+  // After a change, reload the newest comments and let the recipe refresh its counters
+  const refreshComments = () => {
+    loadComments();
+    onCommentUpdate();
+  };
+
   const getCommentAuthorName = (author: any): string => {
     return typeof author === 'object' ? author.username : author;
   };
@@ -35,7 +63,7 @@ const CommentSection: React.FC<CommentSectionProps> = ({
     try {
       await CommentService.create(recipeId, { content: newComment.trim() });
       setNewComment('');
-      onCommentUpdate();
+      refreshComments();
     } catch (error) {
       console.error('Failed to post comment:', error);
     } finally {
@@ -50,7 +78,7 @@ const CommentSection: React.FC<CommentSectionProps> = ({
     try {
       await CommentService.update(recipeId, commentId, { content: editContent.trim() });
       setEditingCommentId(null);
-      onCommentUpdate();
+      refreshComments();
     } catch (error) {
       console.error('Failed to edit comment:', error);
     } finally {
@@ -63,7 +91,7 @@ const CommentSection: React.FC<CommentSectionProps> = ({
 
     try {
       await CommentService.delete(recipeId, commentId);
-      onCommentUpdate();
+      refreshComments();
     } catch (error) {
       console.error('Failed to delete comment:', error);
     }
@@ -86,7 +114,7 @@ const CommentSection: React.FC<CommentSectionProps> = ({
       <div className="flex items-center mb-6">
         <MessageSquare className="text-brown mr-2" />
         <h3 className="text-xl font-semibold text-brown">
-          Comments ({recipeComments.length})
+          Comments ({commentCount})
         </h3>
       </div>
 
@@ -110,7 +138,7 @@ const CommentSection: React.FC<CommentSectionProps> = ({
       </form>
 
       <div className="space-y-6">
-        {recipeComments.map((comment) => (
+        {comments.map((comment) => (
           <div key={comment.id} className="bg-white p-4 rounded-lg shadow-sm">
             <div className="flex justify-between items-start mb-2">
               <div>
@@ -178,6 +206,17 @@ const CommentSection: React.FC<CommentSectionProps> = ({
           </div>
         ))}
       </div>
+
+      {nextCursor && (
+        <button
+          onClick={() => loadComments(nextCursor)}
+          disabled={isLoadingComments}
+          className="mt-6 w-full px-4 py-2 border border-brown text-brown rounded-md
+                   hover:bg-brown hover:text-white disabled:opacity-50 transition-colors"
+        >
+          {isLoadingComments ? 'Loading...' : 'Load more comments'}
+        </button>
+      )}
     </div>
   );
 };
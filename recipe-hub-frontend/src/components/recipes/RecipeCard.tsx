@@ -2,11 +2,11 @@
 import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Clock, MessageSquare, ChevronRight, User } from 'lucide-react';
-import { Recipe } from '../../types/types';
+import { RecipeSummary } from '../../types/types';
 import { motion } from 'framer-motion';
 
 interface RecipeCardProps {
-    recipe: Recipe;
+    recipe: RecipeSummary;
     delay?: number;
 }
 
@@ -85,7 +85,7 @@ const RecipeCard: React.FC<RecipeCardProps> = ({ recipe, delay = 0 }) => {
                         </div>
                         <div className="flex items-center">
                             <MessageSquare size={16} className="mr-1" />
-                            <span>{recipe.comments?.length || 0} comments</span>
+                            <span>{recipe.comment_count || 0} comments</span>
                         </div>
                     </div>
                     <span>{formattedDate}</span>
@@ -178,7 +178,7 @@ const RecipeDetail: React.FC = () => {
                 {user ? (
                     <CommentSection
                         recipeId={recipe.id}
-                        recipeComments={recipe.comments}
+                        commentCount={recipe.comment_count}
                         onCommentUpdate={fetchRecipe}
                     />
                 ) : (
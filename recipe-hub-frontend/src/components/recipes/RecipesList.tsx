@@ -1,20 +1,30 @@
 // src/components/recipes/RecipesList.tsx
 
 import React, { useState, useEffect } from 'react';
-import { Recipe } from '../../types/types';
-import { RecipeService } from '../../services/api';
+import { RecipeSummary } from '../../types/types';
+import { RecipeService, getCursorFromUrl } from '../../services/api';
 import RecipeCard from './RecipeCard';
 import { Search, ChevronLeft, ChevronRight } from 'lucide-react';
 import { useThrottleHandler } from '../../hooks/useThrottleHandler';
-import { PaginatedResponse } from '../../types/types';
+import { PaginatedResponse, CursorPaginatedResponse } from '../../types/types';
 
-const RecipesList: React.FC = () => {
+interface RecipesListProps {
+    // 'page' shows numbered pages, 'cursor' uses the keyset paginated feed
+    // which stays fast on deep pages but only offers previous/next navigation
+    paginationMode?: 'page' | 'cursor';
+}
+
+const RecipesList: React.FC<RecipesListProps> = ({ paginationMode = 'page' }) => {
+    const isCursorMode = paginationMode === 'cursor';
     // State management for recipes and pagination
     const handleThrottleError = useThrottleHandler();
-    const [recipes, setRecipes] = useState<Recipe[]>([]);
+    const [recipes, setRecipes] = useState<RecipeSummary[]>([]);
     const [isLoading, setIsLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
     const [searchTerm, setSearchTerm] = useState('');
+    // Search term sent to the server, updated once the user stops typing
+    const [query, setQuery] = useState('');
+    const isSearching = query !== '';
     
     // Pagination state
     const [currentPage, setCurrentPage] = useState(1);
@@ -22,16 +32,37 @@ const RecipesList: React.FC = () => {
     const [totalRecipes, setTotalRecipes] = useState(0);
     const recipesPerPage = 10; // Matches backend pagination setting
 
+    // Cursor pagination state
+    const [cursor, setCursor] = useState<string | null>(null);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [previousCursor, setPreviousCursor] = useState<string | null>(null);
+
     // Fetch recipes with pagination
-    const fetchRecipes = async (page: number) => {
+    const fetchRecipes = async (page: number, pageCursor: string | null, searchQuery: string) => {
         try {
             setIsLoading(true);
-            const response = await RecipeService.getAll(page);
-            const paginatedData: PaginatedResponse<Recipe> = response.data;
-            
-            setRecipes(paginatedData.results);
-            setTotalRecipes(paginatedData.count);
-            setTotalPages(Math.ceil(paginatedData.count / recipesPerPage));
+            if (searchQuery) {
+                const response = await RecipeService.search(searchQuery, page);
+                const paginatedData: PaginatedResponse<RecipeSummary> = response.data;
+
+                setRecipes(paginatedData.results);
+                setTotalRecipes(paginatedData.count);
+                setTotalPages(Math.ceil(paginatedData.count / recipesPerPage));
+            } else if (isCursorMode) {
+                const response = await RecipeService.getFeed(pageCursor);
+                const cursorData: CursorPaginatedResponse<RecipeSummary> = response.data;
+
+                setRecipes(cursorData.results);
+                setNextCursor(getCursorFromUrl(cursorData.next));
+                setPreviousCursor(getCursorFromUrl(cursorData.previous));
+            } else {
+                const response = await RecipeService.getAll(page);
+                const paginatedData: PaginatedResponse<RecipeSummary> = response.data;
+
+                setRecipes(paginatedData.results);
+                setTotalRecipes(paginatedData.count);
+                setTotalPages(Math.ceil(paginatedData.count / recipesPerPage));
+            }
             
         } catch (error) {
             // Try to handle it as a throttle error first
@@ -47,10 +78,16 @@ const RecipesList: React.FC = () => {
         }
     };
 
-    // Fetch recipes when page changes
+    // Fetch recipes when page, cursor or search changes
+    useEffect(() => {
+        fetchRecipes(currentPage, cursor, query);
+    }, [currentPage, cursor, query]);
+
+    // Wait until the user stops typing before searching
     useEffect(() => {
-        fetchRecipes(currentPage);
-    }, [currentPage]);
+        const timeout = setTimeout(() => setQuery(searchTerm.trim()), 300);
+        return () => clearTimeout(timeout);
+    }, [searchTerm]);
 
     // Handle page navigation
     const handlePageChange = (newPage: number) => {
@@ -62,27 +99,23 @@ const RecipesList: React.FC = () => {
         }
     };
 
-    // Client-side search with pagination
+    // Handle cursor navigation
+    const handleCursorChange = (newCursor: string | null) => {
+        if (newCursor) {
+            setCursor(newCursor);
+            window.scrollTo(0, 0);
+        }
+    };
+
+    // Server-side full-text search with pagination
     const handleSearch = (searchValue: string) => {
         setSearchTerm(searchValue);
         // Reset to first page when searching
         setCurrentPage(1);
     };
 
-    // Filter recipes based on search term
-    const filteredRecipes = recipes.filter(recipe => {
-        const searchLower = searchTerm.toLowerCase();
-        return (
-            recipe.title.toLowerCase().includes(searchLower) ||
-            recipe.description.toLowerCase().includes(searchLower) ||
-            (typeof recipe.author === 'object' 
-                ? recipe.author.username.toLowerCase().includes(searchLower)
-                : recipe.author.toLowerCase().includes(searchLower))
-        );
-    });
-
     // Loading state
-    if (isLoading && currentPage === 1) {
+    if (isLoading && currentPage === 1 && cursor === null && !searchTerm) {
         return (
             <div className="flex justify-center items-center min-h-[50vh]">
                 <div className="text-brown text-xl animate-pulse">
@@ -128,7 +161,7 @@ const RecipesList: React.FC = () => {
             </div>
 
             {/* Recipes Grid */}
-            {filteredRecipes.length === 0 ? (
+            {recipes.length === 0 ? (
                 <div className="text-center py-8 text-brown">
                     {searchTerm 
                         ? 'No recipes found matching your search.'
@@ -137,7 +170,7 @@ const RecipesList: React.FC = () => {
             ) : (
                 <>
                     <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-                        {filteredRecipes.map((recipe, index) => (
+                        {recipes.map((recipe, index) => (
                             <RecipeCard
                                 key={recipe.id}
                                 recipe={recipe}
@@ -146,7 +179,34 @@ const RecipesList: React.FC = () => {
                         ))}
                     </div>
 
-                    {/* Pagination Controls */}
+                    {/* Cursor Pagination Controls */}
+                    {isCursorMode && !isSearching ? (
+                    <div className="mt-8 flex items-center justify-end space-x-2 border-t border-tan pt-4">
+                        <button
+                            onClick={() => handleCursorChange(previousCursor)}
+                            disabled={!previousCursor}
+                            className={`p-2 rounded-md ${
+                                !previousCursor
+                                    ? 'text-gray-400 cursor-not-allowed'
+                                    : 'text-brown hover:bg-brown hover:text-white'
+                            } transition-colors`}
+                        >
+                            <ChevronLeft size={20} />
+                        </button>
+                        <button
+                            onClick={() => handleCursorChange(nextCursor)}
+                            disabled={!nextCursor}
+                            className={`p-2 rounded-md ${
+                                !nextCursor
+                                    ? 'text-gray-400 cursor-not-allowed'
+                                    : 'text-brown hover:bg-brown hover:text-white'
+                            } transition-colors`}
+                        >
+                            <ChevronRight size={20} />
+                        </button>
+                    </div>
+                    ) : (
+                    /* Pagination Controls */
                     <div className="mt-8 flex items-center justify-between border-t border-tan pt-4">
                         <div className="flex items-center">
                             <p className="text-sm text-tan">
@@ -201,6 +261,7 @@ const RecipesList: React.FC = () => {
                             </button>
                         </div>
                     </div>
+                    )}
                 </>
             )}
         </div>
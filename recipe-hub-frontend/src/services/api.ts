@@ -1,7 +1,7 @@
 // src/services/api.ts
 
-import axios from 'axios';
-import { Recipe, PaginatedResponse } from '../types/types';
+import axios, { AxiosResponse, InternalAxiosRequestConfig } from 'axios';
+import { Recipe, RecipeSummary, Comment, PaginatedResponse, CursorPaginatedResponse } from '../types/types';
 import { useNavigate } from 'react-router-dom';
 import { useCallback } from 'react';
 import { AxiosError } from 'axios';
@@ -18,6 +18,47 @@ const publicApi = axios.create({
     baseURL: API_URL,
 });
 
+// Here we remember the ETag and body of every GET response, so that repeat
+// requests can be revalidated with If-None-Match. When nothing changed the
+// server answers with an empty 304 and we reuse the stored body.
+const etagCache = new Map<string, { etag: string; data: unknown }>();
+
+const getEtagCacheKey = (config: InternalAxiosRequestConfig) =>
+    [config.baseURL, config.url, JSON.stringify(config.params ?? {}), config.headers?.Authorization ?? ''].join('|');
+
+const addValidators = (config: InternalAxiosRequestConfig) => {
+    if (config.method === 'get') {
+        const cached = etagCache.get(getEtagCacheKey(config));
+        if (cached) {
+            config.headers['If-None-Match'] = cached.etag;
+        }
+        config.validateStatus = (status) => (status >= 200 && status < 300) || status === 304;
+    }
+    return config;
+};
+
+const restoreNotModifiedResponse = (response: AxiosResponse) => {
+    if (response.config.method !== 'get') return response;
+    const key = getEtagCacheKey(response.config);
+    if (response.status === 304) {
+        const cached = etagCache.get(key);
+        if (cached) {
+            response.data = cached.data;
+            response.status = 200;
+        }
+    } else if (response.headers.etag) {
+        etagCache.set(key, { etag: response.headers.etag, data: response.data });
+    }
+    return response;
+};
+
+// Request interceptors run in reverse order of registration, so the validators
+// are added after the token below has been set (the token is part of the cache key)
+api.interceptors.request.use(addValidators);
+publicApi.interceptors.request.use(addValidators);
+api.interceptors.response.use(restoreNotModifiedResponse);
+publicApi.interceptors.response.use(restoreNotModifiedResponse);
+
 // Here we add token to requests if it exists, but only for authenticated api instance
 api.interceptors.request.use((config) => {
     const token = localStorage.getItem('token');
@@ -28,6 +69,10 @@ api.interceptors.request.use((config) => {
     return config;
 });
 
+// Here we extract the cursor query parameter from a next/previous link
+export const getCursorFromUrl = (url: string | null): string | null =>
+    url ? new URL(url).searchParams.get('cursor') : null;
+
 export const useThrottleHandler = () => {
     const navigate = useNavigate();
   
@@ -59,10 +104,22 @@ type RecipeUpdateData = {
 export const RecipeService = {
     // Public endpoints use publicApi
     getAll: (page: number = 1) => 
-        publicApi.get<PaginatedResponse<Recipe>>(`/recipes/?page=${page}`),
-    getOne: (id: number) => publicApi.get<Recipe>(`/recipes/${id}/`),
+        publicApi.get<PaginatedResponse<RecipeSummary>>(`/recipes/?page=${page}`),
+    // Cursor (keyset) paginated feed - pass the cursor taken from a previous response
+    getFeed: (cursor: string | null = null) =>
+        publicApi.get<CursorPaginatedResponse<RecipeSummary>>('/recipes/', {
+            params: cursor ? { pagination: 'cursor', cursor } : { pagination: 'cursor' },
+        }),
+    // Full-text search, best matches first
+    search: (query: string, page: number = 1) =>
+        publicApi.get<PaginatedResponse<RecipeSummary>>('/recipes/search/', {
+            params: { q: query, page },
+        }),
+    // Comments are loaded in pages by the comment section, so they aren't embedded
+    getOne: (id: number) =>
+        publicApi.get<Recipe>(`/recipes/${id}/`, { params: { expand: 'author' } }),
     // Protected endpoints use authenticated api
-    create: (recipe: Omit<Recipe, 'id' | 'comments'>) => 
+    create: (recipe: Omit<Recipe, 'id' | 'comments' | 'comment_count'>) => 
         api.post<Recipe>('/recipes/', recipe),
     update: (id: number, recipe: RecipeUpdateData) =>
         api.put<Recipe>(`/recipes/${id}/`, recipe),
@@ -70,6 +127,11 @@ export const RecipeService = {
 };
 
 export const CommentService = {
+    // Newest comments first, in cursor paginated pages
+    getAll: (recipeId: number, cursor: string | null = null) =>
+        api.get<CursorPaginatedResponse<Comment>>(`/recipes/${recipeId}/comments/`, {
+            params: cursor ? { cursor } : {},
+        }),
     create: (recipeId: number, comment: { content: string }) =>
         api.post(`/recipes/${recipeId}/comments/`, comment),
     update: (recipeId: number, commentId: number, comment: { content: string }) =>
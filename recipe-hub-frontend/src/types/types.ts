@@ -64,15 +64,38 @@ export interface Recipe {
   created_at: string;
   updated_at: string;
   author: string | { username: string; id: number; email: string };
-  comments: Comment[];
+  // Only sent when expanded (?expand=comments)
+  comments?: Comment[];
+  comment_count: number;
   average_difficulty: number;
   user_rating: number | null;
   difficulty_ratings?: DifficultyRating[];
 }
 
+// Lightweight recipe representation returned by the recipes list endpoint
+export interface RecipeSummary {
+  id: number;
+  title: string;
+  description: string; // Excerpt of the full description
+  cooking_time: number;
+  created_at: string;
+  updated_at: string;
+  author: string | { username: string; id: number; email: string };
+  comment_count: number;
+  average_difficulty: number;
+  user_rating: number | null;
+}
+
 export interface PaginatedResponse<T> {
   count: number;
   next: string | null;
   previous: string | null;
   results: T[];
-}
\ No newline at end of file
+}
+
+// Response shape of the recipes list when requested with ?pagination=cursor
+export interface CursorPaginatedResponse<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
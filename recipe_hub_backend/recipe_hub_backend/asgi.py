@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recipe_hub_backend.settings')
+# Serve the API reads with async views (see recipes/api/async_views.py)
+os.environ.setdefault('ASYNC_READS', 'True')
 
 application = get_asgi_application()
@@ -57,6 +57,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that the measured latency covers the other middleware
+    'recipes.middleware.RequestMetricsMiddleware',
+    # Before the middleware reading or changing the response body, and inside the
+    # metrics so that they record the compressed size
+    'recipes.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -106,6 +111,22 @@ WSGI_APPLICATION = 'recipe_hub_backend.wsgi.application'
 #     }
 # }
 
+# Serve the recipe, comment and rating list/detail reads with async views
+# (see recipes/api/async_views.py). Only useful under ASGI, where asgi.py
+# turns it on; under WSGI the sync views are cheaper.
+RECIPE_ASYNC_READS = os.getenv('ASYNC_READS', 'False').lower() in ('true', '1', 'yes')
+
+# Persistent connections: every worker thread keeps its database connection open for
+# DB_CONN_MAX_AGE seconds and reuses it for the following requests, instead of paying
+# for a new TCP connection and MySQL authentication on each one. 0 closes the connection
+# after every request, None never closes it. Keep it below MySQL's wait_timeout.
+# With DB_CONN_HEALTH_CHECKS, a reused connection is checked at the start of each
+# request and replaced if the server has dropped it (restart, failover, timeout).
+# Under ASGI (RECIPE_ASYNC_READS) connections are not reused, as queries run in
+# short-lived threads that would leave them open: they are closed after every request.
+DB_CONN_MAX_AGE = '0' if RECIPE_ASYNC_READS else os.getenv('DB_CONN_MAX_AGE', '60')
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
@@ -114,9 +135,35 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        'CONN_MAX_AGE': None if DB_CONN_MAX_AGE == 'None' else int(DB_CONN_MAX_AGE),
+        'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS.lower() in ('true', '1', 'yes'),
     }
 }
 
+# Read replicas (see recipes/routers.py): read-only API requests run their queries on
+# one of DATABASE_REPLICAS. DB_REPLICA_HOSTS lists the replica servers as
+# "host[:port]", comma separated; they use the primary's database name and credentials
+# unless DB_REPLICA_USER/DB_REPLICA_PASSWORD are set. Without replicas everything
+# goes to 'default'. Never run migrate against a replica.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        # Tests read the replicas' data from the test primary
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+DATABASE_ROUTERS = ['recipes.routers.ReplicaRouter']
+# After a write, the user's reads stay on the primary for this many seconds so that
+# replication lag never hides their own changes. Pins live in a cache shared by all workers.
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', '5'))
+DATABASE_REPLICA_CACHE_ALIAS = 'api_responses'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -165,8 +212,9 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.SessionAuthentication',  # Browserable authentication
+        # simplejwt/DRF classes with async variants for the async read views
+        'recipes.api.authentication.JWTAuthentication',
+        'recipes.api.authentication.SessionAuthentication',  # Browserable authentication
     ),
     'DEFAULT_THROTTLE_CLASSES': [
         'recipes.api.throttling.RecipeUserThrottle',
@@ -177,6 +225,61 @@ REST_FRAMEWORK = {
         'anon': '3/minute',
     },
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # JSON with orjson when available (see recipes/api/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'recipes.api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'recipes.api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# JSON library encoding API responses and parsing request bodies: 'orjson', which
+# falls back to the stdlib when orjson isn't installed, or 'json' for the stdlib
+RECIPE_JSON_BACKEND = os.getenv('JSON_BACKEND', 'orjson')
+
+# Caches
+# 'api_responses' holds the anonymous recipe list/detail responses (see recipes/api/cache.py).
+# It has to be shared by all worker processes so that a write handled by one worker
+# invalidates the entries of all others: the file based cache covers a single host,
+# use a Redis cache when serving from several hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api_responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('RESPONSE_CACHE_DIR', BASE_DIR / 'response_cache'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Shared by all worker processes, so that a change to a user reaches all of them
+    # (see recipes/api/users.py). For several hosts, use a Redis or Memcached cache.
+    'users': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('USER_CACHE_DIR', BASE_DIR / 'user_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+RECIPE_RESPONSE_CACHE_ALIAS = 'api_responses'
+
+# Shared storage for the API throttle counters (see recipes/api/throttling.py).
+# It must be shared by all worker processes, otherwise each worker enforces
+# the rate limits on its own. The SQLite file covers workers on a single host;
+# for several hosts use 'recipes.api.throttling.CacheThrottleStore' with
+# OPTIONS {'alias': '<cache alias>'} pointing at a Redis cache.
+RECIPE_THROTTLE_STORE = {
+    'BACKEND': 'recipes.api.throttling.SQLiteThrottleStore',
+    'OPTIONS': {
+        'path': os.getenv('THROTTLE_DB_PATH', BASE_DIR / 'throttle.sqlite3'),
+    },
 }
 
 REST_AUTH = {
@@ -203,17 +306,44 @@ SIMPLE_JWT = {
 
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
-    'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_USER_CLASS': 'recipes.api.authentication.TokenUser',
+    # Access tokens carry the user claims request.user is built from (see recipes/api/tokens.py)
+    'TOKEN_OBTAIN_SERIALIZER': 'recipes.api.tokens.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'recipes.api.tokens.TokenRefreshSerializer',
 
     'JTI_CLAIM': 'jti',
 }
 
+# Authenticate API requests from the access token's claims, without loading the user
+# (see recipes/api/authentication.py). Deactivating a user then takes effect when their
+# access token expires.
+RECIPE_JWT_STATELESS = os.getenv('JWT_STATELESS_AUTH', 'True').lower() in ('true', '1', 'yes')
+# Cache of the User rows still needed by some requests (see recipes/api/users.py)
+RECIPE_USER_CACHE_ALIAS = 'users'
+RECIPE_USER_CACHE_SECONDS = int(os.getenv('USER_CACHE_SECONDS', '60'))
+
+# Half-life of the activity counted by the trending feed, in hours (see recipes/trending.py).
+# Rebuild the scores with `manage.py rebuild_trending_scores` after changing it.
+RECIPE_TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', '48'))
+
+# API responses smaller than this many bytes are sent uncompressed (see recipes/compression.py)
+RECIPE_COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+
+# Request metrics exposed at /metrics (see recipes/metrics.py): share of the requests
+# measured, from 0 (off) to 1 (all), and number of SQL queries above which a request
+# is logged as a warning (0 to never warn). /metrics requires METRICS_TOKEN as a
+# bearer token, or a staff user's admin session: without a token, it is not
+# found for anyone else.
+RECIPE_METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '1'))
+RECIPE_METRICS_QUERY_WARNING = int(os.getenv('METRICS_QUERY_WARNING', '30'))
+RECIPE_METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # React Vite's default port
 ]
 CORS_ALLOW_CREDENTIALS = True
-CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken', 'ETag', 'Last-Modified']
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
@@ -228,6 +358,8 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'if-modified-since',
+    'if-none-match',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -1,7 +1,7 @@
 # recipe_hub_backend\recipes\admin.py
 
 from django.contrib import admin
-from .models import Recipe, Comment, DifficultyRating
+from .models import Recipe, Ingredient, Comment, DifficultyRating
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
@@ -20,13 +20,22 @@ class RecipeAdmin(admin.ModelAdmin):
         ('Recipe Details', {
             'fields': ('ingredients', 'instructions', 'cooking_time')
         }),
+        ('Statistics', {
+            'fields': ('comment_count', 'rating_count', 'rating_sum'),
+            'classes': ('collapse',)
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)  # This makes this section collapsible
         }),
     )
-    # Make timestamp fields read-only since they're auto-generated
-    readonly_fields = ('created_at', 'updated_at')
+    # Make timestamp and aggregate fields read-only since they're auto-generated
+    readonly_fields = ('created_at', 'updated_at', 'comment_count', 'rating_count', 'rating_sum')
+
+@admin.register(Ingredient)
+class IngredientAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -0,0 +1,199 @@
+# recipes/api/async_views.py
+
+'''
+Async (ASGI native) read path for the recipe API.
+
+DRF views are synchronous: under ASGI, Django runs each of them in a worker
+thread, so every request in flight holds a thread for its whole duration,
+including the time spent waiting on the database.
+
+With RECIPE_ASYNC_READS enabled, the GET/HEAD list and retrieve actions of the
+viewsets below are served by coroutines instead. Authentication runs on the
+event loop: access tokens carry the user's claims (see recipes/api/tokens.py),
+and session users are loaded through the async ORM. The page or object is
+loaded with acount()/aget()/async iteration. Serializing and rendering are CPU
+work and run inline as well, and the response is handed to Django already
+rendered, so it does not hop to a thread to render it either.
+
+Some steps still hop to a worker thread, on purpose. The throttle store is a
+SQLite file or a cache, and the response and user caches are file caches:
+neither SQLite nor Django's cache backends have an async API that doesn't
+block (their a* methods run the sync ones in a thread too). So the rest of
+initial() (permissions, throttling, the replica pin lookup) runs in a worker
+thread, in a single hop per request, and so do the reads and writes of the
+response cache (anonymous requests) and of the user cache (tokens without
+user claims).
+
+Requests the async path can't serve exactly like the sync one (writes,
+non-JSON renderers such as the browsable API, format suffixes, authenticators
+without aauthenticate) are passed on to the regular sync view.
+'''
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.urls import URLPattern
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+class AsyncReadMixin:
+    """
+    ViewSet mixin adding async variants of the list and retrieve actions
+    (alist/aretrieve), served by the view from as_async_read_view.
+    Mixins wrapping list/retrieve wrap alist/aretrieve the same way.
+    """
+    async_actions = ('list', 'retrieve')
+
+    @classmethod
+    def as_async_read_view(cls, view):
+        """
+        Wrap a sync view built by as_view() into an async view serving the
+        read actions natively and passing everything else to the sync view.
+        """
+        actions = view.actions
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            if request.method in ('GET', 'HEAD') and actions.get('get') in cls.async_actions:
+                # Set up the viewset like ViewSetMixin.as_view() does
+                if 'head' not in actions:
+                    actions['head'] = actions['get']
+                self = cls(**view.initkwargs)
+                self.action_map = actions
+                for method, action in actions.items():
+                    setattr(self, method, getattr(self, action))
+                response = await self.adispatch(request, *args, **kwargs)
+                if response is not None:
+                    return response
+            return await sync_view(request, *args, **kwargs)
+
+        async_view.cls = cls
+        async_view.initkwargs = view.initkwargs
+        async_view.actions = actions
+        async_view.csrf_exempt = True
+        return async_view
+
+    def supports_async(self, request):
+        """Whether the async path serves this request exactly like the sync one"""
+        self.format_kwarg = self.get_format_suffix(**self.kwargs)
+        if self.action not in self.async_actions or self.format_kwarg:
+            return False
+        if not all(hasattr(authenticator, 'aauthenticate') for authenticator in request.authenticators):
+            return False
+        try:
+            renderer, media_type = self.perform_content_negotiation(request)
+        except exceptions.NotAcceptable:
+            return False
+        return isinstance(renderer, JSONRenderer)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """
+        Async counterpart of dispatch(), for the read actions. Returns None,
+        before doing any work, if the request has to go through the sync view.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        if not self.supports_async(request):
+            return None
+        self.headers = self.default_response_headers
+
+        try:
+            await self.aperform_authentication(request)
+            # The user is known, so initial() doesn't authenticate again
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, f'a{self.action}')
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return render_response(self.response)
+
+    async def aperform_authentication(self, request):
+        """Async counterpart of Request._authenticate"""
+        for authenticator in request.authenticators:
+            try:
+                user_auth_tuple = await authenticator.aauthenticate(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+
+        request._not_authenticated()
+
+    async def aget_object(self):
+        """Async counterpart of get_object"""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            obj = await queryset.aget(**filter_kwargs)
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        """Async counterpart of paginate_queryset"""
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        objects = [obj async for obj in queryset]
+        self.served_objects = objects
+        serializer = self.get_serializer(objects, many=True)
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+
+def render_response(response):
+    """
+    Render a DRF response into a plain HttpResponse. Django's async handler
+    renders responses that still have a render() method in a worker thread.
+    """
+    if not hasattr(response, 'render'):
+        return response
+    response.render()
+    rendered = HttpResponse(response.content, status=response.status_code, headers=response.headers)
+    rendered.cookies = response.cookies
+    return rendered
+
+
+def with_async_reads(urlpatterns):
+    """
+    Return the URL patterns (e.g. a router's urls) with the views of AsyncReadMixin viewsets
+    replaced by their async read views (see AsyncReadMixin.as_async_read_view).
+    """
+    patterns = []
+    for pattern in urlpatterns:
+        viewset = getattr(pattern.callback, 'cls', None)
+        if isinstance(viewset, type) and issubclass(viewset, AsyncReadMixin) \
+                and getattr(pattern.callback, 'actions', None):
+            pattern = URLPattern(
+                pattern.pattern,
+                viewset.as_async_read_view(pattern.callback),
+                pattern.default_args,
+                pattern.name,
+            )
+        patterns.append(pattern)
+    return patterns
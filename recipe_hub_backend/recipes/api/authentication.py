@@ -0,0 +1,123 @@
+# recipes/api/authentication.py
+
+'''
+Authentication classes of the recipe API.
+
+They behave like the DRF/simplejwt classes they extend, and add an
+aauthenticate() coroutine used by the async read views (see
+recipes/api/async_views.py), which doesn't block the event loop.
+
+With RECIPE_JWT_STATELESS, JWTAuthentication builds request.user from the
+claims of the access token (see recipes/api/tokens.py) instead of loading the
+User row on every request. The trade-off is that a deactivated user keeps
+access until their access token expires. Tokens issued without the claims
+are served from the user cache (see recipes/api/users.py).
+'''
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication
+from rest_framework_simplejwt import authentication as jwt_authentication, models
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .tokens import has_user_claims
+from .users import aget_cached_user, get_cached_user
+
+
+class TokenUser(models.TokenUser):
+    """
+    User built from the claims of an access token: id, username and is_staff.
+    Use get_full_user() where the User model instance is needed.
+    """
+    def get_user(self):
+        """Return the User model instance, from the user cache"""
+        user = get_cached_user(self.id)
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        return user
+
+
+def get_full_user(user):
+    """Return the User model instance of an authenticated request.user"""
+    return user.get_user() if isinstance(user, TokenUser) else user
+
+
+class JWTAuthentication(jwt_authentication.JWTAuthentication):
+    """simplejwt's JWTAuthentication, stateless and with an async variant"""
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        # Decoding and verifying the token is CPU work only
+        validated_token = self.get_validated_token(raw_token)
+
+        return await self.aget_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        if not settings.RECIPE_JWT_STATELESS:
+            return super().get_user(validated_token)
+        if has_user_claims(validated_token):
+            return self.get_token_user(validated_token)
+        return self.check_user(get_cached_user(self.get_user_id(validated_token)), validated_token)
+
+    async def aget_user(self, validated_token):
+        """Async counterpart of get_user"""
+        user_id = self.get_user_id(validated_token)
+        if not settings.RECIPE_JWT_STATELESS:
+            user = await self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).afirst()
+            return self.check_user(user, validated_token)
+        if has_user_claims(validated_token):
+            return self.get_token_user(validated_token)
+        return self.check_user(await aget_cached_user(user_id), validated_token)
+
+    def get_token_user(self, validated_token):
+        # Validates the user id claim
+        self.get_user_id(validated_token)
+        return api_settings.TOKEN_USER_CLASS(validated_token)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def check_user(self, user, validated_token):
+        """The checks simplejwt's get_user runs on the loaded user"""
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+class SessionAuthentication(authentication.SessionAuthentication):
+    """DRF's SessionAuthentication, with an async variant"""
+    async def aauthenticate(self, request):
+        # Set by AuthenticationMiddleware, loads the session and user without blocking
+        auser = getattr(request._request, 'auser', None)
+        if auser is None:
+            return None
+        user = await auser()
+
+        if not user or not user.is_active:
+            return None
+
+        self.enforce_csrf(request)
+        return (user, None)
@@ -0,0 +1,232 @@
+# recipes/api/cache.py
+
+'''
+Response cache for anonymous recipe reads.
+
+Anonymous GET requests for the recipe list and recipe details return the same
+body for every caller, so their serialized data is cached and served without
+touching the database. Cache keys embed a generation number; every successful
+write to recipes, comments or ratings bumps the generation (after the
+transaction commits), so entries written before the change are never looked
+up again and simply expire.
+
+JSON responses are stored rendered, along with their gzip/brotli compressed
+versions when they are large enough to be compressed (see
+recipes/compression.py): hits neither render nor compress anything. Other
+formats (the browsable API) are stored as data and rendered per hit.
+'''
+
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.http import parse_http_date_safe
+from rest_framework import permissions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from ..compression import choose_encoding, compress, get_encodings, set_encoding_headers
+from .conditional import not_modified_response
+
+GENERATION_KEY = 'recipes:generation'
+
+
+def get_response_cache():
+    """Return the cache holding API responses (RECIPE_RESPONSE_CACHE_ALIAS setting)"""
+    return caches[settings.RECIPE_RESPONSE_CACHE_ALIAS]
+
+
+def get_generation():
+    """Return the current cache generation, starting a new one if none is stored"""
+    cache = get_response_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def bump_generation():
+    """Invalidate all cached responses by moving on to a new generation"""
+    cache = get_response_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 2, timeout=None)
+
+
+class CacheStats:
+    """Hit/miss counters of the response cache in this process"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+    def reset(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+
+
+cache_stats = CacheStats()
+
+
+class AnonymousResponseCacheMixin:
+    """
+    ViewSet mixin that serves anonymous list/retrieve requests from the
+    response cache. Entries are keyed by the full request path, so every page,
+    cursor and recipe gets its own entry. They keep the response's ETag and
+    Last-Modified headers, so conditional requests are answered from the
+    cache as well.
+    """
+    cached_actions = ('list', 'retrieve')
+
+    def get_response_cache_key(self, request):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        renderer = request.accepted_renderer.format
+        return f'recipes:{get_generation()}:{self.basename}:{self.action}:{renderer}:{path}'
+
+    def is_response_cacheable(self, request):
+        return (
+            self.action in self.cached_actions
+            and request.method == 'GET'
+            and not request.user.is_authenticated
+        )
+
+    def dispatch_cached(self, handler, request, *args, **kwargs):
+        """Return the cached response for this request, or build and store it"""
+        if not self.is_response_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        key, response = self.get_cached_response(request)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            self.store_response(key, response)
+        return response
+
+    async def adispatch_cached(self, handler, request, *args, **kwargs):
+        """
+        Async counterpart of dispatch_cached, for async handlers. The response
+        cache is read and written in a worker thread: it is a file cache.
+        """
+        if not self.is_response_cacheable(request):
+            return await handler(request, *args, **kwargs)
+
+        key, response = await sync_to_async(self.get_cached_response)(request)
+        if response is None:
+            response = await handler(request, *args, **kwargs)
+            await sync_to_async(self.store_response)(key, response)
+        return response
+
+    def get_cached_response(self, request):
+        """Return the cache key of this request and the cached response, or None on a miss"""
+        key = self.get_response_cache_key(request)
+        entry = get_response_cache().get(key)
+        cache_stats.record(hit=entry is not None)
+        if entry is None:
+            return key, None
+        return key, self.build_cached_response(request, entry)
+
+    def store_response(self, key, response):
+        """Store a freshly built response under the given key"""
+        if response.status_code == 200:
+            get_response_cache().set(key, {
+                **self.get_cached_body(response),
+                'headers': {
+                    header: response[header]
+                    for header in ('ETag', 'Last-Modified', 'Vary') if response.has_header(header)
+                },
+            })
+        response['X-Cache'] = 'MISS'
+
+    def get_cached_body(self, response):
+        """
+        The body of a response to store: rendered and compressed for JSON,
+        the data for other formats, whose rendering depends on the request
+        (e.g. the CSRF token of the browsable API's forms)
+        """
+        request = self.request
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return {'data': response.data}
+        # Rendered here as finalize_response() would have it, and only once
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
+        content = response.content
+        encoded = {}
+        if len(content) >= settings.RECIPE_COMPRESSION_MIN_SIZE:
+            for encoding in get_encodings():
+                compressed = compress(content, encoding)
+                if len(compressed) < len(content):
+                    encoded[encoding] = compressed
+        return {'content': content, 'content_type': response['Content-Type'], 'encoded': encoded}
+
+    def build_cached_response(self, request, entry):
+        """Build the response for a cache hit, honouring conditional request headers"""
+        headers = entry['headers']
+        if 'ETag' in headers:
+            last_modified = parse_http_date_safe(headers.get('Last-Modified', ''))
+            response = not_modified_response(
+                request,
+                headers['ETag'],
+                datetime.fromtimestamp(last_modified, tz=timezone.utc) if last_modified else None
+            )
+            if response is not None:
+                response['X-Cache'] = 'HIT'
+                return response
+        if 'content' not in entry:
+            return Response(entry['data'], headers={**headers, 'X-Cache': 'HIT'})
+
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), tuple(entry['encoded']))
+        content = entry['encoded'][encoding] if encoding else entry['content']
+        response = HttpResponse(content, content_type=entry['content_type'], headers={**headers, 'X-Cache': 'HIT'})
+        if entry['encoded']:
+            set_encoding_headers(response, encoding)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.dispatch_cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.dispatch_cached(super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.adispatch_cached(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.adispatch_cached(super().aretrieve, request, *args, **kwargs)
+
+
+class InvalidateResponseCacheMixin:
+    """
+    ViewSet mixin that invalidates the response cache after every successful
+    write handled by the viewset.
+    """
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in permissions.SAFE_METHODS and response.status_code < 400:
+            # Bump only once the write is visible to other connections, otherwise
+            # a concurrent read could cache the old data under the new generation
+            transaction.on_commit(bump_generation)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,226 @@
+# recipes/api/compiled.py
+
+'''
+Compiled read path for list responses.
+
+DRF serializes a list object by object and field by field: every row becomes
+a model instance, and every value goes through the field's get_attribute()
+and to_representation(). Once the queries are in shape, this is most of the
+CPU time of the recipe, comment and rating lists.
+
+CompiledReadMixin serves the list actions with a compiled serializer
+instead, built once per request from the serializer the view would use, so
+?fields=/?expand= apply. The rows are read with values_list(), holding just
+the columns the fields read, and the output is built column by column with
+converters picked per field ahead of time. Datetimes are formatted a whole
+column at a time. The output is the data the serializer would produce, so
+the JSON is byte-identical (see CompiledSerializerParityTests).
+
+Fields that aren't plain columns are compiled through compile_<field name>()
+hooks of the serializer, returning the columns the field reads and a
+function build(context, *column_values) returning the field's values for all
+rows (see UserRatingMixin.compile_user_rating). Serializers with a field
+that can't be compiled (nested lists, sources spanning relations, method
+fields and properties without a hook) keep the regular path, as do the
+browsable API and the other non-JSON formats.
+'''
+
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from ..metrics import timed_serialization
+
+# Fields whose to_representation() returns the value read from the database as is
+PLAIN_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.EmailField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+
+
+class NotCompilable(Exception):
+    """A serializer field without a compiled counterpart"""
+
+
+class CompiledSerializer:
+    """
+    Builds the representation of values_list() rows holding `columns`, like
+    a serializer would for the corresponding objects.
+    """
+    def __init__(self, columns, names, builders):
+        self.columns = columns
+        self.names = names
+        self.builders = builders
+
+    def to_representation(self, rows, context):
+        if not rows:
+            return []
+        values = dict(zip(self.columns, zip(*rows)))
+        fields = [build(values, context) for build in self.builders]
+        names = self.names
+        return [dict(zip(names, row)) for row in zip(*fields)]
+
+
+class CompiledRows:
+    """The result of CompiledReadMixin.get_serializer(rows, many=True), with its .data"""
+    def __init__(self, rows, compiled, context):
+        self.rows = rows
+        self.compiled = compiled
+        self.context = context
+
+    @property
+    def data(self):
+        with timed_serialization():
+            return self.compiled.to_representation(self.rows, self.context)
+
+
+# {(serializer class, field selection, available columns, required columns): CompiledSerializer or None}
+compiled_serializers = {}
+
+
+def compile_serializer(serializer, available):
+    """
+    Compile a model serializer for values_list() rows, reading the available
+    columns (model fields and annotations) of the queryset.
+    Raises NotCompilable if a field can't be compiled.
+    """
+    columns = []
+    names, builders = compile_fields(serializer, available, '', columns)
+    return CompiledSerializer(columns, names, builders)
+
+
+def compile_fields(serializer, available, prefix, columns):
+    """Return the names and builders of a serializer's fields, adding the columns they read"""
+    names, builders = [], []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        names.append(name)
+        builders.append(compile_field(serializer, field, available, prefix, columns))
+    return names, builders
+
+
+def use_column(columns, column):
+    if column not in columns:
+        columns.append(column)
+    return column
+
+
+def compile_field(serializer, field, available, prefix, columns):
+    """Return a function building the field's values from the row columns and the context"""
+    hook = getattr(serializer, f'compile_{field.field_name}', None)
+    if hook is not None:
+        sources, build = hook()
+        sources = [use_column(columns, prefix + source) for source in sources]
+        return lambda values, context: build(context, *(values[source] for source in sources))
+
+    if isinstance(field, serializers.ListSerializer) or len(field.source_attrs) != 1:
+        raise NotCompilable(f'{type(serializer).__name__}.{field.field_name} can\'t be compiled')
+    if field.source not in available:
+        raise NotCompilable(f'{type(serializer).__name__}.{field.field_name} reads no column')
+    column = prefix + field.source
+
+    if isinstance(field, serializers.ModelSerializer):
+        # Nested to-one relation, None when the foreign key is
+        model = field.Meta.model
+        nested_available = {nested.name for nested in model._meta.concrete_fields}
+        names, builders = compile_fields(field, nested_available, column + '__', columns)
+        key = use_column(columns, column)
+
+        def build_nested(values, context):
+            rows = zip(*(build(values, context) for build in builders))
+            return [None if pk is None else dict(zip(names, row)) for pk, row in zip(values[key], rows)]
+        return build_nested
+
+    use_column(columns, column)
+    if type(field) in PLAIN_FIELDS or (type(field) is serializers.PrimaryKeyRelatedField and field.pk_field is None):
+        # values_list() reads foreign keys as the related primary key
+        return lambda values, context: values[column]
+    if type(field) is serializers.DateTimeField and is_iso_8601(field):
+        return lambda values, context: format_datetimes(values[column], field)
+    if type(field) is serializers.FloatField:
+        convert = float
+    else:
+        convert = field.to_representation
+    return lambda values, context: [None if value is None else convert(value) for value in values[column]]
+
+
+def is_iso_8601(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    return isinstance(output_format, str) and output_format.lower() == ISO_8601
+
+
+def format_datetimes(values, field):
+    """
+    The ISO 8601 representation of a column of datetimes, like
+    DateTimeField.to_representation() but looking the time zone up once
+    """
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None:
+        return [None if value is None else field.to_representation(value) for value in values]
+    formatted = []
+    for value in values:
+        if not value:
+            formatted.append(None)
+            continue
+        if timezone.is_naive(value):
+            formatted.append(field.to_representation(value))
+            continue
+        if value.tzinfo is not field_timezone:
+            value = value.astimezone(field_timezone)
+        text = value.isoformat()
+        formatted.append(text[:-6] + 'Z' if text.endswith('+00:00') else text)
+    return formatted
+
+
+class CompiledReadMixin:
+    """
+    ViewSet mixin serving the compiled_actions with a compiled serializer.
+    The viewset passes its queryset through get_compiled_queryset(), which
+    turns it into values_list() rows when the serializer compiles. It must
+    come before FieldSelectionMixin, whose required_columns are read too.
+    Compiled serializers are kept per serializer class, field selection and
+    queryset columns, so compile hooks mustn't depend on the serializer's
+    context: build() gets it instead.
+    """
+    compiled_actions = ('list',)
+    compiled_serializer = None
+
+    def get_compiled_queryset(self, queryset):
+        """The queryset, or its named values_list() rows for the compiled serializer"""
+        if self.action not in self.compiled_actions:
+            return queryset
+        if not isinstance(getattr(self.request, 'accepted_renderer', None), JSONRenderer):
+            return queryset
+        available = frozenset(
+            {field.name for field in queryset.model._meta.concrete_fields} | set(queryset.query.annotations)
+        )
+        selection = getattr(self, 'field_selection', None)
+        key = (
+            self.get_serializer_class(),
+            selection and (selection.fields, frozenset(selection.expanded)),
+            available,
+            getattr(self, 'required_columns', ()),
+        )
+        if key not in compiled_serializers:
+            try:
+                compiled = compile_serializer(super().get_serializer(), available)
+            except NotCompilable:
+                compiled = None
+            else:
+                for column in key[3]:
+                    use_column(compiled.columns, column)
+            compiled_serializers[key] = compiled
+        self.compiled_serializer = compiled_serializers[key]
+        if self.compiled_serializer is None:
+            return queryset
+        return queryset.values_list(*self.compiled_serializer.columns, named=True)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.compiled_serializer is not None and kwargs.get('many'):
+            return CompiledRows(args[0], self.compiled_serializer, self.get_serializer_context())
+        return super().get_serializer(*args, **kwargs)
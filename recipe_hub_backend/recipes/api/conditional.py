@@ -0,0 +1,175 @@
+# recipes/api/conditional.py
+
+'''
+Conditional GET support (ETag / Last-Modified) for the recipe API.
+
+Each viewset describes the state of what it returns with a few cheap values
+(updated_at timestamps and child-row aggregates), hashed into a strong ETag.
+When a request carries If-None-Match/If-Modified-Since, that state is read
+with a single narrow query first, and if the client already holds the current
+version it gets an empty 304 response before the full queryset is loaded and
+serialized.
+'''
+
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.pagination import PageNumberPagination
+
+
+def make_etag(*parts):
+    """Build a strong (quoted) ETag from the repr of the given values"""
+    return '"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def not_modified_response(request, etag, last_modified=None):
+    """
+    Return a 304 response if the request's If-None-Match/If-Modified-Since
+    headers match the given validators, None otherwise.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validator_headers(response, etag, last_modified)
+    return response
+
+
+def has_conditional_headers(request):
+    return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+
+def set_validator_headers(response, etag, last_modified=None):
+    """Add the ETag/Last-Modified headers to a response"""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Representations differ per user (e.g. user_rating), so caches must key on the token
+    patch_vary_headers(response, ('Authorization',))
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin adding ETag/Last-Modified validators to list and retrieve.
+
+    Viewsets implement get_validators(served=None), returning a tuple of
+    values that changes whenever the response would, plus the last
+    modification time (or None), or None as a whole to skip the conditional
+    handling. For conditional requests it is called with served=None and must
+    query the state itself; after a full response it receives the object or
+    page that was served, so the headers cost no extra query.
+    """
+    conditional_actions = ('list', 'retrieve')
+
+    def get_validators(self, served=None):
+        raise NotImplementedError('.get_validators() must be overridden')
+
+    def get_etag(self, request, state):
+        # The same state renders differently per page, format and user
+        return make_etag(
+            self.basename,
+            self.action,
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            request.user.pk,
+            state
+        )
+
+    def get_page_state(self, served, queryset, fields):
+        """
+        Return (total count or None, rows) describing the requested page, where
+        rows hold the given fields of each object. They are read from the served
+        page when available, otherwise from a values() query paginated the same way.
+        """
+        if served is not None:
+            paginator = self.paginator
+            rows = [tuple(getattr(obj, field) for field in fields) for obj in served]
+        else:
+            paginator = type(self.paginator)()
+            page = paginator.paginate_queryset(queryset.values(*fields), self.request, view=self)
+            rows = [tuple(row[field] for field in fields) for row in page]
+        count = paginator.page.paginator.count if isinstance(paginator, PageNumberPagination) else None
+        return count, rows
+
+    def get_object(self):
+        obj = super().get_object()
+        self.served_objects = obj
+        return obj
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            self.served_objects = page
+        return page
+
+    async def aget_object(self):
+        obj = await super().aget_object()
+        self.served_objects = obj
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        page = await super().apaginate_queryset(queryset)
+        if page is not None:
+            self.served_objects = page
+        return page
+
+    def dispatch_conditional(self, handler, request, *args, **kwargs):
+        """Answer with 304 if the client's copy is current, otherwise run the handler"""
+        if not self.is_conditional(request):
+            return handler(request, *args, **kwargs)
+
+        if has_conditional_headers(request):
+            response = self.get_not_modified_response(request, self.get_validators())
+            if response is not None:
+                return response
+
+        response = handler(request, *args, **kwargs)
+        self.add_validator_headers(request, response)
+        return response
+
+    async def adispatch_conditional(self, handler, request, *args, **kwargs):
+        """Async counterpart of dispatch_conditional, for async handlers"""
+        if not self.is_conditional(request):
+            return await handler(request, *args, **kwargs)
+
+        if has_conditional_headers(request):
+            # The state query is a single narrow query, run in a worker thread
+            validators = await sync_to_async(self.get_validators)()
+            response = self.get_not_modified_response(request, validators)
+            if response is not None:
+                return response
+
+        response = await handler(request, *args, **kwargs)
+        self.add_validator_headers(request, response)
+        return response
+
+    def is_conditional(self, request):
+        return self.action in self.conditional_actions and request.method in ('GET', 'HEAD')
+
+    def get_not_modified_response(self, request, validators):
+        """Return a 304 response if the client holds the state described by the validators"""
+        if validators is None:
+            return None
+        state, last_modified = validators
+        return not_modified_response(request, self.get_etag(request, state), last_modified)
+
+    def add_validator_headers(self, request, response):
+        """Describe the served objects in the headers of a full response"""
+        if response.status_code == 200:
+            validators = self.get_validators(getattr(self, 'served_objects', None))
+            if validators is not None:
+                state, last_modified = validators
+                set_validator_headers(response, self.get_etag(request, state), last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.dispatch_conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.dispatch_conditional(super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.adispatch_conditional(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.adispatch_conditional(super().aretrieve, request, *args, **kwargs)
@@ -0,0 +1,156 @@
+# recipes/api/fields.py
+
+'''
+Sparse fieldsets (?fields=) and explicit expansion (?expand=) for the read
+actions of the recipe, comment and rating endpoints.
+
+?fields=id,title,author keeps only the listed fields of every object.
+Serializers name their nested relations in `expandable_fields`. These are
+nested objects by default; ?expand= lists the ones to nest, the others being
+sent as the related object's id (to-one relations) or left out (to-many
+relations). So ?expand= alone sends a recipe's author as an id and leaves
+its comments out. Unknown names are answered with a 400 response.
+
+The viewsets prune their queries to the selection (see
+FieldSelectionMixin): only the columns behind the selected fields are loaded,
+and the joins, prefetches and extra queries of the fields left out or not
+expanded are skipped.
+'''
+
+from functools import lru_cache
+
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+class FieldSelection:
+    """The fields of a serializer to render, and which of its relations to nest"""
+    def __init__(self, fields, expanded):
+        self.fields = fields
+        self.expanded = expanded
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def is_expanded(self, name):
+        return name in self.fields and name in self.expanded
+
+    @classmethod
+    def everything(cls, serializer_class):
+        """Every field, with every relation nested: the default representation"""
+        return cls(tuple(serializer_class.Meta.fields), set(serializer_class.expandable_fields))
+
+    @classmethod
+    def from_request(cls, request, serializer_class):
+        """The selection of the ?fields= and ?expand= query parameters"""
+        selection = cls.everything(serializer_class)
+        fields = get_names(request, 'fields', selection.fields)
+        if fields:
+            selection.fields = tuple(name for name in selection.fields if name in fields)
+        expanded = get_names(request, 'expand', serializer_class.expandable_fields)
+        if expanded is not None:
+            selection.expanded = expanded
+        return selection
+
+
+def get_names(request, param, choices):
+    """The set of comma separated names of a query parameter, None if it is absent"""
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names.difference(choices)
+    if unknown:
+        raise ValidationError({param: [
+            f'Unknown field(s): {", ".join(sorted(unknown))}. '
+            f'Choose from: {", ".join(choices) or "none"}.'
+        ]})
+    return names
+
+
+class SparseFieldsMixin:
+    """
+    Model serializer mixin rendering the FieldSelection passed as the
+    `field_selection` argument, all fields otherwise.
+    """
+    # Fields holding nested serializers
+    expandable_fields = ()
+
+    def __init__(self, *args, field_selection=None, **kwargs):
+        self.field_selection = field_selection
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.field_selection
+        if selection is None:
+            return fields
+        for name in list(fields):
+            if name not in selection:
+                del fields[name]
+            elif name in self.expandable_fields and not selection.is_expanded(name):
+                if isinstance(fields[name], serializers.ListSerializer):
+                    del fields[name]
+                else:
+                    # Reads the foreign key column, without loading the related object
+                    fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+        return fields
+
+
+@lru_cache(maxsize=None)
+def get_model_columns(serializer_class):
+    """
+    {field name: model fields read} of a model serializer's fields, with the
+    fields of nested to-one serializers (e.g. 'author__username'). Fields not
+    backed by a model field (methods, annotations) read none.
+    """
+    model_fields = {field.name for field in serializer_class.Meta.model._meta.concrete_fields}
+    columns = {}
+    for name, field in serializer_class().fields.items():
+        if field.source not in model_fields:
+            columns[name] = ()
+        elif isinstance(field, serializers.ModelSerializer):
+            nested = get_model_columns(type(field)).values()
+            columns[name] = (field.source, *(f'{field.source}__{column}' for names in nested for column in names))
+        else:
+            columns[name] = (field.source,)
+    return columns
+
+
+class FieldSelectionMixin:
+    """
+    ViewSet mixin passing the request's FieldSelection on to the serializer
+    of the read actions (field_selection_actions). Viewsets prune their
+    queryset with field_selection and get_selected_columns; for the other
+    actions, the selection holds everything.
+    """
+    field_selection_actions = ('list', 'retrieve')
+    # Model fields always loaded, e.g. the ones read by pagination and conditional GET
+    required_columns = ('id',)
+
+    @property
+    def field_selection(self):
+        if not hasattr(self, '_field_selection'):
+            serializer_class = self.get_serializer_class()
+            if self.action in self.field_selection_actions:
+                self._field_selection = FieldSelection.from_request(self.request, serializer_class)
+            else:
+                self._field_selection = FieldSelection.everything(serializer_class)
+        return self._field_selection
+
+    def get_selected_columns(self):
+        """The model fields to load with QuerySet.only() for the selected fields"""
+        selection = self.field_selection
+        model_columns = get_model_columns(self.get_serializer_class())
+        columns = set(self.required_columns)
+        for name in selection.fields:
+            for column in model_columns[name]:
+                # Columns of the related object are only needed when it is nested
+                if '__' not in column or selection.is_expanded(name):
+                    columns.add(column)
+        return columns
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in self.field_selection_actions:
+            kwargs.setdefault('field_selection', self.field_selection)
+        return super().get_serializer(*args, **kwargs)
@@ -1,7 +1,210 @@
 # recipe_hub_backend\recipes\api\pagination.py
 
-from rest_framework.pagination import PageNumberPagination
+import json
 
-class SmallSetPagination(PageNumberPagination):
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, CursorPagination, _reverse_ordering
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination that can also run its COUNT and page queries
+    through the async ORM (see recipes/api/async_views.py).
+    """
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of paginate_queryset"""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property: fill it in so it doesn't query synchronously
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+        self.page.object_list = [obj async for obj in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+
+        return list(self.page)
+
+
+class AsyncCursorPagination(CursorPagination):
+    """
+    Cursor pagination that can also load its page through the async ORM.
+    DRF's paginate_queryset is split around its only query: get_page_queryset
+    builds the query for the page (plus one row to detect a following page),
+    set_page works out the page and the next/previous positions from its rows.
+
+    Unlike DRF's, cursor positions hold the values of all the ordering
+    fields, not only the first one, and pages start after them in that
+    order. With a unique last field (e.g. ordering by created_at, then id),
+    rows with equal timestamps are told apart by the WHERE clause, instead
+    of DRF's offsets from the last distinct timestamp, which grow with the
+    number of equal ones and give up beyond offset_cutoff.
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of paginate_queryset"""
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([obj async for obj in queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        # Cursor pagination always enforces an ordering
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        # If we have a cursor with a fixed position then filter by that
+        if current_position is not None:
+            queryset = queryset.filter(self.get_position_filter(queryset.model, current_position))
+
+        self.page_offset, self.page_reverse, self.page_position = offset, reverse, current_position
+        # Fetch an extra item to determine if there is a page following this one
+        return queryset[offset:offset + self.page_size + 1]
+
+    def get_position_filter(self, model, position):
+        """
+        The condition selecting the rows after a position in the direction of
+        the cursor, comparing the ordering fields in turn: for (-created_at,
+        -id), created_at <= x AND (created_at < x OR (created_at = x AND id < y)).
+        The first comparison alone bounds the index range that is read.
+        """
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            fields = [order.lstrip('-') for order in self.ordering]
+            values = [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        lookups = [
+            # Test for: (cursor reversed) XOR (queryset reversed)
+            'lt' if self.cursor.reverse != order.startswith('-') else 'gt'
+            for order in self.ordering
+        ]
+        condition = None
+        for field, value, lookup in reversed(list(zip(fields, values, lookups))):
+            after = Q(**{f'{field}__{lookup}': value})
+            condition = after if condition is None else after | (Q(**{field: value}) & condition)
+        return Q(**{f'{fields[0]}__{lookups[0]}e': values[0]}) & condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [
+            instance[field] if isinstance(instance, dict) else getattr(instance, field)
+            for field in (order.lstrip('-') for order in ordering)
+        ]
+        return json.dumps([str(value) for value in values], separators=(',', ':'))
+
+    def set_page(self, results):
+        offset, reverse, current_position = self.page_offset, self.page_reverse, self.page_position
+        self.page = list(results[:self.page_size])
+
+        # Determine the position of the final item following the page
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # The query ordering was reversed, so reverse the items back
+            self.page = list(reversed(self.page))
+
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+class SmallSetPagination(AsyncPageNumberPagination):
+    page_size = 10
+
+
+class RecipeCursorPagination(AsyncCursorPagination):
+    """
+    Keyset pagination for the recipe feed, enabled with ?pagination=cursor.
+    Pages are located with a WHERE on (created_at, id), whose created_at
+    bound is served by the existing -created_at index, so there is no
+    COUNT(*) and no OFFSET scan and deep pages cost the same as the first one.
+    Recipes created at the same time are ordered, and split across pages, by
+    id.
+    """
     page_size = 10
+    ordering = ('-created_at', '-id')
+
+
+class CommentCursorPagination(AsyncCursorPagination):
+    """
+    Keyset pagination for a recipe's comments, newest first, then by id.
+    Pages are read from the (recipe, created_at, id) index, so recipes with
+    thousands of comments respond as fast as ones with a few.
+    """
+    page_size = 20
+    ordering = ('-created_at', '-id')
+
+
+class StreamCursorPagination(AsyncCursorPagination):
+    """
+    Keyset pages of the streamed lists (see recipes/api/streaming.py), of
+    ?page_size= rows. StreamingListMixin sets the default and maximum page
+    sizes and the ordering from the view. Streams are read forward only:
+    they link to the following page, never to the previous one.
+    """
+    page_size_query_param = 'page_size'
 
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is not None and cursor.reverse:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
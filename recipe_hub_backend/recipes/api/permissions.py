@@ -42,10 +42,11 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
             return True
 
         # Write permissions are only allowed to the author
-        # Handle both 'author' and 'rating_author' fields
-        if hasattr(obj, 'author'):
-            return obj.author == request.user
-        elif hasattr(obj, 'rating_author'):
-            return obj.rating_author == request.user
+        # Handle both 'author' and 'rating_author' fields. Ids are compared, as
+        # request.user may be built from the token (see api/authentication.py)
+        if hasattr(obj, 'author_id'):
+            return obj.author_id == request.user.pk
+        elif hasattr(obj, 'rating_author_id'):
+            return obj.rating_author_id == request.user.pk
         
         return False
\ No newline at end of file
@@ -0,0 +1,78 @@
+# recipes/api/renderers.py
+
+'''
+JSON rendering and parsing with orjson.
+
+DRF encodes responses with the stdlib json module and a Python level
+encoder, which is a visible share of the response time of large pages: long
+recipe instructions and descriptions are escaped character by character in
+Python when they hold non-ASCII text. orjson does the same work in native
+code, several times faster, and parses request bodies faster too.
+
+FastJSONRenderer and FastJSONParser are the API's default renderer and
+parser (REST_FRAMEWORK in settings). They use orjson when it is installed
+and RECIPE_JSON_BACKEND is 'orjson', and fall back to DRF's stdlib
+implementation otherwise, so orjson remains an optional dependency.
+The output is the same bytes as DRF's JSONRenderer:
+- compact separators and unescaped non-ASCII characters (UNICODE_JSON and
+  COMPACT_JSON, DRF's defaults)
+- datetimes in ISO 8601, with 'Z' for UTC; Decimals, lazy strings and the
+  other types orjson doesn't know go through DRF's encoder
+- U+2028 and U+2029 escaped, so the output is valid JavaScript
+Indented output (the browsable API, 'application/json; indent=4'), other
+JSON settings and values orjson can't encode (integers beyond 64 bits) are
+rendered by DRF's implementation.
+'''
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def use_orjson():
+    return orjson is not None and settings.RECIPE_JSON_BACKEND == 'orjson'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with orjson when it can"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            not use_orjson()
+            or self.ensure_ascii or not self.compact or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            rendered = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits; the stdlib raises as well if it can't encode the data either
+            return super().render(data, accepted_media_type, renderer_context)
+        return rendered.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser decoding UTF-8 request bodies with orjson"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        # orjson reads UTF-8 only, and rejects NaN and Infinity like strict parsing
+        if not use_orjson() or encoding.lower() not in ('utf-8', 'utf8') or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,42 @@
+# recipes/api/replicas.py
+
+from contextlib import ExitStack
+
+from rest_framework import permissions
+
+from ..routers import is_pinned_to_primary, pin_to_primary, read_from_replica
+
+
+class ReplicaReadMixin:
+    """
+    ViewSet mixin running the queries of read-only requests on a read replica
+    (see recipes/routers.py). Users who wrote something within the sticky
+    window keep reading from the primary, so they always see their own writes.
+    """
+    def use_replica(self, request):
+        """Whether this request may read from a replica"""
+        if request.method not in permissions.SAFE_METHODS:
+            return False
+        user = request.user
+        return not (user.is_authenticated and is_pinned_to_primary(user.pk))
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self.request_context:
+            return super().dispatch(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        with ExitStack() as self.request_context:
+            return await super().adispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication, permissions and throttling have run, so we know who is asking
+        super().initial(request, *args, **kwargs)
+        if self.use_replica(request):
+            self.request_context.enter_context(read_from_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (request.method not in permissions.SAFE_METHODS
+                and response.status_code < 400
+                and request.user.is_authenticated):
+            pin_to_primary(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -3,6 +3,9 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from ..models import Recipe, Comment, DifficultyRating
+from ..ingredients import normalize_ingredient
+from ..metrics import TimedRepresentationMixin
+from .fields import SparseFieldsMixin
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import EmailValidator
 from drf_spectacular.utils import (
@@ -89,7 +92,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     """
     Serializer for the User model.
     We only expose non-sensitive user information.
@@ -98,14 +101,61 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'username', 'email')
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
-    
+    expandable_fields = ('author',)
+
     class Meta:
         model = Comment
         fields = ('id', 'recipe', 'author', 'content', 'created_at', 'updated_at')
         read_only_fields = ('created_at', 'updated_at', 'author', 'recipe')
 
+class UserRatingMixin:
+    """
+    Provides the current user's difficulty rating for a recipe.
+    The viewset passes a {recipe_id: rating} dict as the 'user_ratings' context
+    entry, built with one query for all recipes being serialized. Without it,
+    we fall back to a single query for the recipe at hand.
+    Also compiles the recipe fields that aren't plain columns, for the
+    compiled read path.
+    """
+    def get_user_rating(self, obj):
+        """Get the current user's rating for this recipe if it exists"""
+        user_ratings = self.context.get('user_ratings')
+        if user_ratings is not None:
+            return user_ratings.get(obj.pk)
+
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return DifficultyRating.objects.filter(
+                recipe_id=obj.pk,
+                rating_author_id=request.user.pk
+            ).values_list('rating', flat=True).first()
+        return None
+
+    def compile_user_rating(self):
+        """user_rating for the compiled read path (see recipes/api/compiled.py)"""
+        def build(context, recipe_ids):
+            user_ratings = context.get('user_ratings')
+            if user_ratings is None:
+                request = context.get('request')
+                if not (request and request.user.is_authenticated):
+                    return [None] * len(recipe_ids)
+                user_ratings = dict(DifficultyRating.objects.filter(
+                    recipe_id__in=recipe_ids,
+                    rating_author_id=request.user.pk
+                ).values_list('recipe_id', 'rating'))
+            return [user_ratings.get(recipe_id) for recipe_id in recipe_ids]
+        return ('id',), build
+
+    def compile_average_difficulty(self):
+        """average_difficulty for the compiled read path, from the rating aggregates"""
+        def build(context, rating_counts, rating_sums):
+            return [
+                Recipe.get_average_difficulty(count, total) for count, total in zip(rating_counts, rating_sums)
+            ]
+        return ('rating_count', 'rating_sum'), build
+
 @extend_schema_serializer(
     examples=[
         OpenApiExample(
@@ -120,7 +170,7 @@ class CommentSerializer(serializers.ModelSerializer):
         )
     ]
 )
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedRepresentationMixin, SparseFieldsMixin, UserRatingMixin, serializers.ModelSerializer):
     """
     Serializer for the Recipe model.
     Includes the author information through UserSerializer.
@@ -128,10 +178,11 @@ class RecipeSerializer(serializers.ModelSerializer):
     # Nest the author's information in the recipe data
     author = UserSerializer(read_only=True)
     comments = CommentSerializer(many=True, read_only=True)
-    comment_count = serializers.SerializerMethodField()
+    comment_count = serializers.IntegerField(read_only=True)
     average_difficulty = serializers.FloatField(read_only=True)
     user_rating = serializers.SerializerMethodField()
-    
+    expandable_fields = ('author', 'comments')
+
     class Meta:
         model = Recipe
         fields = (
@@ -149,10 +200,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'average_difficulty',
             'user_rating'
         )
-        read_only_fields = ('created_at', 'updated_at', 'author', 'average_difficulty')
-
-    def get_comment_count(self, obj):
-        return obj.comments.count()
+        read_only_fields = ('created_at', 'updated_at', 'author', 'comment_count', 'average_difficulty')
 
     def validate_cooking_time(self, value):
         """
@@ -162,20 +210,101 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Cooking time must be positive")
         return value
     
-    def get_user_rating(self, obj):
-        """Get the current user's rating for this recipe if it exists"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                rating = obj.difficulty_ratings.get(rating_author=request.user)
-                return rating.rating
-            except DifficultyRating.DoesNotExist:
-                return None
-        return None
-    
-class DifficultyRatingSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(TimedRepresentationMixin, SparseFieldsMixin, UserRatingMixin, serializers.ModelSerializer):
+    """
+    Lightweight serializer used by the recipe list endpoint.
+    Only exposes what a recipe card needs: no ingredients, instructions or
+    nested comments, and the description is cut down to a short excerpt.
+    Counts and the average difficulty come from the denormalized columns on
+    Recipe and the user's ratings arrive through the serializer context, so
+    serializing a page never triggers per-recipe queries.
+    """
+    author = UserSerializer(read_only=True)
+    description = serializers.CharField(source='description_excerpt', read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
+    average_difficulty = serializers.FloatField(read_only=True)
+    user_rating = serializers.SerializerMethodField()
+    expandable_fields = ('author',)
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id',
+            'title',
+            'description',
+            'cooking_time',
+            'created_at',
+            'updated_at',
+            'author',
+            'comment_count',
+            'average_difficulty',
+            'user_rating'
+        )
+        read_only_fields = fields
+
+
+class RecipeSearchResultSerializer(RecipeListSerializer):
+    """Recipe summary with the search relevance (higher is better)"""
+    relevance = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('relevance',)
+        read_only_fields = fields
+
+
+class RecipeIngredientMatchSerializer(RecipeListSerializer):
+    """Recipe summary with the number of requested ingredients the recipe uses"""
+    matched_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('matched_ingredients',)
+        read_only_fields = fields
+
+
+class RecipeIngredientQuerySerializer(serializers.Serializer):
+    """Validates the query parameters of the recipes-by-ingredients lookup"""
+    max_ingredients = 20
+
+    ingredients = serializers.CharField(help_text='Comma separated ingredient names')
+
+    def validate_ingredients(self, value):
+        """Return the distinct normalized ingredient names"""
+        names = list(dict.fromkeys(
+            name for name in (normalize_ingredient(part) for part in value.split(',')) if name
+        ))
+        if not names:
+            raise serializers.ValidationError("Provide at least one ingredient.")
+        if len(names) > self.max_ingredients:
+            raise serializers.ValidationError(
+                f"Provide at most {self.max_ingredients} ingredients."
+            )
+        return names
+
+
+class RecipeTrendingQuerySerializer(serializers.Serializer):
+    """Validates the query parameters of the trending recipes"""
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=100,
+                                     help_text='Number of recipes (default: 20)')
+
+
+class RecipeSearchQuerySerializer(serializers.Serializer):
+    """Validates the query parameters of the recipe search"""
+    q = serializers.CharField(max_length=200, help_text='Words to search for')
+    author = serializers.IntegerField(required=False, help_text='Only recipes by this user id')
+    min_cooking_time = serializers.IntegerField(required=False, min_value=0)
+    max_cooking_time = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, data):
+        if data.get('min_cooking_time', 0) > data.get('max_cooking_time', float('inf')):
+            raise serializers.ValidationError(
+                "min_cooking_time can't be greater than max_cooking_time."
+            )
+        return data
+
+class DifficultyRatingSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
     rating_author = UserSerializer(read_only=True)
-    
+    expandable_fields = ('rating_author',)
+
     class Meta:
         model = DifficultyRating
         fields = ('id', 'rating', 'rating_author', 'created_at')
@@ -191,3 +320,46 @@ class DifficultyRatingSerializer(serializers.ModelSerializer):
 
     
 
+
+
+class BulkRatingSerializer(serializers.Serializer):
+    """One rating of a bulk write: creates the user's rating or updates it"""
+    recipe_id = serializers.IntegerField(min_value=1)
+    rating = serializers.IntegerField(min_value=1, max_value=5)
+
+
+class BulkCommentSerializer(serializers.Serializer):
+    """One new comment of a bulk write"""
+    recipe_id = serializers.IntegerField(min_value=1)
+    content = serializers.CharField(max_length=5000)
+
+
+@extend_schema_serializer(
+    examples=[
+        OpenApiExample(
+            'Bulk write',
+            value={
+                'ratings': [{'recipe_id': 1, 'rating': 3}, {'recipe_id': 2, 'rating': 5}],
+                'comments': [{'recipe_id': 1, 'content': 'Worked great with less sugar'}]
+            }
+        )
+    ]
+)
+class BulkWriteSerializer(serializers.Serializer):
+    """
+    Envelope of a bulk write. Items are validated one by one by the view
+    (BulkRatingSerializer, BulkCommentSerializer), so that an invalid item
+    doesn't reject the others.
+    """
+    max_items = 500
+
+    ratings = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    comments = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+
+    def validate(self, attrs):
+        total = len(attrs['ratings']) + len(attrs['comments'])
+        if not total:
+            raise serializers.ValidationError("Provide at least one rating or comment.")
+        if total > self.max_items:
+            raise serializers.ValidationError(f"At most {self.max_items} items can be written at once.")
+        return attrs
@@ -0,0 +1,188 @@
+# recipes/api/streaming.py
+
+'''
+Streamed JSON list responses.
+
+DRF renders a list by serializing every object into memory and encoding the
+whole result as one string: the memory used by a request grows with the
+number of rows, and the client gets nothing before the last row is encoded.
+
+With ?stream=true, the list actions of the viewsets below answer with a
+StreamingHttpResponse instead. Rows are read with QuerySet.iterator() (or
+aiterator() on the async read path), then serialized and encoded
+stream_chunk_size rows at a time, so the first bytes go out as soon as the
+first chunk is encoded.
+
+A stream is one keyset page (see StreamCursorPagination) of ?page_size= rows,
+stream_page_size by default and stream_max_page_size at most, so no request
+reads a whole table, however many rows it holds. The body is
+    {"results": [the objects, in the order of stream_ordering], "next": url}
+with "next" after the results, as it is only known once they are read: the
+link to the following page, or null on the last one.
+
+Streamed responses are neither cached (see recipes/api/cache.py) nor given
+ETags (see recipes/api/conditional.py): both would need the whole body.
+'''
+
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .pagination import StreamCursorPagination
+from .renderers import FastJSONRenderer
+
+
+class StreamingJSONRenderer(FastJSONRenderer):
+    """JSON renderer that can also encode a page one chunk of items at a time"""
+
+    def render_chunks(self, chunks, get_next):
+        """
+        Yield the encoded {"results": [the items of all chunks (lists of items)],
+        "next": get_next()}, get_next being called once the chunks are exhausted
+        """
+        yield b'{"results":['
+        separator = b''
+        for chunk in chunks:
+            if chunk:
+                # The chunk encoded as an array, without its brackets
+                yield separator + self.render(chunk)[1:-1]
+                separator = b','
+        yield self.render_end(get_next())
+
+    async def arender_chunks(self, chunks, get_next):
+        """Async counterpart of render_chunks, for an async iterable of chunks"""
+        yield b'{"results":['
+        separator = b''
+        async for chunk in chunks:
+            if chunk:
+                yield separator + self.render(chunk)[1:-1]
+                separator = b','
+        yield self.render_end(get_next())
+
+    def render_end(self, next_link):
+        # render() encodes None as an empty body
+        return b'],"next":' + (self.render(next_link) if next_link is not None else b'null') + b'}'
+
+
+def chunked(iterable, size):
+    """Yield lists of `size` items (the last one may be shorter)"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+async def achunked(iterable, size):
+    """Async counterpart of chunked, for an async iterable"""
+    chunk = []
+    async for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def is_stream_requested(request):
+    return request.query_params.get('stream', '').lower() in ('true', '1', 'yes')
+
+
+class StreamingListMixin:
+    """
+    ViewSet mixin streaming the list action when the client asks for it
+    with ?stream=true. It must come before the cache and conditional GET
+    mixins, which can't handle streamed responses.
+    Viewsets loading extra data per page override serialize_chunk and
+    aserialize_chunk to load it per chunk.
+    """
+    stream_chunk_size = 500
+    stream_page_size = 1000
+    stream_max_page_size = 5000
+    # Keyset of the stream pages: the list's order, made unique by the id
+    stream_ordering = ('-created_at', '-id')
+    stream_renderer_class = StreamingJSONRenderer
+    # The database the rows of a streamed list are read from
+    stream_database = None
+
+    def is_streamed(self, request):
+        return (
+            self.action == 'list'
+            and is_stream_requested(request)
+            # The browsable API and other formats are rendered as usual
+            and isinstance(getattr(request, 'accepted_renderer', None), JSONRenderer)
+        )
+
+    def get_stream_paginator(self):
+        paginator = StreamCursorPagination()
+        paginator.page_size = self.stream_page_size
+        paginator.max_page_size = self.stream_max_page_size
+        paginator.ordering = self.stream_ordering
+        return paginator
+
+    def get_stream_queryset(self, paginator):
+        """The rows of the requested page, plus the first row of the following one if any"""
+        queryset = self.filter_queryset(self.get_queryset())
+        # The rows are read once dispatch() has returned, outside of the
+        # replica routing of the request (see recipes/api/replicas.py), so
+        # the database is picked now
+        self.stream_database = queryset.db
+        return paginator.get_page_queryset(queryset.using(self.stream_database), self.request, view=self)
+
+    def add_to_page(self, page, rows, paginator):
+        """
+        Add the rows just read to the page, and return those to stream:
+        all of them but the extra row telling whether a page follows.
+        """
+        streamed = rows[:max(paginator.page_size - len(page), 0)]
+        page.extend(rows)
+        return streamed
+
+    def get_next_link(self, page, paginator):
+        paginator.set_page(page)
+        return paginator.get_next_link()
+
+    def serialize_chunk(self, objects):
+        return self.get_serializer(objects, many=True).data
+
+    async def aserialize_chunk(self, objects):
+        """Async counterpart of serialize_chunk"""
+        return self.get_serializer(objects, many=True).data
+
+    def get_streaming_response(self, content):
+        return StreamingHttpResponse(content, content_type=self.stream_renderer_class.media_type)
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_streamed(request):
+            return super().list(request, *args, **kwargs)
+        paginator = self.get_stream_paginator()
+        objects = self.get_stream_queryset(paginator).iterator(chunk_size=self.stream_chunk_size)
+        # The rows of the page are kept until its end, for the next link: at most stream_max_page_size
+        page = []
+
+        def chunks():
+            for chunk in chunked(objects, self.stream_chunk_size):
+                if streamed := self.add_to_page(page, chunk, paginator):
+                    yield self.serialize_chunk(streamed)
+
+        return self.get_streaming_response(self.stream_renderer_class().render_chunks(
+            chunks(), lambda: self.get_next_link(page, paginator)
+        ))
+
+    async def alist(self, request, *args, **kwargs):
+        if not self.is_streamed(request):
+            return await super().alist(request, *args, **kwargs)
+        paginator = self.get_stream_paginator()
+        page = []
+
+        async def chunks():
+            objects = self.get_stream_queryset(paginator).aiterator(chunk_size=self.stream_chunk_size)
+            async for chunk in achunked(objects, self.stream_chunk_size):
+                if streamed := self.add_to_page(page, chunk, paginator):
+                    yield await self.aserialize_chunk(streamed)
+
+        # An async iterator, so that Django's ASGI handler streams it instead
+        # of reading it all in a worker thread
+        return self.get_streaming_response(self.stream_renderer_class().arender_chunks(
+            chunks(), lambda: self.get_next_link(page, paginator)
+        ))
@@ -1,11 +1,210 @@
 # recipes/api/throttling.py
 
+'''
+Throttling for the recipe API.
+
+DRF's SimpleRateThrottle keeps a list of request timestamps per client in the
+default cache and rewrites the whole list on every request. With the default
+per-process LocMem cache each worker also keeps its own list, so N workers
+allow N times the configured rate.
+
+Our throttles instead keep sliding-window counters in a store shared by all
+worker processes (see RECIPE_THROTTLE_STORE in settings). Every request does a
+single atomic increment-with-expiry on the counter of the current window and
+reads the counter of the previous one, which is O(1) regardless of the rate.
+Rejected requests are taken back out of the counter, as DRF does not record them either.
+'''
+
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
 from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
 
-class RecipeUserThrottle(UserRateThrottle):
+
+class SQLiteThrottleStore:
+    """
+    Throttle counters kept in a local SQLite file.
+    All worker processes on the host open the same file, and SQLite's locking
+    makes every increment atomic across them. WAL mode keeps readers and the
+    single writer from blocking each other.
+    """
+    # Expired counters are removed once every this many hits (per process)
+    cleanup_interval = 1000
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+        self.hits = 0
+
+    def get_connection(self):
+        """Open (once per thread) a connection to the counters database"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or getattr(self.local, 'pid', None) != os.getpid():
+            # isolation_level=None: we issue BEGIN/COMMIT ourselves
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS throttle_counters ('
+                ' key TEXT NOT NULL,'
+                ' window INTEGER NOT NULL,'
+                ' count INTEGER NOT NULL,'
+                ' expires_at REAL NOT NULL,'
+                ' PRIMARY KEY (key, window))'
+            )
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def hit(self, key, window, ttl):
+        """
+        Count one request for `key` in `window` and return the
+        (current window count, previous window count) pair.
+        """
+        connection = self.get_connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'INSERT INTO throttle_counters (key, window, count, expires_at)'
+                ' VALUES (?, ?, 1, ?)'
+                ' ON CONFLICT (key, window) DO UPDATE SET count = count + 1',
+                (key, window, now + ttl)
+            )
+            counts = dict(connection.execute(
+                'SELECT window, count FROM throttle_counters'
+                ' WHERE key = ? AND window IN (?, ?)',
+                (key, window, window - 1)
+            ).fetchall())
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        self.hits += 1
+        if self.hits % self.cleanup_interval == 0:
+            connection.execute('DELETE FROM throttle_counters WHERE expires_at < ?', (now,))
+
+        return counts.get(window, 0), counts.get(window - 1, 0)
+
+    def release(self, key, window):
+        """Take back a hit that was not allowed through"""
+        self.get_connection().execute(
+            'UPDATE throttle_counters SET count = count - 1 WHERE key = ? AND window = ?',
+            (key, window)
+        )
+
+    def clear(self):
+        """Remove all counters"""
+        self.get_connection().execute('DELETE FROM throttle_counters')
+
+
+class CacheThrottleStore:
+    """
+    Throttle counters kept in a Django cache, for deployments spanning several
+    hosts. Use it with a cache that shares data between processes and
+    increments atomically, e.g. django.core.cache.backends.redis.RedisCache.
+    """
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def hit(self, key, window, ttl):
+        """
+        Count one request for `key` in `window` and return the
+        (current window count, previous window count) pair.
+        """
+        current_key = f'{key}:{window}'
+        # add() only creates the counter if it does not exist yet
+        self.cache.add(current_key, 0, ttl)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # The counter expired between add() and incr()
+            self.cache.add(current_key, 1, ttl)
+            current = 1
+        previous = self.cache.get(f'{key}:{window - 1}', 0)
+        return current, previous
+
+    def release(self, key, window):
+        """Take back a hit that was not allowed through"""
+        try:
+            self.cache.decr(f'{key}:{window}')
+        except ValueError:
+            pass
+
+    def clear(self):
+        """Remove all counters"""
+        self.cache.clear()
+
+
+@lru_cache(maxsize=None)
+def get_throttle_store():
+    """Return the throttle store configured by the RECIPE_THROTTLE_STORE setting"""
+    config = settings.RECIPE_THROTTLE_STORE
+    store_class = import_string(config['BACKEND'])
+    return store_class(**config.get('OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def reset_throttle_store(setting, **kwargs):
+    """Pick up a new store when the setting is overridden, e.g. in tests"""
+    if setting == 'RECIPE_THROTTLE_STORE':
+        get_throttle_store.cache_clear()
+
+
+class SlidingWindowThrottleMixin:
+    """
+    Replaces SimpleRateThrottle's timestamp history with a sliding-window
+    counter: the request count of the previous window, weighted by how much of
+    it still overlaps the sliding window, plus the count of the current window.
+    """
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, self.elapsed = divmod(self.now, self.duration)
+        store = get_throttle_store()
+        self.current, self.previous = store.hit(self.key, int(window), ttl=self.duration * 2)
+        weight = 1 - self.elapsed / self.duration
+        if self.previous * weight + self.current <= self.num_requests:
+            return True
+
+        # Like DRF, only allowed requests count towards the limit
+        store.release(self.key, int(window))
+        self.current -= 1
+        return False
+
+    def wait(self):
+        """
+        Returns the recommended next request time in seconds: the time until
+        the weighted count drops back under the limit.
+        """
+        remaining_in_window = self.duration - self.elapsed
+        if self.current + 1 > self.num_requests or not self.previous:
+            return remaining_in_window
+        # Solve previous * (1 - (elapsed + t) / duration) + current + 1 <= num_requests for t
+        allowed = self.num_requests - self.current - 1
+        wait = self.duration * (1 - allowed / self.previous) - self.elapsed
+        return min(max(wait, 0), remaining_in_window)
+
+
+class RecipeUserThrottle(SlidingWindowThrottleMixin, UserRateThrottle):
     scope = 'user'
     rate = '150/minute'  # Authenticated users can make 150 requests per minute
 
-class RecipeAnonThrottle(AnonRateThrottle):
+class RecipeAnonThrottle(SlidingWindowThrottleMixin, AnonRateThrottle):
     scope = 'anon'
-    rate = '60/minute'  # Anonymous users can make 60 requests per minute
\ No newline at end of file
+    rate = '60/minute'  # Anonymous users can make 60 requests per minute
@@ -0,0 +1,86 @@
+# recipes/api/tokens.py
+
+'''
+JWTs carrying the user claims needed to authenticate requests without a query.
+
+Access tokens hold the user's username and is_staff flag next to the user id,
+so JWTAuthentication builds request.user from the token alone (see
+recipes/api/authentication.py). The claims are read from the user when the
+token pair is issued and again on every refresh, from the User row the
+refresh checks, so changes reach clients within one access token lifetime.
+'''
+
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt import serializers, tokens
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .users import cache_user, get_cached_user
+
+# User attributes copied into access tokens
+USER_CLAIMS = ('username', 'is_staff')
+
+
+def has_user_claims(token):
+    return all(claim in token for claim in USER_CLAIMS)
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    Refresh token whose access tokens carry the USER_CLAIMS, read from
+    `user` when it is set, from the user cache otherwise
+    """
+    user = None
+
+    @classmethod
+    def for_user(cls, user):
+        # The user is at hand: creating the access token needs no query
+        cache_user(user)
+        token = super().for_user(user)
+        token.user = user
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user = self.user or get_cached_user(self[api_settings.USER_ID_CLAIM])
+        if user is not None:
+            for claim in USER_CLAIMS:
+                access[claim] = getattr(user, claim)
+        return access
+
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        """
+        simplejwt's validate(), giving the new access token the claims of the
+        User row it has just checked: a cached copy could predate a change
+        made in another worker, e.g. a demotion
+        """
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id:
+            user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+                raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+            refresh.user = user
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # The blacklist app isn't installed
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
@@ -1,32 +1,47 @@
 # recipe_hub_backend/recipes/api/urls.py
 
+from django.conf import settings
 from django.urls import path, include
 from rest_framework_nested import routers
 from rest_framework.routers import DefaultRouter
+from .async_views import with_async_reads
 from .views import (
     RecipeViewSet,
     CommentViewSet,
     CustomRegisterView,
     DifficultyRatingViewSet,
-    get_user_info
+    BulkWriteView,
+    get_user_info,
+    get_cache_stats
 )
 
-router = DefaultRouter()
-router.register(r'recipes', RecipeViewSet, basename='recipe')
-# Nested router for comments
-comments_router = routers.NestedDefaultRouter(router, r'recipes', lookup='recipe')
-comments_router.register(r'comments', CommentViewSet, basename='recipe-comments')
-# Nested router for difficulty ratings
-difficultyratings_router = routers.NestedDefaultRouter(router, r'recipes', lookup='recipe')
-difficultyratings_router.register(r'difficulty-ratings', DifficultyRatingViewSet, basename='recipe-difficulty-ratings')
 
+def build_urlpatterns(async_reads=False):
+    """
+    Build the API URL patterns. With async_reads, the recipe, comment and
+    rating list/detail reads are served by async views (see recipes/api/async_views.py).
+    """
+    router = DefaultRouter()
+    router.register(r'recipes', RecipeViewSet, basename='recipe')
+    # Nested router for comments
+    comments_router = routers.NestedDefaultRouter(router, r'recipes', lookup='recipe')
+    comments_router.register(r'comments', CommentViewSet, basename='recipe-comments')
+    # Nested router for difficulty ratings
+    difficultyratings_router = routers.NestedDefaultRouter(router, r'recipes', lookup='recipe')
+    difficultyratings_router.register(r'difficulty-ratings', DifficultyRatingViewSet, basename='recipe-difficulty-ratings')
 
+    router_urls = [router.urls, comments_router.urls, difficultyratings_router.urls]
+    if async_reads:
+        router_urls = [with_async_reads(urls) for urls in router_urls]
 
-urlpatterns = [
-    # Authentication endpoints
-    path('auth/registration/', CustomRegisterView.as_view(), name='registration'),
-    path('auth/user/', get_user_info, name='user-info'),
-    path('', include(router.urls)),
-    path('', include(comments_router.urls)),
-    path('', include(difficultyratings_router.urls)), 
-]
\ No newline at end of file
+    return [
+        # Authentication endpoints
+        path('auth/registration/', CustomRegisterView.as_view(), name='registration'),
+        path('auth/user/', get_user_info, name='user-info'),
+        path('cache-stats/', get_cache_stats, name='cache-stats'),
+        path('bulk/', BulkWriteView.as_view(), name='bulk-write'),
+        *[path('', include(urls)) for urls in router_urls],
+    ]
+
+
+urlpatterns = build_urlpatterns(async_reads=settings.RECIPE_ASYNC_READS)
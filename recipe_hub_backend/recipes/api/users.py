@@ -0,0 +1,79 @@
+# recipes/api/users.py
+
+'''
+Short-lived cache of User rows.
+
+Requests authenticated by an access token carrying the user claims (see
+recipes/api/tokens.py) don't load the User at all. The few places that need
+the full row (assigning it to a foreign key, the email of the user info
+endpoint, tokens issued without the claims) read it from this cache, so
+repeated requests by the same user don't query it every time. Entries expire
+after RECIPE_USER_CACHE_SECONDS and are removed whenever a User is saved or
+deleted (see RecipesConfig.ready).
+
+The removal only reaches the other workers if they read the same cache: a
+per-process cache would let them use a deactivated or demoted user until the
+entry expires. The cache must therefore be shared by all workers, which
+check_user_cache enforces.
+'''
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+# Backends keeping their entries in the worker's memory
+PROCESS_LOCAL_CACHES = (LocMemCache,)
+
+
+def get_user_cache():
+    """Return the cache holding User rows (RECIPE_USER_CACHE_ALIAS setting)"""
+    return caches[settings.RECIPE_USER_CACHE_ALIAS]
+
+
+def get_user_cache_key(user_id):
+    return f'recipes:user:{user_id}'
+
+
+def cache_user(user):
+    get_user_cache().set(get_user_cache_key(user.pk), user, settings.RECIPE_USER_CACHE_SECONDS)
+
+
+def get_cached_user(user_id):
+    """Return the User with the given id, or None if there is none"""
+    user = get_user_cache().get(get_user_cache_key(user_id))
+    if user is None:
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is not None:
+            cache_user(user)
+    return user
+
+
+async def aget_cached_user(user_id):
+    """Async counterpart of get_cached_user"""
+    key = get_user_cache_key(user_id)
+    user = await get_user_cache().aget(key)
+    if user is None:
+        user = await get_user_model().objects.filter(pk=user_id).afirst()
+        if user is not None:
+            await get_user_cache().aset(key, user, settings.RECIPE_USER_CACHE_SECONDS)
+    return user
+
+
+def forget_cached_user(sender, instance, **kwargs):
+    """post_save/post_delete handler dropping the cached copy of a changed User"""
+    get_user_cache().delete(get_user_cache_key(instance.pk))
+
+
+def check_user_cache(app_configs, **kwargs):
+    """System check: the user cache must be shared by all worker processes"""
+    if isinstance(get_user_cache(), PROCESS_LOCAL_CACHES):
+        return [checks.Error(
+            f'The user cache "{settings.RECIPE_USER_CACHE_ALIAS}" is local to each process, so '
+            'changes to a user would not reach the other workers before the entries expire.',
+            hint='Point RECIPE_USER_CACHE_ALIAS at a cache shared by all workers '
+                 '(file based on a single host, Redis or Memcached for several hosts).',
+            id='recipes.E001',
+        )]
+    return []
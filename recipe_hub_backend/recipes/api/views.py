@@ -1,18 +1,30 @@
 # recipe_hub_backend\recipes\api\views.py
 
-from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import generics, viewsets, permissions, status
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from ..models import Recipe, Comment, DifficultyRating
-from .serializers import RecipeSerializer, CommentSerializer, UserRegistrationSerializer, DifficultyRatingSerializer, UserSerializer
+from django.db import transaction
+from ..models import Recipe, RecipeIngredient, Comment, DifficultyRating
+from ..search import search_recipes
+from ..ndjson import RecipeExporter
+from .serializers import RecipeSerializer, RecipeListSerializer, RecipeSearchResultSerializer, RecipeSearchQuerySerializer, RecipeIngredientMatchSerializer, RecipeIngredientQuerySerializer, RecipeTrendingQuerySerializer, CommentSerializer, UserRegistrationSerializer, DifficultyRatingSerializer, UserSerializer, BulkWriteSerializer, BulkRatingSerializer, BulkCommentSerializer
 from .permissions import IsAuthorOrReadOnly, IsNotAuthenticated, IsAdminUserOrReadOnly
 from dj_rest_auth.registration.views import RegisterView
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from .pagination import SmallSetPagination
+from .pagination import SmallSetPagination, RecipeCursorPagination, CommentCursorPagination
 from .throttling import RecipeUserThrottle, RecipeAnonThrottle
-from django.db.models import Avg
+from .cache import AnonymousResponseCacheMixin, InvalidateResponseCacheMixin, cache_stats, get_generation
+from .conditional import ConditionalGetMixin
+from .replicas import ReplicaReadMixin
+from .async_views import AsyncReadMixin
+from .streaming import StreamingListMixin
+from .fields import FieldSelectionMixin
+from .compiled import CompiledReadMixin
+from .authentication import get_full_user
+from django.db.models import Count, DateTimeField, Max, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Substr
 from drf_spectacular.utils import (
     extend_schema, 
     extend_schema_view,
@@ -112,18 +124,44 @@ class CustomRegisterView(RegisterView):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_user_info(request):
+    # The email is not among the token claims
+    user = get_full_user(request.user)
     return Response({
-        'id': request.user.id,
-        'username': request.user.username,
-        'email': request.user.email,
-        'is_staff': request.user.is_staff,
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'is_staff': user.is_staff,
+    })
+
+@extend_schema(
+    summary="Get response cache statistics",
+    description="Hit/miss counters of the anonymous response cache in the serving process. Admins only.",
+    responses={200: OpenApiTypes.OBJECT},
+    tags=['recipes']
+)
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def get_cache_stats(request):
+    return Response({
+        **cache_stats.as_dict(),
+        'generation': get_generation(),
     })
 
 @extend_schema_view(
     list=extend_schema(
         summary="List recipes",
+        description="List recipes, newest first. Page-numbered by default; pass "
+                    "pagination=cursor to page with opaque next/previous cursors instead, or "
+                    "stream=true to receive up to page_size recipes (1000 by default, 5000 at most) "
+                    "streamed as {\"results\", \"next\"}.",
         parameters=[
-            OpenApiParameter("page", OpenApiTypes.INT, location=OpenApiParameter.QUERY)
+            OpenApiParameter("page", OpenApiTypes.INT, location=OpenApiParameter.QUERY),
+            OpenApiParameter("pagination", OpenApiTypes.STR, location=OpenApiParameter.QUERY,
+                             enum=['page', 'cursor']),
+            OpenApiParameter("cursor", OpenApiTypes.STR, location=OpenApiParameter.QUERY),
+            OpenApiParameter("stream", OpenApiTypes.BOOL, location=OpenApiParameter.QUERY),
+            OpenApiParameter("page_size", OpenApiTypes.INT, location=OpenApiParameter.QUERY,
+                             description="Rows per streamed page")
         ],
         tags=['recipes']
     ),
@@ -145,44 +183,354 @@ def get_user_info(request):
         summary="Delete recipe",
         description="Delete a recipe. Available to recipe author and admins.",
         tags=['recipes']
+    ),
+    search=extend_schema(
+        summary="Search recipes",
+        description="Full-text search in recipe titles, descriptions and ingredients, "
+                    "best matches first. Every word must match, the last one also as a prefix.",
+        parameters=[
+            RecipeSearchQuerySerializer,
+            OpenApiParameter("page", OpenApiTypes.INT, location=OpenApiParameter.QUERY)
+        ],
+        tags=['recipes']
+    ),
+    by_ingredients=extend_schema(
+        summary="Find recipes by ingredients",
+        description="Recipes using the given ingredients, ranked by how many of them they use.",
+        parameters=[
+            RecipeIngredientQuerySerializer,
+            OpenApiParameter("page", OpenApiTypes.INT, location=OpenApiParameter.QUERY)
+        ],
+        tags=['recipes']
+    ),
+    trending=extend_schema(
+        summary="Trending recipes",
+        description="The recipes with the most recent comment and rating activity, most popular first. "
+                    "Activity counts for less and less as it gets older (see TRENDING_HALF_LIFE_HOURS).",
+        parameters=[RecipeTrendingQuerySerializer],
+        tags=['recipes']
+    ),
+    export=extend_schema(
+        summary="Export recipes",
+        description="All recipes with their comments and ratings, one JSON object per line "
+                    "(the format of the import_recipes command), streamed. Admins only.",
+        responses={(200, 'application/x-ndjson'): OpenApiTypes.STR},
+        tags=['recipes']
     )
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, StreamingListMixin, AnonymousResponseCacheMixin, ConditionalGetMixin, InvalidateResponseCacheMixin, CompiledReadMixin, FieldSelectionMixin, AsyncReadMixin, viewsets.ModelViewSet):
     
     serializer_class = RecipeSerializer
     pagination_class = SmallSetPagination
     throttle_classes = [RecipeUserThrottle, RecipeAnonThrottle]
+    # Number of description characters sent with each recipe in the list view
+    description_excerpt_length = 300
+    # Search results are the same for every anonymous client as well
+    cached_actions = ('list', 'retrieve', 'search', 'by_ingredients', 'trending')
+    # Summary actions, served by get_list_queryset
+    summary_actions = ('list', 'search', 'by_ingredients', 'trending')
+    field_selection_actions = ('list', 'retrieve', 'search', 'by_ingredients', 'trending')
+    compiled_actions = ('list', 'trending')
+    # Read by conditional GET (see get_validators), and by average_difficulty
+    required_columns = ('id', 'created_at', 'updated_at', 'comment_count', 'rating_count', 'rating_sum')
+
+    @property
+    def paginator(self):
+        """
+        Use keyset (cursor) pagination when the client asks for it with
+        ?pagination=cursor, page numbers otherwise. Search and ingredient
+        results are ordered by rank, which cursors can't page through, so they
+        always use page numbers.
+        """
+        if not hasattr(self, '_paginator'):
+            if self.action == 'list' and self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def use_replica(self, request):
+        """
+        Responses stored in the shared response cache are built from the
+        primary: a replica lagging behind a write could otherwise fill the
+        new cache generation with the data from before the write.
+        """
+        return super().use_replica(request) and (
+            self.is_streamed(request) or not self.is_response_cacheable(request)
+        )
+
+    def get_serializer_class(self):
+        """Use the lightweight summary serializers for the list, search and trending actions"""
+        if self.action in ('list', 'trending'):
+            return RecipeListSerializer
+        if self.action == 'search':
+            return RecipeSearchResultSerializer
+        if self.action == 'by_ingredients':
+            return RecipeIngredientMatchSerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
         """
         Get all recipes with:
-        1. Calculated average difficulty rating
-        2. Author information (select_related for ForeignKey)
-        3. Prefetched difficulty ratings (prefetch_related for reverse relation)
-        4. Ordered by creation date (newest first)
-        """
-        return Recipe.objects.annotate(
-            # Calculate average rating for each recipe
-            average_difficulty=Avg('difficulty_ratings__rating')
-        ).select_related(
+        1. Author information (select_related for ForeignKey)
+        2. Prefetched comments with their authors (prefetch_related for reverse relation)
+        3. Ordered by creation date (newest first)
+        Comment count and average difficulty are read from the denormalized
+        columns on Recipe, and the current user's ratings are loaded separately
+        (see get_user_ratings). The list, search, by_ingredients and trending actions use
+        a slimmer query, see get_list_queryset.
+        Reads load the selected fields only (see recipes/api/fields.py): the
+        author join and the comments prefetch are skipped unless expanded.
+        """
+        if self.action in self.summary_actions:
+            return self.get_list_queryset()
+
+        selection = self.field_selection
+        # Show newest recipes first
+        queryset = Recipe.objects.order_by('-created_at')
+        if self.action in self.field_selection_actions:
+            queryset = queryset.only(*self.get_selected_columns())
+        if selection.is_expanded('author'):
             # Efficiently load author information
-            'author'
-        ).prefetch_related(
-            # Efficiently load all difficulty ratings
-            'difficulty_ratings'
-        ).order_by(
-            # Show newest recipes first
-            '-created_at'
-        )
+            queryset = queryset.select_related('author')
+        if selection.is_expanded('comments'):
+            # Load comments together with their authors in a single query
+            queryset = queryset.prefetch_related(
+                Prefetch('comments', queryset=Comment.objects.select_related('author'))
+            )
+        return queryset
+
+    def get_list_queryset(self):
+        """
+        Query used by the recipe list. Everything the summary serializer needs
+        is fetched in one query per page, without joins or aggregation:
+        1. Counts and rating totals come from plain columns on Recipe
+        2. A description excerpt is computed by the database, while the long
+           text columns (ingredients, instructions, description) aren't loaded
+        Like in get_queryset, only the selected fields are loaded. The list
+        reads them as rows for the compiled serializer (see recipes/api/compiled.py).
+        """
+        selection = self.field_selection
+        queryset = Recipe.objects.only(*self.get_selected_columns()).order_by('-created_at')
+        if 'description' in selection:
+            queryset = queryset.annotate(
+                description_excerpt=Substr('description', 1, self.description_excerpt_length)
+            )
+        if selection.is_expanded('author'):
+            queryset = queryset.select_related('author')
+        return self.get_compiled_queryset(queryset)
     
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text search (see recipes.search), optionally narrowed down to an
+        author and a cooking time range. Results are ordered by relevance,
+        newest first among equally relevant recipes.
+        """
+        return self.dispatch_cached(self.get_search_response, request)
+
+    def get_search_response(self, request):
+        params = RecipeSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        queryset = self.get_queryset()
+        if 'author' in filters:
+            queryset = queryset.filter(author_id=filters['author'])
+        if 'min_cooking_time' in filters:
+            queryset = queryset.filter(cooking_time__gte=filters['min_cooking_time'])
+        if 'max_cooking_time' in filters:
+            queryset = queryset.filter(cooking_time__lte=filters['max_cooking_time'])
+        queryset = search_recipes(queryset, filters['q']).order_by('-relevance', '-created_at', '-id')
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='by-ingredients')
+    def by_ingredients(self, request):
+        """
+        "What can I cook with X, Y, Z": recipes using any of the given
+        ingredients, ranked by how many of them they use, newest first among
+        equal matches.
+        """
+        return self.dispatch_cached(self.get_by_ingredients_response, request)
+
+    def get_by_ingredients_response(self, request):
+        params = RecipeIngredientQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        # Ranked from the (ingredient, recipe) index alone; the recipe rows are
+        # only loaded for the requested page
+        matches = RecipeIngredient.objects.filter(
+            ingredient__name__in=params.validated_data['ingredients']
+        ).values('recipe_id').annotate(
+            matched=Count('pk')
+        ).order_by('-matched', '-recipe_id')
+
+        page = self.paginator.paginate_queryset(matches, request, view=self)
+        recipes = self.get_queryset().in_bulk([row['recipe_id'] for row in page])
+        results = []
+        for row in page:
+            recipe = recipes.get(row['recipe_id'])
+            if recipe is not None:
+                recipe.matched_ingredients = row['matched']
+                results.append(recipe)
+
+        self.user_ratings = self.get_user_ratings(results)
+        serializer = self.get_serializer(results, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """
+        The most popular recipes right now: the top of the trending_score
+        index (see recipes/trending.py), scores being maintained by the writes.
+        """
+        return self.dispatch_cached(self.get_trending_response, request)
+
+    def get_trending_response(self, request):
+        params = RecipeTrendingQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        recipes = list(self.get_queryset().order_by('-trending_score', '-id')[:params.validated_data['limit']])
+        self.user_ratings = self.get_user_ratings(recipes)
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    def get_validators(self, served=None):
+        """
+        Describe the recipe(s) returned, for conditional GET:
+        Retrieve: the recipe's updated_at, its comment/rating aggregates and the
+        latest comment change (comments are embedded in the detail view, unless
+        left out by ?fields=/?expand=).
+        List: the same columns for every recipe on the requested page, plus the
+        total count in page-number mode.
+        """
+        if self.action == 'retrieve':
+            with_comments = self.field_selection.is_expanded('comments')
+            if served is not None:
+                last_comment_update = max(
+                    (comment.updated_at for comment in served.comments.all()), default=None
+                ) if with_comments else None
+                state = (served.updated_at, served.comment_count, served.rating_count,
+                         served.rating_sum, last_comment_update)
+            else:
+                last_comment_update = Value(None, output_field=DateTimeField())
+                if with_comments:
+                    last_comment_update = Subquery(Comment.objects.filter(
+                        recipe=OuterRef('pk')
+                    ).order_by('-updated_at').values('updated_at')[:1])
+                state = Recipe.objects.filter(pk=self.kwargs['pk']).annotate(
+                    last_comment_update=last_comment_update
+                ).values_list(
+                    'updated_at', 'comment_count', 'rating_count', 'rating_sum', 'last_comment_update'
+                ).first()
+                if state is None:
+                    # Let the regular handler answer with 404
+                    return None
+            return state, max(filter(None, (state[0], state[4])))
+
+        count, rows = self.get_page_state(
+            served,
+            self.filter_queryset(Recipe.objects.order_by('-created_at')),
+            ('id', 'created_at', 'updated_at', 'comment_count', 'rating_count', 'rating_sum')
+        )
+        return (count, rows), max((row[2] for row in rows), default=None)
+
+    def get_user_ratings(self, recipes):
+        """
+        Return a {recipe_id: rating} dict with the current user's ratings for
+        the given recipes, fetched in a single query.
+        """
+        queryset = self.get_user_ratings_queryset(recipes)
+        return dict(queryset) if queryset is not None else {}
+
+    async def aget_user_ratings(self, recipes):
+        """Async counterpart of get_user_ratings"""
+        queryset = self.get_user_ratings_queryset(recipes)
+        return {recipe_id: rating async for recipe_id, rating in queryset} if queryset is not None else {}
+
+    def get_user_ratings_queryset(self, recipes):
+        """
+        (recipe_id, rating) pairs of the user's ratings, None for anonymous
+        users and when user_rating isn't among the selected fields
+        """
+        user = self.request.user
+        if not user.is_authenticated or 'user_rating' not in self.field_selection:
+            return None
+        # From the database the recipes were read from, which streamed lists pick themselves.
+        # Recipes are rows of the compiled read path in the list, hence `id`
+        return DifficultyRating.objects.using(self.stream_database).filter(
+            rating_author_id=user.pk,
+            recipe_id__in=[recipe.id for recipe in recipes]
+        ).values_list('recipe_id', 'rating')
+
+    def paginate_queryset(self, queryset):
+        """Load the user's ratings for all recipes on the page at once"""
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            self.user_ratings = self.get_user_ratings(page)
+        return page
+
+    def get_object(self):
+        """Load the user's rating for the requested recipe"""
+        recipe = super().get_object()
+        self.user_ratings = self.get_user_ratings([recipe])
+        return recipe
+
+    async def apaginate_queryset(self, queryset):
+        page = await super().apaginate_queryset(queryset)
+        if page is not None:
+            self.user_ratings = await self.aget_user_ratings(page)
+        return page
+
+    async def aget_object(self):
+        recipe = await super().aget_object()
+        self.user_ratings = await self.aget_user_ratings([recipe])
+        return recipe
+
+    def serialize_chunk(self, recipes):
+        """Load the user's ratings for each chunk of a streamed list"""
+        self.user_ratings = self.get_user_ratings(recipes)
+        return super().serialize_chunk(recipes)
+
+    async def aserialize_chunk(self, recipes):
+        self.user_ratings = await self.aget_user_ratings(recipes)
+        return await super().aserialize_chunk(recipes)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream all recipes as NDJSON (see recipes/ndjson.py), in constant
+        memory. Under ASGI, Django reads sync streams like this one whole in
+        a worker thread: run large exports with the export_recipes command.
+        """
+        queryset = Recipe.objects.all()
+        exporter = RecipeExporter(queryset.using(queryset.db))
+        response = StreamingHttpResponse(exporter.lines(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="recipes.ndjson"'
+        return response
+
+    def get_serializer_context(self):
+        """Pass the user's ratings, when loaded, on to the serializer"""
+        context = super().get_serializer_context()
+        user_ratings = getattr(self, 'user_ratings', None)
+        if user_ratings is not None:
+            context['user_ratings'] = user_ratings
+        return context
+
     def get_permissions(self):
         """
-        List/Retrieve: anyone can access
+        List/Retrieve/Search/By ingredients/Trending: anyone can access
         Create: authenticated users
         Update/Delete: author or admin
+        Export: admin
         """
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'search', 'by_ingredients', 'trending']:
             permission_classes = [permissions.AllowAny]
+        elif self.action == 'export':
+            permission_classes = [permissions.IsAdminUser]
         elif self.action == 'create':
             permission_classes = [permissions.IsAuthenticated]
         else:
@@ -190,11 +538,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
     
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        serializer.save(author=get_full_user(self.request.user))
 
 @extend_schema_view(
     list=extend_schema(
         summary="List recipe comments",
+        description="List a recipe's comments, newest first. Follow the next link to load more, "
+                    "or pass stream=true to receive up to page_size comments (1000 by default, 5000 at most) "
+                    "streamed as {\"results\", \"next\"}.",
+        parameters=[
+            OpenApiParameter("cursor", OpenApiTypes.STR, location=OpenApiParameter.QUERY),
+            OpenApiParameter("stream", OpenApiTypes.BOOL, location=OpenApiParameter.QUERY),
+            OpenApiParameter("page_size", OpenApiTypes.INT, location=OpenApiParameter.QUERY,
+                             description="Rows per streamed page")
+        ],
         tags=['comments']
     ),
     create=extend_schema(
@@ -213,32 +570,79 @@ class RecipeViewSet(viewsets.ModelViewSet):
         tags=['comments']
     )
 )
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ReplicaReadMixin, StreamingListMixin, ConditionalGetMixin, InvalidateResponseCacheMixin, CompiledReadMixin, FieldSelectionMixin, AsyncReadMixin, viewsets.ModelViewSet):
+    """
+    ViewSet for managing recipe comments.
+    Comments are listed newest first, in cursor paginated pages.
+    Comment.save()/delete() keep the recipe's comment_count up to date.
+    """
     serializer_class = CommentSerializer
+    pagination_class = CommentCursorPagination
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
     throttle_classes = [RecipeUserThrottle, RecipeAnonThrottle]
+    # Read by the cursor pagination and conditional GET
+    required_columns = ('id', 'created_at', 'updated_at')
     
     def get_queryset(self):
         recipe_pk = self.kwargs.get('recipe_pk')
-        return Comment.objects.filter(recipe_id=recipe_pk).select_related('author', 'recipe')
+        # Only the recipe id is serialized, so there is no need to join the recipe
+        queryset = Comment.objects.filter(recipe_id=recipe_pk)
+        if self.action in self.field_selection_actions:
+            queryset = queryset.only(*self.get_selected_columns())
+        if self.field_selection.is_expanded('author'):
+            queryset = queryset.select_related('author')
+        return self.get_compiled_queryset(queryset)
+
+    def get_validators(self, served=None):
+        """
+        Describe the comment(s) returned, for conditional GET:
+        the comment's updated_at, or the id and updated_at of every comment
+        on the requested page for the list.
+        """
+        if self.action == 'retrieve':
+            if served is not None:
+                return served.updated_at, served.updated_at
+            updated_at = Comment.objects.filter(
+                pk=self.kwargs['pk'], recipe_id=self.kwargs.get('recipe_pk')
+            ).values_list('updated_at', flat=True).first()
+            return (updated_at, updated_at) if updated_at else None
+
+        count, rows = self.get_page_state(
+            served,
+            Comment.objects.filter(recipe_id=self.kwargs.get('recipe_pk')),
+            ('id', 'created_at', 'updated_at')
+        )
+        return rows, max((row[2] for row in rows), default=None)
     
     def perform_create(self, serializer):
         recipe_pk = self.kwargs.get('recipe_pk')
         recipe = get_object_or_404(Recipe, pk=recipe_pk)
         
         serializer.save(
-            author=self.request.user,
+            author=get_full_user(self.request.user),
             recipe=recipe
         )
 
 @extend_schema_view(
     list=extend_schema(
         summary="List recipe ratings",
+        description="List a recipe's ratings, newest first. Pass stream=true to stream them, "
+                    "page_size at a time (1000 by default, 5000 at most).",
+        parameters=[
+            OpenApiParameter("cursor", OpenApiTypes.STR, location=OpenApiParameter.QUERY,
+                             description="Position of a streamed page"),
+            OpenApiParameter("stream", OpenApiTypes.BOOL, location=OpenApiParameter.QUERY),
+            OpenApiParameter("page_size", OpenApiTypes.INT, location=OpenApiParameter.QUERY,
+                             description="Rows per streamed page")
+        ],
         tags=['ratings']
     ),
     create=extend_schema(
         summary="Rate recipe",
-        description="Add difficulty rating to recipe. One rating per user per recipe.",
+        description="Add difficulty rating to recipe. One rating per user per recipe: "
+                    "if you have already rated the recipe, your rating is updated instead "
+                    "and the response status is 200.",
+        responses={201: DifficultyRatingSerializer, 200: DifficultyRatingSerializer},
         tags=['ratings']
     ),
     update=extend_schema(
@@ -252,45 +656,163 @@ class CommentViewSet(viewsets.ModelViewSet):
         tags=['ratings']
     )
 )
-class DifficultyRatingViewSet(viewsets.ModelViewSet):
+class DifficultyRatingViewSet(ReplicaReadMixin, StreamingListMixin, ConditionalGetMixin, InvalidateResponseCacheMixin, CompiledReadMixin, FieldSelectionMixin, AsyncReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing recipe difficulty ratings.
-    Ensures each user can only rate a recipe once but can update their rating.
+    Each user has one rating per recipe: rating it again updates that rating.
+    DifficultyRating.save()/delete() keep the recipe's rating aggregates up to date.
     """
     serializer_class = DifficultyRatingSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
     throttle_classes = [RecipeUserThrottle, RecipeAnonThrottle]
-    
+    # Read by conditional GET and the stream pages
+    required_columns = ('id', 'created_at', 'updated_at')
+
     def get_queryset(self):
-        """Get all ratings for a specific recipe with efficient joins"""
+        """
+        Get all ratings for a specific recipe, with their authors unless they
+        aren't expanded. The recipe isn't serialized, so it isn't joined.
+        """
         recipe_pk = self.kwargs.get('recipe_pk')
-        return DifficultyRating.objects.filter(
-            recipe_id=recipe_pk
-        ).select_related('rating_author', 'recipe')
+        queryset = DifficultyRating.objects.filter(recipe_id=recipe_pk)
+        if self.action in self.field_selection_actions:
+            queryset = queryset.only(*self.get_selected_columns())
+        if self.field_selection.is_expanded('rating_author'):
+            queryset = queryset.select_related('rating_author')
+        return self.get_compiled_queryset(queryset)
+
+    def get_validators(self, served=None):
+        """
+        Describe the rating(s) returned, for conditional GET:
+        the rating's updated_at, or the number of ratings on the recipe and
+        the latest rating change for the list.
+        """
+        if self.action == 'retrieve':
+            if served is not None:
+                return served.updated_at, served.updated_at
+            updated_at = DifficultyRating.objects.filter(
+                pk=self.kwargs['pk'], recipe_id=self.kwargs.get('recipe_pk')
+            ).values_list('updated_at', flat=True).first()
+            return (updated_at, updated_at) if updated_at else None
+
+        if served is not None:
+            last_update = max((rating.updated_at for rating in served), default=None)
+            return (len(served), last_update), last_update
+        state = DifficultyRating.objects.filter(
+            recipe_id=self.kwargs.get('recipe_pk')
+        ).aggregate(count=Count('pk'), last_update=Max('updated_at'))
+        return (state['count'], state['last_update']), state['last_update']
     
+    def create(self, request, *args, **kwargs):
+        """Rate the recipe, or update the user's rating if they have already rated it"""
+        response = super().create(request, *args, **kwargs)
+        if not self.rating_created:
+            response.status_code = status.HTTP_200_OK
+        return response
+
     def perform_create(self, serializer):
         """
-        Create a new rating, ensuring one rating per user per recipe.
-        If user has already rated, raises ValidationError with helpful message.
+        Create or update the user's rating with DifficultyRating.rate(), a
+        single upsert on the one-rating-per-user-per-recipe unique key, so
+        concurrent POSTs by the same user can't both create a rating.
         """
-        recipe_pk = self.kwargs.get('recipe_pk')
-        recipe = get_object_or_404(Recipe, pk=recipe_pk)
-        
-        # Check for existing rating
-        if DifficultyRating.objects.filter(
-            recipe=recipe,
-            rating_author=self.request.user
-        ).exists():
-            raise ValidationError({
-                "detail": "You have already given a difficulty rating for this recipe. If you want to change your rating, update it."
-            })
-            
-        # Create new rating
-        serializer.save(
-            rating_author=self.request.user,
-            recipe=recipe
-        )
+        try:
+            recipe_id = int(self.kwargs.get('recipe_pk'))
+        except ValueError:
+            raise Http404
+        try:
+            serializer.instance, self.rating_created = DifficultyRating.rate(
+                recipe_id,
+                self.request.user.pk,
+                serializer.validated_data['rating']
+            )
+        except Recipe.DoesNotExist:
+            raise Http404
     
     def perform_update(self, serializer):
         """Update existing rating, maintaining data consistency"""
         serializer.save()
+
+
+@extend_schema(
+    summary="Write ratings and comments in bulk",
+    description="Create or update many of the user's difficulty ratings and add many comments in one "
+                "request. Items are validated one by one: invalid ones are reported and the others "
+                "are written together. `results` list one entry per item, in request order, with a "
+                "`status` of created, updated, superseded (a later rating of the same recipe in the "
+                "request wins) or invalid (with `errors`). Comment ids are null on databases that "
+                "don't report them for bulk inserts (MySQL).",
+    request=BulkWriteSerializer,
+    responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+    tags=['ratings', 'comments']
+)
+class BulkWriteView(ReplicaReadMixin, InvalidateResponseCacheMixin, generics.GenericAPIView):
+    """
+    Bulk write endpoint for importers and clients syncing offline changes.
+    However many items are sent, the writes take a constant number of
+    queries: one to lock the recipes (which also checks they exist), one
+    upsert for the ratings and one insert for the comments, plus the
+    aggregate updates.
+    """
+    serializer_class = BulkWriteSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [RecipeUserThrottle, RecipeAnonThrottle]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rating_results, ratings = self.validate_items(BulkRatingSerializer, serializer.validated_data['ratings'])
+        comment_results, comments = self.validate_items(BulkCommentSerializer, serializer.validated_data['comments'])
+        user_id = request.user.pk
+
+        with transaction.atomic():
+            recipe_ids = Recipe.lock_for_update({data['recipe_id'] for data in [*ratings.values(), *comments.values()]})
+            for results, items in ((rating_results, ratings), (comment_results, comments)):
+                for index, data in list(items.items()):
+                    if data['recipe_id'] not in recipe_ids:
+                        results[index] = {'status': 'invalid', 'errors': {'recipe_id': ['Recipe not found.']}}
+                        del items[index]
+
+            # Only the last rating of a recipe is written
+            latest = {}
+            for index, data in ratings.items():
+                if data['recipe_id'] in latest:
+                    rating_results[latest[data['recipe_id']]] = {'status': 'superseded'}
+                latest[data['recipe_id']] = index
+            if latest:
+                created = DifficultyRating.bulk_upsert(
+                    user_id, {recipe_id: ratings[index]['rating'] for recipe_id, index in latest.items()}
+                )
+                rating_ids = dict(DifficultyRating.objects.filter(
+                    rating_author_id=user_id, recipe_id__in=latest
+                ).order_by().values_list('recipe_id', 'id'))
+                for recipe_id, index in latest.items():
+                    rating_results[index] = {
+                        'status': 'created' if created[recipe_id] else 'updated',
+                        'id': rating_ids[recipe_id],
+                    }
+
+            if comments:
+                new_comments = Comment.bulk_add([
+                    Comment(recipe_id=data['recipe_id'], author_id=user_id, content=data['content'])
+                    for data in comments.values()
+                ])
+                for index, comment in zip(comments, new_comments):
+                    comment_results[index] = {'status': 'created', 'id': comment.pk}
+
+        return Response({'ratings': rating_results, 'comments': comment_results})
+
+    def validate_items(self, serializer_class, items):
+        """
+        Validate each item on its own. Returns the list of results, holding the
+        errors of invalid items, and the validated data of the others by index.
+        """
+        results = [None] * len(items)
+        valid = {}
+        for index, item in enumerate(items):
+            serializer = serializer_class(data=item)
+            if serializer.is_valid():
+                valid[index] = serializer.validated_data
+            else:
+                results[index] = {'status': 'invalid', 'errors': serializer.errors}
+        return results, valid
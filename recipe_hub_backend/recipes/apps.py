@@ -1,8 +1,30 @@
 # recipe_hub_backend\recipes\apps.py
 
 from django.apps import AppConfig
+from django.conf import settings
+from django.core import checks
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from .search import install_search_triggers
+        post_migrate.connect(install_search_triggers, sender=self)
+
+        # Deletes keep the recipe aggregates in sync through signals, which also
+        # fire for cascades (e.g. from a deleted user) and queryset deletes
+        from .models import Comment, DifficultyRating, comment_deleted, rating_deleted
+        post_delete.connect(comment_deleted, sender=Comment)
+        post_delete.connect(rating_deleted, sender=DifficultyRating)
+
+        from .api.users import check_user_cache, forget_cached_user
+        post_save.connect(forget_cached_user, sender=settings.AUTH_USER_MODEL)
+        post_delete.connect(forget_cached_user, sender=settings.AUTH_USER_MODEL)
+        checks.register(check_user_cache)
+
+        from .metrics import install_query_recorder
+        connection_created.connect(install_query_recorder)
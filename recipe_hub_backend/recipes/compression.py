@@ -0,0 +1,165 @@
+# recipes/compression.py
+
+'''
+gzip/brotli compression of responses.
+
+CompressionMiddleware (recipes/middleware.py) compresses the API's JSON and
+NDJSON responses of RECIPE_COMPRESSION_MIN_SIZE bytes or more, with the best
+encoding the client accepts: brotli when the brotli package is installed,
+gzip otherwise. Smaller bodies are sent as they are, where compression would
+save a few bytes at best. Streamed responses are compressed one chunk at a
+time, each chunk flushed so the client receives it right away.
+
+HTML pages (admin, browsable API login) are never compressed: they carry the
+CSRF token, which a compressed body would expose to BREACH (an attacker
+reflecting guesses into the page and watching the compressed length). For
+the same reason, responses setting cookies are sent uncompressed. API
+responses authenticate with bearer tokens, which are never in the body.
+
+The response cache (recipes/api/cache.py) stores its JSON bodies compressed
+with every available encoding, so cache hits are served without compressing
+anything.
+
+Compressed responses get a weak ETag: their bytes differ from the
+uncompressed ones, but they represent the same content, so conditional
+requests match either (Django compares If-None-Match weakly).
+'''
+
+import gzip
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+# Brotli's levels above 5 cost much more CPU for little gain on dynamic content
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = re.compile(r'^application/(json|x-ndjson)\s*(;|$)')
+ACCEPTED_ENCODING = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def get_encodings():
+    """The available encodings, preferred first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding, encodings=None):
+    """The preferred encoding among `encodings` accepted by the Accept-Encoding header, or None"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        match = ACCEPTED_ENCODING.match(part)
+        if match:
+            try:
+                accepted[match[1].lower()] = float(match[2]) if match[2] else 1.0
+            except ValueError:
+                continue
+    if encodings is None:
+        encodings = get_encodings()
+    best, best_quality = None, 0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    # mtime=0: the same body always compresses to the same bytes
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class StreamCompressor:
+    """Compresses a stream chunk by chunk, flushing the output of every chunk"""
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits=31: with the gzip header and trailer
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress_chunk(self, chunk):
+        if self.encoding == 'br':
+            return self.compressor.process(chunk) + self.compressor.flush()
+        return self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        """The end of the stream"""
+        if self.encoding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+def compress_chunks(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    for chunk in chunks:
+        if chunk:
+            yield compressor.compress_chunk(chunk)
+    yield compressor.finish()
+
+
+async def acompress_chunks(chunks, encoding):
+    """Async counterpart of compress_chunks, for an async iterable"""
+    compressor = StreamCompressor(encoding)
+    async for chunk in chunks:
+        if chunk:
+            yield compressor.compress_chunk(chunk)
+    yield compressor.finish()
+
+
+def is_compressible(response):
+    """Whether the response's content type and size are worth compressing, and safe to compress"""
+    if (
+        response.has_header('Content-Encoding')
+        or not COMPRESSIBLE_TYPES.match(response.get('Content-Type', ''))
+        or response.cookies
+    ):
+        return False
+    return response.streaming or len(response.content) >= settings.RECIPE_COMPRESSION_MIN_SIZE
+
+
+def set_encoding_headers(response, encoding):
+    """Describe a body compressed with `encoding` (None: not compressed) in the headers"""
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if encoding is None:
+        return
+    response['Content-Encoding'] = encoding
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+
+
+def compress_response(request, response):
+    """Compress the response with the client's preferred encoding, if it is worth it"""
+    if not is_compressible(response):
+        return response
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if encoding is None:
+        set_encoding_headers(response, None)
+        return response
+
+    if response.streaming:
+        if response.is_async:
+            response.streaming_content = acompress_chunks(response.streaming_content, encoding)
+        else:
+            response.streaming_content = compress_chunks(response.streaming_content, encoding)
+        # The length isn't known before the end of the stream
+        del response['Content-Length']
+    else:
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            set_encoding_headers(response, None)
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+    set_encoding_headers(response, encoding)
+    return response
@@ -0,0 +1,43 @@
+# recipes/ingredients.py
+
+'''
+Parsing of the free-text Recipe.ingredients field into normalized ingredient
+names, as stored in the Ingredient table.
+
+Recipes list one ingredient per line, sometimes with a quantity or a list
+marker in front ("- 200 g flour", "2 Eggs"). Names are reduced to the
+ingredient itself in lower case, so "Eggs" and "2 eggs" point to the same
+Ingredient row.
+'''
+
+import re
+
+# Must match Ingredient.name's max_length
+MAX_NAME_LENGTH = 100
+
+LIST_MARKER_RE = re.compile(r'^\s*(?:[-*•]|\d+[.)](?=\s))\s*')
+# A quantity, optionally followed by a unit: "2 ", "1/2 cup of ", "200g "
+QUANTITY_RE = re.compile(
+    r'^[\d½¼¾⅓⅔/.,\s-]*[\d½¼¾⅓⅔]'
+    r'(?:\s*(?:g|kg|mg|ml|cl|dl|l|oz|lb|lbs|cups?|tbsp|tsp|tablespoons?|teaspoons?|'
+    r'pinch(?:es)?|cloves?|slices?|cans?|pieces?|x)\b\.?|(?=\s))\s*(?:of\s+)?',
+    re.IGNORECASE
+)
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_ingredient(line):
+    """Return the normalized ingredient name of a line, or '' if there is none"""
+    name = LIST_MARKER_RE.sub('', line)
+    name = QUANTITY_RE.sub('', name)
+    name = WHITESPACE_RE.sub(' ', name).strip(' .,;:').lower()
+    return name[:MAX_NAME_LENGTH]
+
+
+def parse_ingredients(text):
+    """
+    Return the distinct normalized ingredient names of a recipe's ingredients
+    text, in the order they are listed.
+    """
+    names = (normalize_ingredient(line) for line in text.splitlines())
+    return list(dict.fromkeys(name for name in names if name))
@@ -0,0 +1,60 @@
+# recipe_hub_backend/recipes/management/commands/export_recipes.py
+
+'''
+Exports recipes with their comments and difficulty ratings as NDJSON, one
+recipe per line (see recipes/ndjson.py for the format). Recipes are streamed
+from the database in chunks, so memory use stays constant whatever the size
+of the dataset. Load the file with `manage.py import_recipes`.
+'''
+
+import time
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+from recipes.ndjson import RecipeExporter
+
+
+class Command(BaseCommand):
+    help = 'Export recipes, comments and ratings as NDJSON (one recipe per line)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            nargs='?',
+            default='-',
+            help='File to write, or - for standard output (default)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of recipes read from the database at a time (default: 1000)'
+        )
+        parser.add_argument(
+            '--author',
+            help='Only export the recipes of this username'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Recipe.objects.all()
+        if options['author']:
+            queryset = queryset.filter(author__username=options['author'])
+        exporter = RecipeExporter(queryset, chunk_size=options['chunk_size'])
+        started = time.monotonic()
+
+        if options['output'] == '-':
+            for line in exporter.lines():
+                self.stdout.write(line, ending='')
+            # Keep the report out of the exported data
+            report = self.stderr
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.writelines(exporter.lines())
+            report = self.stdout
+
+        elapsed = time.monotonic() - started
+        counts = exporter.counts
+        rows = sum(counts.values())
+        report.write(self.style.SUCCESS(
+            f'Exported {counts["recipes"]} recipes, {counts["comments"]} comments and '
+            f'{counts["ratings"]} ratings in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
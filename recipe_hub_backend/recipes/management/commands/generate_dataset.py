@@ -0,0 +1,164 @@
+# recipe_hub_backend/recipes/management/commands/generate_dataset.py
+
+'''
+Generates a synthetic dataset of users, recipes, comments and difficulty
+ratings, for load tests and benchmarks (see scripts/benchmark_api.py).
+
+The data is deterministic: the same options and --seed always produce the
+same rows, with timestamps relative to the time of the run. Popularity is
+skewed like on a real site: authors, and the recipes that get comments and
+ratings, are picked with Zipf-like weights (the k-th most popular gets a
+weight of 1 / k ** --skew), so a few recipes collect most of the activity
+and most have little or none.
+
+Rows are written through the NDJSON importer (recipes/ndjson.py), in chunks
+with bulk_create(), with the recipe aggregates, structured ingredients and
+trending scores filled in.
+'''
+
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from recipes.ndjson import RecipeImporter
+
+WORDS = (
+    'quick', 'spicy', 'creamy', 'classic', 'smoky', 'crispy', 'rustic', 'summer', 'winter', 'lemon',
+    'garlic', 'honey', 'herb', 'roasted', 'baked', 'grilled', 'slow-cooked', 'fresh', 'golden', 'simple',
+)
+DISHES = (
+    'pasta', 'soup', 'salad', 'curry', 'stew', 'risotto', 'pie', 'tart', 'bread', 'cake',
+    'omelette', 'tacos', 'noodles', 'casserole', 'pancakes', 'chili', 'gratin', 'burger', 'pizza', 'muffins',
+)
+INGREDIENTS = (
+    'flour', 'eggs', 'milk', 'butter', 'sugar', 'salt', 'pepper', 'olive oil', 'garlic', 'onion',
+    'tomatoes', 'chicken', 'beef', 'rice', 'pasta', 'cheese', 'cream', 'lemon', 'basil', 'parsley',
+    'carrots', 'potatoes', 'mushrooms', 'spinach', 'honey', 'yogurt', 'chickpeas', 'lentils', 'paprika', 'cumin',
+)
+QUANTITIES = ('1', '2', '3', '100 g', '200 g', '1 cup', '2 tbsp', '1 tsp', '1 pinch')
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic dataset with skewed popularity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Number of users (default: 100)')
+        parser.add_argument('--recipes', type=int, default=1000, help='Number of recipes (default: 1000)')
+        parser.add_argument('--comments', type=int, default=10000, help='Number of comments (default: 10000)')
+        parser.add_argument(
+            '--ratings',
+            type=int,
+            default=5000,
+            help='Number of difficulty ratings, at most one per user and recipe (default: 5000)'
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.0,
+            help='Exponent of the Zipf-like popularity, 0 for uniform (default: 1.0)'
+        )
+        parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+        parser.add_argument(
+            '--username-prefix',
+            default='user',
+            help='Users are named <prefix>1, <prefix>2... Existing ones are reused (default: user)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of recipes written per transaction (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('At least one user is needed.')
+        rng = random.Random(options['seed'])
+        started = time.monotonic()
+
+        usernames = [f'{options["username_prefix"]}{i}' for i in range(1, options['users'] + 1)]
+        users = [User(username=username) for username in usernames]
+        for user in users:
+            user.set_unusable_password()
+        User.objects.bulk_create(users, ignore_conflicts=True)
+
+        importer = RecipeImporter(chunk_size=options['chunk_size'])
+        importer.user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+        counts = importer.import_records(enumerate(
+            self.generate_records(rng, usernames, options), start=1
+        ))
+
+        elapsed = time.monotonic() - started
+        rows = len(usernames) + counts['recipes'] + counts['comments'] + counts['ratings']
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(usernames)} users, {counts["recipes"]} recipes, {counts["comments"]} comments '
+            f'and {counts["ratings"]} ratings in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
+
+    def generate_records(self, rng, usernames, options):
+        """Yield the records of the recipes, in the format of recipes/ndjson.py"""
+        recipe_total = options['recipes']
+        if not recipe_total:
+            return
+        skew = options['skew']
+        # Popularity ranks are shuffled, so that the most popular recipes
+        # aren't the oldest ones
+        ranks = list(range(1, recipe_total + 1))
+        rng.shuffle(ranks)
+        recipe_weights = list(accumulate(1 / rank ** skew for rank in ranks))
+        author_weights = list(accumulate(1 / rank ** skew for rank in range(1, len(usernames) + 1)))
+
+        comment_counts = self.distribute(rng, recipe_weights, options['comments'])
+        rating_counts = self.distribute(rng, recipe_weights, options['ratings'])
+        now = timezone.now().replace(microsecond=0)
+        # Recipes are spread over a year, oldest first, with their activity after them
+        span = timedelta(days=365)
+
+        for index in range(recipe_total):
+            created_at = now - span + span * index / recipe_total
+            age = now - created_at
+            ingredients = rng.sample(INGREDIENTS, rng.randint(3, 10))
+            record = {
+                'title': f'{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {rng.choice(DISHES)}',
+                'description': f'A {rng.choice(WORDS)} {rng.choice(DISHES)} with {" and ".join(ingredients[:2])}.',
+                'ingredients': '\n'.join(f'{rng.choice(QUANTITIES)} {name}' for name in ingredients),
+                'instructions': '\n'.join(f'Step {step}: {rng.choice(WORDS)} the {rng.choice(ingredients)}.'
+                                          for step in range(1, rng.randint(3, 8))),
+                'cooking_time': rng.choice((10, 15, 20, 30, 45, 60, 90, 120)),
+                'author': self.pick(rng, usernames, author_weights),
+                'created_at': created_at.isoformat(),
+                'updated_at': created_at.isoformat(),
+            }
+            record['comments'] = []
+            for _ in range(comment_counts.get(index, 0)):
+                commented_at = (created_at + age * rng.random()).isoformat()
+                record['comments'].append({
+                    'author': self.pick(rng, usernames, author_weights),
+                    'content': f'{rng.choice(WORDS).capitalize()} {rng.choice(DISHES)}, '
+                               f'would make it {rng.choice(WORDS)} next time.',
+                    'created_at': commented_at,
+                    'updated_at': commented_at,
+                })
+            raters = rng.sample(usernames, min(rating_counts.get(index, 0), len(usernames)))
+            record['ratings'] = []
+            for username in raters:
+                rated_at = (created_at + age * rng.random()).isoformat()
+                record['ratings'].append({
+                    'author': username,
+                    'rating': rng.choices((1, 2, 3, 4, 5), weights=(1, 3, 4, 3, 1))[0],
+                    'created_at': rated_at,
+                    'updated_at': rated_at,
+                })
+            yield record
+
+    def distribute(self, rng, cum_weights, total):
+        """Spread `total` items over the indexes of the cumulative weights, return {index: count}"""
+        return Counter(rng.choices(range(len(cum_weights)), cum_weights=cum_weights, k=total))
+
+    def pick(self, rng, values, cum_weights):
+        return rng.choices(values, cum_weights=cum_weights)[0]
@@ -0,0 +1,62 @@
+# recipe_hub_backend/recipes/management/commands/import_recipes.py
+
+'''
+Imports recipes with their comments and difficulty ratings from NDJSON, as
+written by `manage.py export_recipes` (see recipes/ndjson.py for the format).
+The file is read line by line and written in chunks with bulk_create(), so
+memory use stays constant whatever the size of the dataset, unlike loaddata
+which loads the whole fixture and saves objects one by one.
+
+Each chunk is committed on its own: if a line is invalid, the chunks before
+it stay imported.
+'''
+
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from recipes.ndjson import RecipeImporter, RecipeImportError
+
+
+class Command(BaseCommand):
+    help = 'Import recipes, comments and ratings from NDJSON (one recipe per line)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            nargs='?',
+            default='-',
+            help='File to read, or - for standard input (default)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of recipes written per transaction (default: 1000)'
+        )
+        parser.add_argument(
+            '--create-users',
+            action='store_true',
+            help='Create the users the file references but the database lacks, without a usable password'
+        )
+
+    def handle(self, *args, **options):
+        importer = RecipeImporter(chunk_size=options['chunk_size'], create_users=options['create_users'])
+        started = time.monotonic()
+        try:
+            if options['input'] == '-':
+                importer.run(sys.stdin)
+            else:
+                with open(options['input'], encoding='utf-8') as lines:
+                    importer.run(lines)
+        except (OSError, RecipeImportError) as exc:
+            raise CommandError(f'{exc} ({importer.counts["recipes"]} recipes imported before the error)')
+
+        elapsed = time.monotonic() - started
+        counts = importer.counts
+        rows = counts['recipes'] + counts['comments'] + counts['ratings']
+        created_users = f', created {counts["users"]} users' if counts['users'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {counts["recipes"]} recipes, {counts["comments"]} comments and '
+            f'{counts["ratings"]} ratings{created_users} in {elapsed:.2f}s '
+            f'({rows / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
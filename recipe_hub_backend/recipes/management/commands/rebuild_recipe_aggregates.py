@@ -0,0 +1,52 @@
+# recipe_hub_backend/recipes/management/commands/rebuild_recipe_aggregates.py
+
+'''
+Recalculates the denormalized comment/rating aggregates stored on Recipe.
+The aggregates are maintained incrementally on every write, including
+cascading and queryset deletes, so this is only needed after bulk operations
+that bypass Comment/DifficultyRating save() and the delete signals, e.g.
+loaddata, raw SQL or _raw_delete().
+'''
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Rebuild comment_count, rating_count and rating_sum for all recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of recipes updated per UPDATE statement (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        updated = 0
+        last_pk = 0
+
+        # Walk the table in primary key ranges so each UPDATE stays small
+        while True:
+            pks = list(
+                Recipe.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            with transaction.atomic():
+                updated += Recipe.rebuild_aggregates(
+                    Recipe.objects.filter(pk__gte=pks[0], pk__lte=pks[-1])
+                )
+            last_pk = pks[-1]
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt aggregates for {updated} recipes in {elapsed:.2f}s'
+        ))
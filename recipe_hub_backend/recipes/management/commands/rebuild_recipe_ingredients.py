@@ -0,0 +1,49 @@
+# recipe_hub_backend/recipes/management/commands/rebuild_recipe_ingredients.py
+
+'''
+Rebuilds the structured ingredients (RecipeIngredient rows) of all recipes
+from their ingredients text. Recipe.save() keeps them in sync, so this is only
+needed after bulk operations that bypass it, e.g. loaddata or queryset updates.
+'''
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the structured ingredients of all recipes from their ingredients text'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of recipes processed per batch (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        updated = 0
+        last_pk = 0
+
+        # Walk the table in primary key ranges so each batch stays small
+        while True:
+            recipes = list(
+                Recipe.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .only('pk', 'ingredients')[:batch_size]
+            )
+            if not recipes:
+                break
+            with transaction.atomic():
+                Recipe.link_ingredients(recipes)
+            updated += len(recipes)
+            last_pk = recipes[-1].pk
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt ingredients for {updated} recipes in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,51 @@
+# recipe_hub_backend/recipes/management/commands/rebuild_trending_scores.py
+
+'''
+Recomputes the trending scores of all recipes (see recipes/trending.py).
+Scores are raised incrementally by every comment and rating; run this
+periodically (e.g. hourly from cron) to drop the activity of removed
+comments and ratings and to score rows written in bulk without the model
+methods, and after changing RECIPE_TRENDING_HALF_LIFE_HOURS.
+'''
+
+import time
+from django.core.management.base import BaseCommand
+from recipes.api.cache import bump_generation
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the trending scores of all recipes from their recent activity'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of recipes updated per UPDATE statement (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        updated = 0
+        last_pk = 0
+
+        # Walk the table in primary key order so each UPDATE stays small
+        while True:
+            pks = list(
+                Recipe.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            updated += Recipe.rebuild_trending_scores(pks)
+            last_pk = pks[-1]
+
+        # The cached trending feeds are ordered by the old scores
+        bump_generation()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt trending scores for {updated} recipes in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,189 @@
+# recipes/metrics.py
+
+'''
+Per-request metrics, exposed in the Prometheus text format at /metrics.
+
+RequestMetricsMiddleware (recipes/middleware.py) measures a sample of the
+requests (RECIPE_METRICS_SAMPLE_RATE) and records, per route, method and
+viewset action:
+- the total latency and the response size
+- the number of SQL queries and the time spent running them, counted by an
+  execute wrapper installed on every database connection (see
+  install_query_recorder)
+- the time spent serializing (see TimedRepresentationMixin)
+
+Requests running more than RECIPE_METRICS_QUERY_WARNING queries are logged
+as warnings, so N+1 query regressions show up at once.
+
+The histograms live in the memory of each process: every worker process
+exposes its own, and they start over when the process restarts.
+'''
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Measurements of the request being handled, None if it isn't sampled
+current_request = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Measurements of a single request"""
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+
+class Histogram:
+    """A Prometheus histogram, with one series per combination of label values"""
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # {labels: [bucket counts..., sum, count]}
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series.setdefault(labels, [0] * len(self.buckets) + [0, 0])
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self, label_names):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, series in sorted(self.series.items()):
+            label_text = format_labels(zip(label_names, labels))
+            for bound, count in zip(self.buckets, series):
+                yield f'{self.name}_bucket{{{label_text},le="{bound:g}"}} {count}'
+            yield f'{self.name}_bucket{{{label_text},le="+Inf"}} {series[-1]}'
+            yield f'{self.name}_sum{{{label_text}}} {series[-2]:g}'
+            yield f'{self.name}_count{{{label_text}}} {series[-1]}'
+
+
+class MetricsRegistry:
+    """The request histograms of this process"""
+    label_names = ('route', 'method', 'action')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.histograms = {
+                'duration': Histogram(
+                    'recipe_hub_request_duration_seconds', 'Time to build the response.', DURATION_BUCKETS
+                ),
+                'queries': Histogram(
+                    'recipe_hub_request_db_queries', 'SQL queries run by a request.', QUERY_BUCKETS
+                ),
+                'query_time': Histogram(
+                    'recipe_hub_request_db_duration_seconds', 'Time spent running SQL queries.', DURATION_BUCKETS
+                ),
+                'serializer_time': Histogram(
+                    'recipe_hub_request_serializer_duration_seconds', 'Time spent serializing.', DURATION_BUCKETS
+                ),
+                'size': Histogram(
+                    'recipe_hub_response_size_bytes', 'Size of the response body.', SIZE_BUCKETS
+                ),
+            }
+
+    def record(self, route, method, action, status, duration, metrics, size=None):
+        """Record a measured request. `size` is None for streamed responses."""
+        labels = (route, method, action)
+        with self.lock:
+            key = (*labels, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.histograms['duration'].observe(labels, duration)
+            self.histograms['queries'].observe(labels, metrics.queries)
+            self.histograms['query_time'].observe(labels, metrics.query_time)
+            self.histograms['serializer_time'].observe(labels, metrics.serializer_time)
+            if size is not None:
+                self.histograms['size'].observe(labels, size)
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format"""
+        with self.lock:
+            lines = [
+                '# HELP recipe_hub_requests_total Measured requests.',
+                '# TYPE recipe_hub_requests_total counter',
+            ]
+            for key, count in sorted(self.requests.items()):
+                lines.append(
+                    f'recipe_hub_requests_total{{{format_labels(zip((*self.label_names, "status"), key))}}} {count}'
+                )
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render(self.label_names))
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(pairs):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper counting the queries of the measured request, and their time"""
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.query_time += time.perf_counter() - started
+        metrics.queries += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver adding record_query to every new connection"""
+    if record_query not in connection.execute_wrappers:
+        # First in the list: connection.execute_wrapper() blocks pop the last one on exit
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextmanager
+def timed_serialization():
+    """Add the time spent in the block to the measured request's serializer time"""
+    metrics = current_request.get()
+    if metrics is None:
+        yield
+        return
+    # Nested serializers run inside their parent's time
+    metrics.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_depth -= 1
+        if not metrics.serializer_depth:
+            metrics.serializer_time += time.perf_counter() - started
+
+
+class TimedRepresentationMixin:
+    """
+    Serializer mixin recording the time spent in to_representation() as
+    serializer time of the measured request. Lists are timed per item.
+    """
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
@@ -0,0 +1,118 @@
+# recipes/middleware.py
+
+import logging
+import random
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .compression import compress_response
+from .metrics import RequestMetrics, current_request, registry
+
+logger = logging.getLogger('recipes.metrics')
+
+# Named groups of the regex routes registered by DRF routers
+NAMED_GROUP = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures a sample of the requests (RECIPE_METRICS_SAMPLE_RATE, from 0 to
+    1) and records them in the metrics registry (see recipes/metrics.py).
+    Works in both sync (WSGI) and async (ASGI) mode, so it doesn't make the
+    async read views hop to a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_sampled():
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.is_sampled():
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    def is_sampled(self):
+        rate = settings.RECIPE_METRICS_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def record(self, request, response, metrics, duration):
+        route, action = get_route(request)
+        # The body of streamed responses isn't built yet
+        size = None if response.streaming else len(response.content)
+        registry.record(route, request.method, action, response.status_code, duration, metrics, size)
+
+        limit = settings.RECIPE_METRICS_QUERY_WARNING
+        if limit and metrics.queries > limit:
+            logger.warning(
+                '%s %s (%s) ran %d SQL queries (more than %d) in %.1f ms',
+                request.method, request.path, action or route, metrics.queries, limit,
+                metrics.query_time * 1000
+            )
+
+
+def get_route(request):
+    """
+    The URL pattern and viewset action that served the request, e.g.
+    ('api/recipes/<pk>/', 'retrieve'), so that all recipes share a series.
+    """
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched', ''
+    actions = getattr(match.func, 'actions', None) or {}
+    # Routers register regexes: '^recipes/(?P<pk>[^/.]+)/$' becomes 'recipes/<pk>/'
+    route = NAMED_GROUP.sub(r'<\1>', match.route).replace('^', '').replace('$', '')
+    return route, actions.get(request.method.lower(), '')
+
+
+class CompressionMiddleware:
+    """
+    Compresses the JSON and NDJSON responses of RECIPE_COMPRESSION_MIN_SIZE
+    bytes or more, and streamed ones, with gzip or brotli (see recipes/compression.py).
+    Works in both sync and async mode, like RequestMetricsMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return compress_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return compress_response(request, await self.get_response(request))
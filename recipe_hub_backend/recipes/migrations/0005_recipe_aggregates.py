@@ -0,0 +1,55 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:10
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_aggregates(apps, schema_editor):
+    """Fill the new aggregate columns from the existing comments and ratings"""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Comment = apps.get_model('recipes', 'Comment')
+    DifficultyRating = apps.get_model('recipes', 'DifficultyRating')
+
+    comments = Comment.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe').annotate(total=Count('pk')).values('total')
+    ratings = DifficultyRating.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe')
+
+    Recipe.objects.update(
+        comment_count=Coalesce(Subquery(comments, output_field=IntegerField()), 0),
+        rating_count=Coalesce(
+            Subquery(ratings.annotate(total=Count('pk')).values('total'), output_field=IntegerField()), 0
+        ),
+        rating_sum=Coalesce(
+            Subquery(ratings.annotate(total=Sum('rating')).values('total'), output_field=IntegerField()), 0
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_difficultyrating_alter_recipe_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='comment_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='recipes_com_created_0ce5f3_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['recipe', 'created_at', 'id'], name='recipes_com_recipe__0ee745_idx'),
+        ),
+    ]
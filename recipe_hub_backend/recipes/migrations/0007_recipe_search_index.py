@@ -0,0 +1,59 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:31
+
+from django.db import migrations
+
+# Full-text index used by recipes.search. Django has no portable full-text
+# index, so it is created with database specific SQL.
+
+MYSQL_CREATE = (
+    'CREATE FULLTEXT INDEX recipes_recipe_search_idx'
+    ' ON recipes_recipe (title, description, ingredients)'
+)
+MYSQL_DROP = 'DROP INDEX recipes_recipe_search_idx ON recipes_recipe'
+
+# External content FTS5 table: it stores only the index, the text stays in
+# recipes_recipe. The triggers keeping it in sync are installed after every
+# migrate run (see recipes.search.install_search_triggers), because SQLite
+# table rebuilds done by later migrations drop them.
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5("
+    " title, description, ingredients,"
+    " content='recipes_recipe', content_rowid='id')",
+    # Index the recipes that already exist
+    "INSERT INTO recipes_recipe_fts (recipes_recipe_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(MYSQL_CREATE)
+    elif vendor == 'sqlite':
+        for statement in SQLITE_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(MYSQL_DROP)
+    elif vendor == 'sqlite':
+        for statement in SQLITE_DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_comment_recipe_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
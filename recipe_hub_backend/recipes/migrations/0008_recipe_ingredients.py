@@ -0,0 +1,103 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:23
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# A copy of the parsing in recipes/ingredients.py as of this migration, so that
+# later changes to the app code don't change what the migration does
+MAX_NAME_LENGTH = 100
+LIST_MARKER_RE = re.compile(r'^\s*(?:[-*•]|\d+[.)](?=\s))\s*')
+QUANTITY_RE = re.compile(
+    r'^[\d½¼¾⅓⅔/.,\s-]*[\d½¼¾⅓⅔]'
+    r'(?:\s*(?:g|kg|mg|ml|cl|dl|l|oz|lb|lbs|cups?|tbsp|tsp|tablespoons?|teaspoons?|'
+    r'pinch(?:es)?|cloves?|slices?|cans?|pieces?|x)\b\.?|(?=\s))\s*(?:of\s+)?',
+    re.IGNORECASE
+)
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_ingredient(line):
+    name = LIST_MARKER_RE.sub('', line)
+    name = QUANTITY_RE.sub('', name)
+    name = WHITESPACE_RE.sub(' ', name).strip(' .,;:').lower()
+    return name[:MAX_NAME_LENGTH]
+
+
+def parse_ingredients(text):
+    names = (normalize_ingredient(line) for line in text.splitlines())
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def split_ingredients(apps, schema_editor):
+    """Parse the existing ingredients text into Ingredient/RecipeIngredient rows"""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+
+    recipes = Recipe.objects.order_by('pk').values_list('pk', 'ingredients')
+    last_pk = 0
+    while True:
+        batch = {pk: parse_ingredients(text) for pk, text in recipes.filter(pk__gt=last_pk)[:BATCH_SIZE]}
+        if not batch:
+            break
+        last_pk = max(batch)
+
+        names = set().union(*batch.values())
+        Ingredient.objects.bulk_create([Ingredient(name=name) for name in names], ignore_conflicts=True)
+        ingredient_ids = dict(Ingredient.objects.filter(name__in=names).values_list('name', 'id'))
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe_id=pk, ingredient_id=ingredient_ids[name], position=position)
+            for pk, recipe_names in batch.items()
+            for position, name in enumerate(recipe_names)
+            if name in ingredient_ids
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_ingredients', to='recipes.ingredient')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_ingredients', to='recipes.recipe')),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_set',
+            field=models.ManyToManyField(editable=False, related_name='recipes', through='recipes.RecipeIngredient', to='recipes.ingredient'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(fields=['ingredient', 'recipe'], name='recipes_rec_ingredi_bc6c07_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recipeingredient',
+            unique_together={('recipe', 'ingredient')},
+        ),
+        migrations.RunPython(split_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:14
+
+import recipes.trending
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_trending_scores(apps, schema_editor):
+    """Score the existing recipes from their creation and recent activity"""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Comment = apps.get_model('recipes', 'Comment')
+    DifficultyRating = apps.get_model('recipes', 'DifficultyRating')
+
+    recipe_ids = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(recipe_ids), 1000):
+        recipes.trending.rebuild_scores(Recipe, Comment, DifficultyRating, recipe_ids[start:start + 1000])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_ingredients'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=recipes.trending.get_new_recipe_score, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-id'], name='recipes_rec_trendin_60b2c9_idx'),
+        ),
+        migrations.RunPython(populate_trending_scores, migrations.RunPython.noop),
+    ]
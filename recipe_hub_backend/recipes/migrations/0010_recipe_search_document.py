@@ -0,0 +1,26 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:04
+
+import django.db.models.deletion
+import recipes.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchDocument',
+            fields=[
+                ('recipe', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='recipes.recipe')),
+                ('document', recipes.models.SearchDocumentField(db_column='recipes_recipe_fts')),
+            ],
+            options={
+                'db_table': 'recipes_recipe_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,9 +1,13 @@
 # recipe_hub_backend\recipes\models.py
 
-from django.db import models
+from django.db import connections, models, router, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Avg
+from django.db.models import Avg, Case, Count, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from . import trending
+from .ingredients import MAX_NAME_LENGTH, parse_ingredients
 
 class Recipe(models.Model):
     title = models.CharField(max_length=200, db_index=True)
@@ -14,17 +18,223 @@ class Recipe(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Normalized ingredients parsed from the ingredients text, kept in sync by
+    # save(). Rebuild with `manage.py rebuild_recipe_ingredients`.
+    ingredient_set = models.ManyToManyField(
+        'Ingredient',
+        through='RecipeIngredient',
+        related_name='recipes',
+        editable=False
+    )
+    # Denormalized aggregates, kept up to date by Comment/DifficultyRating
+    # save() and the post_delete handlers below, which also see cascades and
+    # queryset deletes. Rebuild with `manage.py rebuild_recipe_aggregates`.
+    comment_count = models.IntegerField(default=0, editable=False)
+    rating_count = models.IntegerField(default=0, editable=False)
+    rating_sum = models.IntegerField(default=0, editable=False)
+    # Time-decayed popularity (see recipes/trending.py), raised by every comment
+    # and rating. Rebuild with `manage.py rebuild_trending_scores`.
+    trending_score = models.FloatField(default=trending.get_new_recipe_score, editable=False)
 
     class Meta:
         ordering = ['-created_at']  # Show newest comments first
         indexes = [
             models.Index(fields=['-created_at']),  # Index for ordering
             models.Index(fields=['author']),       # Index for author lookups
+            models.Index(fields=['-trending_score', '-id']),  # Index for the trending feed
         ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        """Save the recipe and keep its structured ingredients in sync with the text"""
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or 'ingredients' in update_fields:
+                Recipe.link_ingredients([self])
+
+    @classmethod
+    def link_ingredients(cls, recipes):
+        """
+        Replace the RecipeIngredient rows of the given recipes with the ones
+        parsed from their ingredients text, creating missing Ingredient rows.
+        Uses a fixed number of queries for the whole batch.
+        """
+        names = {recipe.pk: parse_ingredients(recipe.ingredients) for recipe in recipes}
+        ingredient_ids = Ingredient.get_ids(set().union(*names.values()))
+        RecipeIngredient.objects.filter(recipe_id__in=names).delete()
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_ids[name], position=position)
+            for recipe_id, recipe_names in names.items()
+            for position, name in enumerate(recipe_names)
+            if name in ingredient_ids
+        ])
+
+    @property
+    def average_difficulty(self):
+        """Average difficulty rating, or None if the recipe has not been rated yet"""
+        return self.get_average_difficulty(self.rating_count, self.rating_sum)
+
+    @staticmethod
+    def get_average_difficulty(rating_count, rating_sum):
+        """The average difficulty of the rating aggregates of a recipe"""
+        if not rating_count:
+            return None
+        return rating_sum / rating_count
+
+    @classmethod
+    def adjust_aggregates(cls, recipe_id, comments=0, ratings=0, rating_sum=0, activity=0):
+        """
+        Atomically apply deltas to the denormalized aggregates of a recipe, and
+        add the weight of new activity to its trending score.
+        Uses F() expressions so concurrent writers never overwrite each other.
+        """
+        changes = {}
+        if comments:
+            changes['comment_count'] = F('comment_count') + comments
+        if ratings:
+            changes['rating_count'] = F('rating_count') + ratings
+        if rating_sum:
+            changes['rating_sum'] = F('rating_sum') + rating_sum
+        if activity:
+            changes['trending_score'] = trending.add_activity(F('trending_score'), activity)
+        if changes:
+            cls.objects.filter(pk=recipe_id).update(**changes)
+
+    @classmethod
+    def bulk_adjust_aggregates(cls, deltas):
+        """
+        Apply adjust_aggregates() deltas to several recipes with a single UPDATE.
+        `deltas` maps recipe ids to dicts of adjust_aggregates() keyword arguments.
+        """
+        changes = {}
+        for field, name in (('comment_count', 'comments'), ('rating_count', 'ratings'), ('rating_sum', 'rating_sum')):
+            whens = [When(pk=pk, then=Value(delta[name])) for pk, delta in deltas.items() if delta.get(name)]
+            if whens:
+                changes[field] = F(field) + Case(*whens, default=Value(0))
+        activity = {pk: delta.get('activity', 0) for pk, delta in deltas.items()}
+        if any(activity.values()):
+            changes['trending_score'] = trending.add_activity(F('trending_score'), activity)
+        if changes:
+            cls.objects.filter(pk__in=deltas).update(**changes)
+
+    @classmethod
+    def lock_for_update(cls, recipe_ids):
+        """
+        Lock the rows of the given recipes until the end of the transaction and
+        return the ids of those that exist. Rows are locked in primary key
+        order, so concurrent batches don't deadlock.
+        """
+        return set(
+            cls.objects.select_for_update().filter(pk__in=recipe_ids).order_by('pk').values_list('pk', flat=True)
+        )
+
+    @classmethod
+    def rebuild_aggregates(cls, queryset=None):
+        """
+        Recalculate the denormalized aggregates from the comment and rating tables
+        with a single UPDATE over the given queryset (all recipes by default).
+        Returns the number of updated recipes.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+
+        comments = Comment.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(total=Count('pk')).values('total')
+        ratings = DifficultyRating.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe')
+
+        return queryset.order_by().update(
+            comment_count=Coalesce(Subquery(comments, output_field=IntegerField()), 0),
+            rating_count=Coalesce(
+                Subquery(ratings.annotate(total=Count('pk')).values('total'), output_field=IntegerField()), 0
+            ),
+            rating_sum=Coalesce(
+                Subquery(ratings.annotate(total=Sum('rating')).values('total'), output_field=IntegerField()), 0
+            ),
+        )
+
+    @classmethod
+    def rebuild_trending_scores(cls, recipe_ids):
+        """Recompute the trending scores of the given recipes from their activity"""
+        return trending.rebuild_scores(cls, Comment, DifficultyRating, recipe_ids)
+
+class Ingredient(models.Model):
+    """A normalized ingredient name, shared by all recipes using it"""
+    name = models.CharField(max_length=MAX_NAME_LENGTH, unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def get_ids(cls, names):
+        """Return a {name: id} dict for the given names, creating the missing ingredients"""
+        if not names:
+            return {}
+        cls.objects.bulk_create([cls(name=name) for name in names], ignore_conflicts=True)
+        return dict(cls.objects.filter(name__in=names).values_list('name', 'id'))
+
+class RecipeIngredient(models.Model):
+    """Links a recipe to one of its ingredients"""
+    recipe = models.ForeignKey(Recipe, related_name='recipe_ingredients', on_delete=models.CASCADE)
+    ingredient = models.ForeignKey(Ingredient, related_name='recipe_ingredients', on_delete=models.CASCADE)
+    # Position of the ingredient in the recipe's list
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['recipe', 'ingredient']
+        ordering = ['position']
+        indexes = [
+            # Inverted index: ingredient -> recipes, read without touching the table
+            models.Index(fields=['ingredient', 'recipe']),
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient.name} in {self.recipe.title}'
+
+class SearchDocumentField(models.TextField):
+    """
+    The hidden column of an SQLite FTS5 table, named like the table: the left
+    operand of MATCH and the argument of the ranking functions such as bm25()
+    """
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    """`document__match=query`: the FTS5 full-text query, as a parameter"""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+class RecipeSearchDocument(models.Model):
+    """
+    A recipe's row in the SQLite FTS5 index (see recipes/search.py), mapped so
+    that searches join the index through the ORM. The table is created by
+    migration 0007 and kept in sync by triggers; other databases don't have it.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        related_name='search_document',
+        on_delete=models.DO_NOTHING
+    )
+    document = SearchDocumentField(db_column='recipes_recipe_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipe_fts'
+
 class Comment(models.Model):
     recipe = models.ForeignKey(Recipe, related_name='comments', on_delete=models.CASCADE)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -35,11 +245,37 @@ class Comment(models.Model):
     class Meta:
         ordering = ['-created_at']  # Show newest comments first
         indexes = [
-            models.Index(fields=['created_at', 'recipe'])
+            # Serves "WHERE recipe_id = ? ORDER BY created_at DESC, id DESC" and its keyset pagination
+            models.Index(fields=['recipe', 'created_at', 'id'])
         ]
 
     def __str__(self):
         return f'Comment by {self.author.username} on {self.recipe.title}'
+
+    def save(self, *args, **kwargs):
+        """Save the comment and keep the recipe's comment_count in sync"""
+        is_new = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                Recipe.adjust_aggregates(self.recipe_id, comments=1, activity=trending.COMMENT_WEIGHT)
+
+    @classmethod
+    def bulk_add(cls, comments):
+        """
+        Insert new comments with one INSERT and update the comment_count of
+        their recipes with one UPDATE. The comments get their primary keys
+        where the database reports them (not on MySQL).
+        """
+        with transaction.atomic():
+            comments = cls.objects.bulk_create(comments)
+            deltas = {}
+            for comment in comments:
+                delta = deltas.setdefault(comment.recipe_id, {'comments': 0, 'activity': 0})
+                delta['comments'] += 1
+                delta['activity'] += trending.COMMENT_WEIGHT
+            Recipe.bulk_adjust_aggregates(deltas)
+        return comments
     
 class DifficultyRating(models.Model):
     recipe = models.ForeignKey(
@@ -69,3 +305,108 @@ class DifficultyRating(models.Model):
 
     def __str__(self):
         return f'Difficulty rating of {self.rating} by {self.rating_author.username} for {self.recipe.title}'
+
+    def save(self, *args, **kwargs):
+        """Save the rating and keep the recipe's rating aggregates in sync"""
+        with transaction.atomic():
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                Recipe.adjust_aggregates(
+                    self.recipe_id, ratings=1, rating_sum=self.rating, activity=trending.RATING_WEIGHT
+                )
+            else:
+                # Lock the stored row so concurrent updates apply their deltas in turn
+                saved_rating = DifficultyRating.objects.select_for_update().values_list(
+                    'rating', flat=True
+                ).get(pk=self.pk)
+                super().save(*args, **kwargs)
+                # Rating again isn't new activity: the rating counts once for the trending score
+                Recipe.adjust_aggregates(self.recipe_id, rating_sum=self.rating - saved_rating)
+
+    def delete(self, *args, **kwargs):
+        """Delete the rating; rating_deleted() updates the recipe's rating aggregates"""
+        with transaction.atomic():
+            # Lock the stored row and subtract its rating: this instance's may be stale
+            saved_rating = DifficultyRating.objects.select_for_update().values_list(
+                'rating', flat=True
+            ).filter(pk=self.pk).first()
+            if saved_rating is not None:
+                self.rating = saved_rating
+            return super().delete(*args, **kwargs)
+
+    @classmethod
+    def bulk_upsert(cls, author_id, ratings):
+        """
+        Create or update the author's ratings, given as {recipe_id: rating},
+        with a single INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE on the
+        (recipe, rating_author) unique key, and apply the changes to the
+        recipes' aggregates with one UPDATE. Run it in the transaction that
+        locked the recipes (Recipe.lock_for_update), so that no concurrent
+        write changes the ratings between reading and upserting them.
+        Returns {recipe_id: True if created, False if updated}.
+        """
+        # Lock the existing ratings too, so that a concurrent update or delete of
+        # one of them (save()/delete()) applies its delta before or after ours
+        previous = dict(
+            cls.objects.select_for_update().filter(rating_author_id=author_id, recipe_id__in=ratings)
+            .order_by().values_list('recipe_id', 'rating')
+        )
+        connection = connections[router.db_for_write(cls)]
+        # MySQL always upserts on the table's unique keys and doesn't accept them explicitly
+        unique_fields = (
+            ['recipe', 'rating_author'] if connection.features.supports_update_conflicts_with_target else None
+        )
+        cls.objects.bulk_create(
+            [cls(recipe_id=recipe_id, rating_author_id=author_id, rating=rating)
+             for recipe_id, rating in ratings.items()],
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=['rating', 'updated_at'],
+        )
+        Recipe.bulk_adjust_aggregates({
+            recipe_id: {
+                'ratings': 0 if recipe_id in previous else 1,
+                'rating_sum': rating - previous.get(recipe_id, 0),
+                'activity': 0 if recipe_id in previous else trending.RATING_WEIGHT,
+            }
+            for recipe_id, rating in ratings.items()
+        })
+        return {recipe_id: recipe_id not in previous for recipe_id in ratings}
+
+    @classmethod
+    def rate(cls, recipe_id, author_id, rating):
+        """
+        Create the author's rating of the recipe or update it, like
+        update_or_create() but race free: the write is a single upsert on the
+        (recipe, rating_author) unique key, so concurrent calls never hit an
+        IntegrityError, and the recipe's aggregates are updated in the same
+        transaction. Returns (rating, created), and raises
+        Recipe.DoesNotExist if there is no such recipe.
+        """
+        with transaction.atomic():
+            if not Recipe.lock_for_update([recipe_id]):
+                raise Recipe.DoesNotExist(f'Recipe {recipe_id} does not exist.')
+            created = cls.bulk_upsert(author_id, {recipe_id: rating})[recipe_id]
+            instance = cls.objects.select_related('rating_author').get(
+                recipe_id=recipe_id, rating_author_id=author_id
+            )
+        return instance, created
+
+
+def is_recipe_deleted(recipe_id, origin):
+    """Whether a delete() started from the recipe itself, which leaves no aggregates to update"""
+    if isinstance(origin, Recipe):
+        return origin.pk == recipe_id
+    return isinstance(origin, models.QuerySet) and origin.model is Recipe
+
+
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    """post_delete handler keeping the recipe's comment_count in sync"""
+    if not is_recipe_deleted(instance.recipe_id, origin):
+        Recipe.adjust_aggregates(instance.recipe_id, comments=-1)
+
+
+def rating_deleted(sender, instance, origin=None, **kwargs):
+    """post_delete handler keeping the recipe's rating aggregates in sync"""
+    if not is_recipe_deleted(instance.recipe_id, origin):
+        Recipe.adjust_aggregates(instance.recipe_id, ratings=-1, rating_sum=-instance.rating)
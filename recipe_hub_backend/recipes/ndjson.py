@@ -0,0 +1,312 @@
+# recipes/ndjson.py
+
+'''
+Streaming NDJSON export and import of recipes, used by the export_recipes and
+import_recipes management commands.
+
+Every line holds one recipe with its comments and difficulty ratings:
+
+    {"title": "...", "description": "...", "ingredients": "...",
+     "instructions": "...", "cooking_time": 30, "author": "username",
+     "created_at": "2024-01-01T12:00:00Z", "updated_at": "...",
+     "comments": [{"author": "...", "content": "...", "created_at": "...", "updated_at": "..."}],
+     "ratings": [{"author": "...", "rating": 3, "created_at": "...", "updated_at": "..."}]}
+
+Users are referenced by username, so files can move between databases whose
+ids differ. Timestamps are optional on import and default to the import time.
+
+Both directions work in chunks of recipes, so memory use depends on the chunk
+size and not on the size of the dataset: the export reads the recipes with
+QuerySet.iterator() (prefetching comments and ratings per chunk), and the
+import inserts each chunk with a fixed number of bulk_create() calls.
+'''
+
+import json
+from contextlib import contextmanager
+from datetime import timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Recipe, Comment, DifficultyRating
+
+RECIPE_FIELDS = ('title', 'description', 'ingredients', 'instructions', 'cooking_time')
+TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+
+
+class RecipeImportError(ValueError):
+    """A line of an import file that can't be imported"""
+
+
+def clean(obj, exclude):
+    """
+    Validate and convert the field values of an unsaved object, leaving out
+    the checks that query the database: the excluded foreign keys, which the
+    importer sets itself, and the unique constraints.
+    """
+    obj.full_clean(exclude=exclude, validate_unique=False, validate_constraints=False)
+
+
+def format_errors(exc):
+    """The messages of a ValidationError, prefixed by their fields"""
+    return '; '.join(
+        f'{field}: {" ".join(messages)}' for field, messages in exc.message_dict.items()
+    )
+
+
+def get_timestamps(obj):
+    # Full precision, so that an import restores the exact values
+    return {field: getattr(obj, field).isoformat() for field in TIMESTAMP_FIELDS}
+
+
+class RecipeExporter:
+    """
+    Export recipes, all of them by default, in primary key order. Reads
+    `chunk_size` recipes at a time, with two more queries per chunk for their
+    comments and ratings.
+    """
+    def __init__(self, queryset=None, chunk_size=1000):
+        self.queryset = Recipe.objects.all() if queryset is None else queryset
+        self.chunk_size = chunk_size
+        self.counts = {'recipes': 0, 'comments': 0, 'ratings': 0}
+
+    def lines(self):
+        """Yield the NDJSON lines of the recipes, with their line breaks"""
+        recipes = self.queryset.order_by('pk').select_related('author').prefetch_related(
+            Prefetch('comments', queryset=Comment.objects.select_related('author').order_by('created_at', 'id')),
+            Prefetch('difficulty_ratings',
+                     queryset=DifficultyRating.objects.select_related('rating_author').order_by('id')),
+        )
+        for recipe in recipes.iterator(chunk_size=self.chunk_size):
+            record = self.get_record(recipe)
+            self.counts['recipes'] += 1
+            self.counts['comments'] += len(record['comments'])
+            self.counts['ratings'] += len(record['ratings'])
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+
+    def get_record(self, recipe):
+        record = {field: getattr(recipe, field) for field in RECIPE_FIELDS}
+        record['author'] = recipe.author.username
+        record.update(get_timestamps(recipe))
+        record['comments'] = [
+            {'author': comment.author.username, 'content': comment.content, **get_timestamps(comment)}
+            for comment in recipe.comments.all()
+        ]
+        record['ratings'] = [
+            {'author': rating.rating_author.username, 'rating': rating.rating, **get_timestamps(rating)}
+            for rating in recipe.difficulty_ratings.all()
+        ]
+        return record
+
+
+@contextmanager
+def keep_timestamps():
+    """
+    Let bulk_create() store the created_at/updated_at values set on the
+    objects, instead of overwriting them with the current time
+    (auto_now/auto_now_add).
+    """
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in (Recipe, Comment, DifficultyRating)
+        for field in (model._meta.get_field(name) for name in TIMESTAMP_FIELDS)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class RecipeImporter:
+    """
+    Import NDJSON lines in chunks of `chunk_size` recipes. Each chunk takes
+    one transaction and a fixed number of queries: the lookup of the users not
+    seen yet, one bulk_create() each for the recipes, comments and ratings,
+    the structured ingredients and the trending scores. Recipe aggregates are
+    computed from the imported rows, so they need no rebuild; trending scores
+    are rebuilt from them, as the imported activity may be of any age.
+
+    Users are resolved by username through an in-memory map that grows with
+    the number of distinct users referenced. Unknown users are an error,
+    unless `create_users` is set: they are then created without a usable
+    password.
+    """
+    def __init__(self, chunk_size=1000, create_users=False):
+        self.chunk_size = chunk_size
+        self.create_users = create_users
+        self.user_ids = {}
+        self.counts = {'recipes': 0, 'comments': 0, 'ratings': 0, 'users': 0}
+
+    def run(self, lines):
+        """Import all lines of an iterable, e.g. an open file"""
+        return self.import_records(self.parse(lines))
+
+    def parse(self, lines):
+        """Yield the (line number, record) pairs of the non-empty lines"""
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as exc:
+                raise RecipeImportError(f'Line {line_number}: invalid JSON ({exc})')
+
+    def import_records(self, records):
+        """
+        Import an iterable of (number, record) pairs, records being decoded
+        lines. Numbers identify the records in error messages.
+        """
+        chunk = []
+        for numbered_record in records:
+            chunk.append(numbered_record)
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        return self.counts
+
+    def import_chunk(self, chunk):
+        """Import a list of (line number, record) pairs in one transaction"""
+        now = timezone.now()
+        with transaction.atomic(), keep_timestamps():
+            self.resolve_users(chunk)
+            recipes, comments, ratings = [], [], []
+            for line_number, record in chunk:
+                try:
+                    recipe, recipe_comments, recipe_ratings = self.build_objects(record, now)
+                except ValidationError as exc:
+                    raise RecipeImportError(f'Line {line_number}: invalid recipe ({format_errors(exc)})')
+                except (KeyError, TypeError, ValueError) as exc:
+                    raise RecipeImportError(f'Line {line_number}: invalid recipe ({exc!r})')
+                recipes.append(recipe)
+                comments.append(recipe_comments)
+                ratings.append(recipe_ratings)
+
+            self.insert_recipes(recipes)
+            for recipe, recipe_comments, recipe_ratings in zip(recipes, comments, ratings):
+                for obj in (*recipe_comments, *recipe_ratings):
+                    obj.recipe_id = recipe.pk
+            comments = [comment for recipe_comments in comments for comment in recipe_comments]
+            ratings = [rating for recipe_ratings in ratings for rating in recipe_ratings]
+            Comment.objects.bulk_create(comments)
+            DifficultyRating.objects.bulk_create(ratings)
+            Recipe.link_ingredients(recipes)
+            Recipe.rebuild_trending_scores([recipe.pk for recipe in recipes])
+
+        self.counts['recipes'] += len(recipes)
+        self.counts['comments'] += len(comments)
+        self.counts['ratings'] += len(ratings)
+
+    def resolve_users(self, chunk):
+        """Add the users referenced by the chunk to the username -> id map"""
+        usernames = set()
+        for line_number, record in chunk:
+            if not isinstance(record, dict):
+                raise RecipeImportError(f'Line {line_number}: expected a JSON object')
+            for key in ('comments', 'ratings'):
+                if not isinstance(record.get(key, []), list):
+                    raise RecipeImportError(f'Line {line_number}: "{key}" must be a list')
+            usernames.add(record.get('author'))
+            for item in (*record.get('comments', ()), *record.get('ratings', ())):
+                usernames.add(item.get('author') if isinstance(item, dict) else None)
+        # Other values are reported by build_objects() with their line number
+        missing = {username for username in usernames if isinstance(username, str)} - self.user_ids.keys()
+        if not missing:
+            return
+
+        self.user_ids.update(User.objects.filter(username__in=missing).values_list('username', 'id'))
+        missing -= self.user_ids.keys()
+        if missing and not self.create_users:
+            raise RecipeImportError(
+                f'Unknown users: {", ".join(sorted(missing)[:10])}'
+                f'{" and more" if len(missing) > 10 else ""} (use --create-users to create them)'
+            )
+        if missing:
+            users = [User(username=username) for username in missing]
+            for user in users:
+                user.set_unusable_password()
+            User.objects.bulk_create(users)
+            self.user_ids.update(User.objects.filter(username__in=missing).values_list('username', 'id'))
+            self.counts['users'] += len(users)
+
+    def build_objects(self, record, now):
+        """
+        Return the unsaved recipe of a record, with its comments and ratings.
+        The objects are validated like model forms would, converting values to
+        the field types, so that bulk_create() gets no value the database
+        rejects. Raises ValidationError for invalid values.
+        """
+        recipe = Recipe(
+            author_id=self.user_ids[record['author']],
+            **{field: record[field] for field in RECIPE_FIELDS},
+            **self.get_timestamps(record, now),
+        )
+        clean(recipe, exclude=['author'])
+        comments = []
+        for item in record.get('comments', ()):
+            comment = Comment(
+                author_id=self.user_ids[item['author']], content=item['content'], **self.get_timestamps(item, now)
+            )
+            clean(comment, exclude=['recipe', 'author'])
+            comments.append(comment)
+        # One rating per user, the last one wins like with repeated POSTs
+        ratings = {}
+        for item in record.get('ratings', ()):
+            rating = DifficultyRating(
+                rating_author_id=self.user_ids[item['author']], rating=item['rating'],
+                **self.get_timestamps(item, now)
+            )
+            clean(rating, exclude=['recipe', 'rating_author'])
+            ratings[rating.rating_author_id] = rating
+        ratings = list(ratings.values())
+
+        recipe.comment_count = len(comments)
+        recipe.rating_count = len(ratings)
+        recipe.rating_sum = sum(rating.rating for rating in ratings)
+        return recipe, comments, ratings
+
+    def get_timestamps(self, record, now):
+        timestamps = {}
+        for field in TIMESTAMP_FIELDS:
+            value = record.get(field)
+            if value is None:
+                timestamps[field] = now
+                continue
+            value = parse_datetime(value)
+            if value is None:
+                raise ValueError(f'{field} is not a valid date and time')
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value, dt_timezone.utc)
+            timestamps[field] = value
+        return timestamps
+
+    def insert_recipes(self, recipes):
+        """
+        Insert the recipes with bulk_create() and set their primary keys. On
+        databases that don't return them (MySQL), the new rows are read back:
+        the ones of the chunk's authors after the highest id seen before the
+        insert, matched to the recipes by author, title and creation time.
+        """
+        connection = connections[router.db_for_write(Recipe)]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            return
+
+        previous_max = Recipe.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        Recipe.objects.bulk_create(recipes)
+        rows = Recipe.objects.filter(
+            pk__gt=previous_max, author_id__in={recipe.author_id for recipe in recipes}
+        ).order_by('pk').values_list('pk', 'author_id', 'title', 'created_at')
+        new_ids = {}
+        for pk, author_id, title, created_at in rows:
+            new_ids.setdefault((author_id, title, created_at), []).append(pk)
+        for recipe in recipes:
+            recipe.pk = new_ids[(recipe.author_id, recipe.title, recipe.created_at)].pop(0)
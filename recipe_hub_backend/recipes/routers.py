@@ -0,0 +1,79 @@
+# recipes/routers.py
+
+'''
+Read replica routing.
+
+Writes, and reads outside of the API's read-only requests, always go to the
+primary ('default') database. Safe-method requests handled by the API
+viewsets (see recipes.api.replicas.ReplicaReadMixin) run their ORM reads
+against one of the DATABASE_REPLICAS aliases instead, picked at random per
+request.
+
+Replicas lag behind the primary, so a user who has just written something
+would not see it on the next request. After every successful write, the user
+is pinned to the primary for DATABASE_REPLICA_STICKY_SECONDS. The pins are
+kept in a cache shared by all workers (DATABASE_REPLICA_CACHE_ALIAS).
+'''
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Replica alias used for reads in the current request, or None for the primary
+replica_alias = ContextVar('replica_alias', default=None)
+
+
+@contextmanager
+def read_from_replica():
+    """Route the ORM reads made inside the block to a replica, if any is configured"""
+    replicas = settings.DATABASE_REPLICAS
+    previous = replica_alias.get()
+    replica_alias.set(random.choice(replicas) if replicas else None)
+    try:
+        yield
+    finally:
+        # Not reset(token): the async views enter the block in a worker thread
+        # (sync_to_async copies the value back to the request's task) and
+        # leave it on the event loop, in another context
+        replica_alias.set(previous)
+
+
+def get_pin_key(user_id):
+    return f'recipes:primary-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Send the user's reads to the primary for the sticky window"""
+    seconds = settings.DATABASE_REPLICA_STICKY_SECONDS
+    if settings.DATABASE_REPLICAS and seconds:
+        caches[settings.DATABASE_REPLICA_CACHE_ALIAS].set(get_pin_key(user_id), True, seconds)
+
+
+def is_pinned_to_primary(user_id):
+    """Whether the user has written recently enough that replicas may not have caught up"""
+    # Without replicas no user is ever pinned: don't read the cache on every request
+    if not settings.DATABASE_REPLICAS:
+        return False
+    return bool(caches[settings.DATABASE_REPLICA_CACHE_ALIAS].get(get_pin_key(user_id)))
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica chosen for the current request (see
+    read_from_replica), everything else to the primary.
+    """
+    def db_for_read(self, model, **hints):
+        return replica_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,146 @@
+# recipes/search.py
+
+'''
+Full-text search over recipe titles, descriptions and ingredients.
+
+The index depends on the database (see migration 0007_recipe_search_index):
+- MySQL: a FULLTEXT index on (title, description, ingredients), queried with
+  MATCH ... AGAINST in boolean mode.
+- SQLite: an FTS5 table (recipes_recipe_fts) mirroring those columns, kept in
+  sync by triggers (see install_search_triggers) and ranked with bm25().
+- Other databases have no index; search falls back to substring matching
+  without ranking.
+
+Every search term must match; the last one also matches as a prefix, so
+results keep up with search-as-you-type input. Matching recipes are
+annotated with `relevance` (higher is better). The full-text conditions are
+expressions with the query as a parameter: on SQLite the FTS5 table is joined
+as the RecipeSearchDocument model, on MySQL MATCH ... AGAINST is a RawSQL
+expression. Either way the result is a regular queryset that can be
+filtered, ordered and paginated further.
+'''
+
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+SEARCH_COLUMNS = ('title', 'description', 'ingredients')
+FTS_TABLE = 'recipes_recipe_fts'
+
+# Triggers keeping the SQLite FTS5 table in sync with recipes_recipe
+SQLITE_TRIGGERS = {
+    'recipes_recipe_fts_insert': (
+        "CREATE TRIGGER recipes_recipe_fts_insert AFTER INSERT ON recipes_recipe BEGIN"
+        " INSERT INTO recipes_recipe_fts (rowid, title, description, ingredients)"
+        " VALUES (new.id, new.title, new.description, new.ingredients);"
+        " END"
+    ),
+    'recipes_recipe_fts_delete': (
+        "CREATE TRIGGER recipes_recipe_fts_delete AFTER DELETE ON recipes_recipe BEGIN"
+        " INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, title, description, ingredients)"
+        " VALUES ('delete', old.id, old.title, old.description, old.ingredients);"
+        " END"
+    ),
+    # Only changes to the indexed columns touch the index (not e.g. comment_count)
+    'recipes_recipe_fts_update': (
+        "CREATE TRIGGER recipes_recipe_fts_update AFTER UPDATE OF title, description, ingredients"
+        " ON recipes_recipe BEGIN"
+        " INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, title, description, ingredients)"
+        " VALUES ('delete', old.id, old.title, old.description, old.ingredients);"
+        " INSERT INTO recipes_recipe_fts (rowid, title, description, ingredients)"
+        " VALUES (new.id, new.title, new.description, new.ingredients);"
+        " END"
+    ),
+}
+
+# Search terms are reduced to plain words, so user input never reaches the
+# database as full-text query syntax
+WORD_RE = re.compile(r'\w+')
+
+
+def get_search_terms(query):
+    """Split a user supplied query into search terms"""
+    return WORD_RE.findall(query.lower())
+
+
+class BM25(Func):
+    """The bm25() rank of a match in an SQLite FTS5 table, given its hidden column"""
+    function = 'bm25'
+    output_field = FloatField()
+
+
+def search_recipes(queryset, query):
+    """
+    Filter a Recipe queryset down to the recipes matching `query` and
+    annotate them with their `relevance`. Returns an empty queryset when the
+    query holds no searchable words.
+    """
+    terms = get_search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'mysql':
+        return search_mysql(queryset, terms)
+    if vendor == 'sqlite':
+        return search_sqlite(queryset, terms)
+    return search_fallback(queryset, terms)
+
+
+def search_mysql(queryset, terms):
+    table = Recipe._meta.db_table
+    match = 'MATCH(%s) AGAINST (%%s IN BOOLEAN MODE)' % ', '.join(
+        f'{table}.{column}' for column in SEARCH_COLUMNS
+    )
+    boolean_query = ' '.join(f'+{term}' for term in terms) + '*'
+    return queryset.filter(
+        RawSQL(match, [boolean_query], output_field=BooleanField())
+    ).annotate(
+        relevance=RawSQL(match, [boolean_query], output_field=FloatField())
+    )
+
+
+def search_sqlite(queryset, terms):
+    fts_query = ' '.join(f'"{term}"' for term in terms) + '*'
+    # bm25() is lower for better matches
+    return queryset.filter(search_document__document__match=fts_query).annotate(
+        relevance=-BM25('search_document__document')
+    )
+
+
+def search_fallback(queryset, terms):
+    for term in terms:
+        queryset = queryset.filter(
+            Q(title__icontains=term) | Q(description__icontains=term) | Q(ingredients__icontains=term)
+        )
+    return queryset.annotate(relevance=Value(0.0, output_field=FloatField()))
+
+
+def install_search_triggers(using='default', **kwargs):
+    """
+    post_migrate handler creating the SQLite FTS5 sync triggers when they are
+    missing. SQLite migrations that rebuild recipes_recipe (e.g. adding a
+    NOT NULL column) drop its triggers, so they are checked after every
+    migrate run; if any had to be created the index is rebuilt, as recipes
+    may have changed while it was not maintained.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute('SELECT name FROM sqlite_master WHERE name IN (%s)' % ', '.join(
+            ['%s'] * (len(SQLITE_TRIGGERS) + 1)
+        ), [FTS_TABLE, *SQLITE_TRIGGERS])
+        existing = {name for name, in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            # Migration 0007 has not been applied to this database yet
+            return
+        missing = [name for name in SQLITE_TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(SQLITE_TRIGGERS[name])
+        if missing:
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
@@ -1,14 +1,90 @@
 # recipe_hub_backend/recipes/tests.py
 
-from django.contrib.auth.models import User
-from django.urls import reverse
+from django.contrib.auth.models import User, AnonymousUser
+from django.urls import include, path, resolve, reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
-from recipes.models import Recipe, Comment, DifficultyRating
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+from recipes.models import Recipe, Ingredient, RecipeIngredient, Comment, DifficultyRating
+from recipes.api.cache import bump_generation, cache_stats, get_response_cache
+from recipes.routers import read_from_replica, replica_alias
+from recipes.api.urls import build_urlpatterns
+from recipes.api.views import RecipeViewSet, CommentViewSet, DifficultyRatingViewSet
+from recipes.api.streaming import StreamingListMixin
+from recipes.api.compiled import CompiledReadMixin, compiled_serializers
+from recipes.api.renderers import FastJSONRenderer, FastJSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ParseError
+from recipes.api.serializers import RecipeSerializer, CommentSerializer
+from recipes.api.throttling import (
+    RecipeAnonThrottle,
+    RecipeUserThrottle,
+    SQLiteThrottleStore,
+    get_throttle_store
+)
+from recipes.api.tokens import RefreshToken
+from recipes.api.authentication import TokenUser
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken as PlainRefreshToken
+from recipes.api.users import check_user_cache, get_cached_user, get_user_cache
+from recipes.ndjson import RecipeExporter, RecipeImporter
+from recipes.metrics import registry as metrics_registry
+from recipes.compression import brotli, choose_encoding, compress_response
+from django.http import HttpResponse
+from recipes import trending
+from django.conf import settings
+from django.utils import timezone
 from django.test import override_settings
-from django.core.cache import cache
+from django.core.cache import cache, caches
 from django.contrib.auth.password_validation import validate_password
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, router
+from io import BytesIO, StringIO
+from urllib.parse import parse_qsl, urlsplit
+from rest_framework.test import APIRequestFactory
+from unittest import mock
+from django.utils.translation import gettext_lazy
+import asyncio
+import atexit
+import datetime
+import decimal
+import gzip
+import json
+import uuid
+import threading
+import tempfile
+import shutil
+import unittest
+import zlib
+import os
+
+# URLconf serving the API with async reads, used by AsyncReadTests
+urlpatterns = [
+    path('api/', include(build_urlpatterns(async_reads=True))),
+]
+
+# The tests clear the throttle counters and the caches, so they keep them in a
+# directory of their own rather than in the project's throttle.sqlite3 and cache
+# directories, which a running server or a developer may be using
+TEST_STATE_DIR = tempfile.mkdtemp(prefix='recipe_hub_tests_')
+atexit.register(shutil.rmtree, TEST_STATE_DIR, ignore_errors=True)
+isolated_state = override_settings(
+    RECIPE_THROTTLE_STORE={
+        'BACKEND': 'recipes.api.throttling.SQLiteThrottleStore',
+        'OPTIONS': {'path': os.path.join(TEST_STATE_DIR, 'throttle.sqlite3')},
+    },
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        # File caches like the project's: shared by the threads and processes of a test run
+        'api_responses': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(TEST_STATE_DIR, 'response_cache'),
+        },
+        'users': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(TEST_STATE_DIR, 'user_cache'),
+        },
+    },
+)
 
 
 # TEST_THROTTLE_SETTINGS = {
@@ -33,12 +109,19 @@ from django.contrib.auth.password_validation import validate_password
 # )
 
 
+@isolated_state
 class BaseTestCase(APITestCase):
     """
     Base test case that provides common setup and utility methods for all test classes.
     This includes user creation, authentication, and common test data.
     """
     def setUp(self):
+        # Start every test with fresh rate limit counters and an empty response cache
+        get_throttle_store().clear()
+        get_response_cache().clear()
+        get_user_cache().clear()
+        cache_stats.reset()
+
         # Create three types of users for testing different permission scenarios
         self.user = User.objects.create_user(
             username='testuser',
@@ -178,6 +261,271 @@ class RecipeTests(BaseTestCase):
         response = self.client.put(url, updated_data)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+class RecipeListTests(BaseTestCase):
+    """Tests for the lightweight recipe list representation"""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('recipe-list')
+
+    def create_recipes(self, count, comments_per_recipe=2):
+        """Helper method to create recipes with a few comments and ratings each"""
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                author=self.user,
+                **{**self.valid_recipe_data, 'title': f'Recipe {i}'}
+            )
+            for j in range(comments_per_recipe):
+                Comment.objects.create(
+                    recipe=recipe,
+                    author=self.other_user,
+                    content=f'Comment {j}'
+                )
+            DifficultyRating.objects.create(
+                recipe=recipe,
+                rating_author=self.other_user,
+                rating=3
+            )
+
+    def test_list_uses_summary_fields(self):
+        """Test that the list does not embed comments or long text fields"""
+        self.create_recipes(1, comments_per_recipe=3)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data['results'][0]
+        self.assertNotIn('comments', result)
+        self.assertNotIn('ingredients', result)
+        self.assertNotIn('instructions', result)
+        self.assertEqual(result['comment_count'], 3)
+        self.assertEqual(result['average_difficulty'], 3)
+        self.assertEqual(result['author']['username'], self.user.username)
+
+    def test_list_description_excerpt(self):
+        """Test that long descriptions are cut down to an excerpt"""
+        Recipe.objects.create(
+            author=self.user,
+            **{**self.valid_recipe_data, 'description': 'x' * 1000}
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results'][0]['description']), 300)
+
+    def test_list_query_count_is_constant(self):
+        """Test that the list runs the same number of queries regardless of page contents"""
+        self.create_recipes(1)
+        # One COUNT query for pagination plus one query for the page itself
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+        self.create_recipes(9, comments_per_recipe=5)
+        # Writes made outside the API do not invalidate cached anonymous responses
+        bump_generation()
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_list_user_ratings_query_count_is_constant(self):
+        """Test that the user's ratings for a whole page are loaded with one query"""
+        self.create_recipes(1)
+        self.authenticate_user(self.other_user)
+        # Pagination COUNT, page query and one user-rating lookup
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+        self.create_recipes(9, comments_per_recipe=0)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            [result['user_rating'] for result in response.data['results']],
+            [3] * 10
+        )
+
+    def test_cursor_pagination(self):
+        """Test that cursor pagination walks all recipes without a COUNT query"""
+        self.create_recipes(15, comments_per_recipe=0)
+        # Only the page query: no COUNT(*) and no OFFSET
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'pagination': 'cursor'})
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+        first_page = [result['id'] for result in response.data['results']]
+        self.assertEqual(len(first_page), 10)
+
+        response = self.client.get(response.data['next'])
+        second_page = [result['id'] for result in response.data['results']]
+        self.assertEqual(len(second_page), 5)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+
+        expected = list(Recipe.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(first_page + second_page, expected)
+
+    def test_cursor_pagination_breaks_ties_by_id(self):
+        """Test that cursors page through recipes created at the same time by id, both ways"""
+        self.create_recipes(25, comments_per_recipe=0)
+        Recipe.objects.update(created_at=timezone.now())
+        expected = list(Recipe.objects.order_by('-id').values_list('id', flat=True))
+
+        pages, url, params = [], self.url, {'pagination': 'cursor'}
+        while url:
+            response = self.client.get(url, params)
+            pages.append([result['id'] for result in response.data['results']])
+            url, params = response.data['next'], None
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), expected)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([result['id'] for result in response.data['results']], pages[1])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([result['id'] for result in response.data['results']], pages[0])
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(self.url, {'pagination': 'cursor', 'cursor': 'cD1ub3QranNvbg=='})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_retrieve_keeps_nested_comments(self):
+        """Test that the detail view still returns the full nested representation"""
+        self.create_recipes(1, comments_per_recipe=2)
+        recipe = Recipe.objects.get()
+        response = self.client.get(reverse('recipe-detail', args=[recipe.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['comments']), 2)
+        self.assertIn('ingredients', response.data)
+
+class RecipeSearchTests(BaseTestCase):
+    """Tests for the full-text recipe search"""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('recipe-search')
+        self.curry = self.create_recipe(
+            self.user, 'Chicken curry', 'A mild chicken curry', 'chicken\ncurry paste\nrice', 45
+        )
+        self.soup = self.create_recipe(
+            self.other_user, 'Chicken soup', 'Warming soup', 'chicken\ncarrots', 90
+        )
+        self.salad = self.create_recipe(
+            self.user, 'Green salad', 'Quick and fresh', 'lettuce\ncucumber', 10
+        )
+
+    def create_recipe(self, author, title, description, ingredients, cooking_time):
+        return Recipe.objects.create(
+            author=author,
+            title=title,
+            description=description,
+            ingredients=ingredients,
+            instructions='Cook it',
+            cooking_time=cooking_time
+        )
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [result['id'] for result in response.data['results']]
+
+    def test_search_ranks_by_relevance(self):
+        """Test that recipes mentioning the term more often come first"""
+        self.assertEqual(self.search(q='curry'), [self.curry.id])
+        self.assertEqual(self.search(q='chicken'), [self.curry.id, self.soup.id])
+
+    def test_all_words_must_match(self):
+        """Test that every word is required and the last one matches as a prefix"""
+        self.assertEqual(self.search(q='chicken carr'), [self.soup.id])
+        self.assertEqual(self.search(q='salad chicken'), [])
+
+    def test_search_filters(self):
+        """Test the author and cooking time filters"""
+        self.assertEqual(self.search(q='chicken', author=self.other_user.id), [self.soup.id])
+        self.assertEqual(self.search(q='chicken', min_cooking_time=60), [self.soup.id])
+        self.assertEqual(self.search(q='chicken', max_cooking_time=60), [self.curry.id])
+
+    def test_index_follows_changes(self):
+        """Test that updated and deleted recipes are reindexed"""
+        self.salad.title = 'Chicken salad'
+        self.salad.save()
+        self.soup.delete()
+        self.assertEqual(set(self.search(q='chicken')), {self.curry.id, self.salad.id})
+        self.assertEqual(self.search(q='green'), [])
+
+    def test_query_syntax_is_ignored(self):
+        """Test that full-text operators in the query are treated as plain words"""
+        self.assertEqual(self.search(q='"chicken" OR -soup*'), [])
+        self.assertEqual(self.search(q='"curry"'), [self.curry.id])
+
+    def test_invalid_parameters(self):
+        """Test that a missing query or an inverted cooking time range is rejected"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'q': 'chicken', 'min_cooking_time': 60, 'max_cooking_time': 30})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class RecipeIngredientTests(BaseTestCase):
+    """Tests for the structured ingredients and the recipes-by-ingredients lookup"""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('recipe-by-ingredients')
+        self.omelette = self.create_recipe('Omelette', '3 Eggs\n- Milk\nSalt')
+        self.pancakes = self.create_recipe('Pancakes', '200 g flour\n2 eggs\n1/2 cup of milk')
+        self.bread = self.create_recipe('Bread', 'Flour\nWater\nYeast')
+
+    def create_recipe(self, title, ingredients):
+        return Recipe.objects.create(
+            author=self.user,
+            **{**self.valid_recipe_data, 'title': title, 'ingredients': ingredients}
+        )
+
+    def get_ingredient_names(self, recipe):
+        return list(recipe.recipe_ingredients.values_list('ingredient__name', flat=True))
+
+    def test_ingredients_are_normalized(self):
+        """Test that quantities and list markers are stripped and names shared"""
+        self.assertEqual(self.get_ingredient_names(self.omelette), ['eggs', 'milk', 'salt'])
+        self.assertEqual(self.get_ingredient_names(self.pancakes), ['flour', 'eggs', 'milk'])
+        self.assertEqual(Ingredient.objects.count(), 6)
+
+    def test_ingredients_follow_updates(self):
+        """Test that editing the ingredients text relinks the recipe"""
+        self.authenticate_user(self.user)
+        response = self.client.patch(
+            reverse('recipe-detail', args=[self.bread.id]),
+            {'ingredients': 'Flour\nSalt'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_ingredient_names(self.bread), ['flour', 'salt'])
+
+    def test_recipes_ranked_by_matches(self):
+        """Test that recipes using more of the ingredients come first"""
+        response = self.client.get(self.url, {'ingredients': 'eggs, Milk,flour'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = [(result['id'], result['matched_ingredients']) for result in response.data['results']]
+        self.assertEqual(results, [
+            (self.pancakes.id, 3),
+            (self.omelette.id, 2),
+            (self.bread.id, 1),
+        ])
+
+    def test_query_count_is_constant(self):
+        """Test that the lookup does not query per recipe"""
+        for i in range(5):
+            self.create_recipe(f'Scrambled eggs {i}', 'Eggs\nButter')
+        # ingredient ranking, count, recipes
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'ingredients': 'eggs,butter'})
+        self.assertEqual(response.data['count'], 7)
+
+    def test_invalid_ingredients(self):
+        """Test that an empty or too long ingredient list is rejected"""
+        response = self.client.get(self.url, {'ingredients': ' , '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'ingredients': ','.join(f'item{i}' for i in range(21))})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command restores links removed by bulk operations"""
+        RecipeIngredient.objects.all().delete()
+        call_command('rebuild_recipe_ingredients', stdout=StringIO())
+        self.assertEqual(self.get_ingredient_names(self.omelette), ['eggs', 'milk', 'salt'])
+
 class CommentTests(BaseTestCase):
     """Tests for comment-related functionality using nested router URLs"""
 
@@ -199,7 +547,32 @@ class CommentTests(BaseTestCase):
         url = reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id})
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_list_comments_cursor_pagination(self):
+        """Test that comments are listed newest first in cursor paginated pages"""
+        for i in range(25):
+            Comment.objects.create(recipe=self.recipe, author=self.other_user, content=f'Comment {i}')
+        # Comments of other recipes must not leak into the listing
+        other_recipe = Recipe.objects.create(author=self.user, **self.valid_recipe_data)
+        Comment.objects.create(recipe=other_recipe, author=self.user, content='Elsewhere')
+
+        url = reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id})
+        # No COUNT(*): just the page query with the authors joined in
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        first_page = [comment['id'] for comment in response.data['results']]
+        self.assertEqual(len(first_page), 20)
+
+        response = self.client.get(response.data['next'])
+        second_page = [comment['id'] for comment in response.data['results']]
+        self.assertEqual(len(second_page), 6)
+        self.assertIsNone(response.data['next'])
+
+        expected = list(
+            self.recipe.comments.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(first_page + second_page, expected)
 
     def test_create_comment_authenticated(self):
         """Test comment creation by authenticated user"""
@@ -421,20 +794,31 @@ class RatingTests(BaseTestCase):
         response1 = self.client.post(url, self.valid_rating_data)
         self.assertEqual(response1.status_code, status.HTTP_201_CREATED)
         
-        # Second rating attempt fails with helpful message
+        # Rating again updates the existing rating
         response2 = self.client.post(url, {'rating': 5})
-        self.assertEqual(response2.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn('You have already given a difficulty rating', 
-                    str(response2.data['detail']))
+        self.assertEqual(response2.status_code, status.HTTP_200_OK)
+        self.assertEqual(response2.data['id'], response1.data['id'])
+        self.assertEqual(response2.data['rating'], 5)
+        self.assertEqual(DifficultyRating.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.rating_count, self.recipe.rating_sum), (1, 5))
         
         # Update rating succeeds
         rating_id = response1.data['id']
         update_url = reverse('recipe-difficulty-ratings-detail',
                             kwargs={'recipe_pk': self.recipe.id, 
                                 'pk': rating_id})
-        response3 = self.client.put(update_url, {'rating': 5})
+        response3 = self.client.put(update_url, {'rating': 3})
         self.assertEqual(response3.status_code, status.HTTP_200_OK)
-        self.assertEqual(response3.data['rating'], 5)
+        self.assertEqual(response3.data['rating'], 3)
+
+    def test_rate_missing_recipe(self):
+        """Test that rating a recipe that doesn't exist returns 404"""
+        self.authenticate_user(self.other_user)
+        url = reverse('recipe-difficulty-ratings-list', kwargs={'recipe_pk': 999999})
+        response = self.client.post(url, self.valid_rating_data)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(DifficultyRating.objects.exists())
   
     def test_invalid_rating_values(self):
         """Test that invalid rating values are rejected"""
@@ -490,4 +874,1696 @@ class RatingTests(BaseTestCase):
         response = self.client.get(url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['user_rating'], 4)
\ No newline at end of file
+        self.assertEqual(response.data['user_rating'], 4)
+
+    def test_user_rating_query_count(self):
+        """Test that the detail view does not load every rating of the recipe"""
+        for user in (self.other_user, self.admin_user):
+            DifficultyRating.objects.create(recipe=self.recipe, rating_author=user, rating=2)
+
+        self.authenticate_user(self.user)
+        url = reverse('recipe-detail', args=[self.recipe.id])
+        # Recipe, comments prefetch and one user-rating lookup
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertIsNone(response.data['user_rating'])
+
+
+class RecipeAggregateTests(BaseTestCase):
+    """Tests for the denormalized comment and rating aggregates on Recipe"""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            **self.valid_recipe_data
+        )
+
+    def test_comment_count_follows_api_writes(self):
+        """Test that creating and deleting comments updates comment_count"""
+        self.authenticate_user(self.other_user)
+        url = reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id})
+        response = self.client.post(url, self.valid_comment_data)
+        self.client.post(url, self.valid_comment_data)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.comment_count, 2)
+
+        detail_url = reverse('recipe-comments-detail',
+                             kwargs={'recipe_pk': self.recipe.id, 'pk': response.data['id']})
+        self.client.delete(detail_url)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.comment_count, 1)
+
+    def test_rating_aggregates_follow_api_writes(self):
+        """Test that creating, updating and deleting ratings updates the aggregates"""
+        DifficultyRating.objects.create(recipe=self.recipe, rating_author=self.user, rating=2)
+        self.authenticate_user(self.other_user)
+        url = reverse('recipe-difficulty-ratings-list', kwargs={'recipe_pk': self.recipe.id})
+        response = self.client.post(url, {'rating': 4})
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.rating_count, self.recipe.rating_sum), (2, 6))
+        self.assertEqual(self.recipe.average_difficulty, 3)
+
+        detail_url = reverse('recipe-difficulty-ratings-detail',
+                             kwargs={'recipe_pk': self.recipe.id, 'pk': response.data['id']})
+        self.client.put(detail_url, {'rating': 5})
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.rating_count, self.recipe.rating_sum), (2, 7))
+
+        self.client.delete(detail_url)
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.rating_count, self.recipe.rating_sum), (1, 2))
+
+    def test_deleting_stale_rating_subtracts_stored_value(self):
+        """Test that deleting a rating subtracts the stored rating, not the instance's"""
+        rating = DifficultyRating.objects.create(recipe=self.recipe, rating_author=self.user, rating=2)
+        DifficultyRating.objects.create(recipe=self.recipe, rating_author=self.other_user, rating=4)
+        stale = DifficultyRating.objects.get(pk=rating.pk)
+        rating.rating = 5
+        rating.save()
+
+        stale.delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.rating_count, self.recipe.rating_sum), (1, 4))
+
+    def test_cascading_and_queryset_deletes_update_aggregates(self):
+        """Test that deleting a user or a queryset of comments and ratings updates the aggregates"""
+        Comment.objects.create(recipe=self.recipe, author=self.other_user, content='Hello')
+        Comment.objects.create(recipe=self.recipe, author=self.user, content='Hi')
+        DifficultyRating.objects.create(recipe=self.recipe, rating_author=self.other_user, rating=4)
+        DifficultyRating.objects.create(recipe=self.recipe, rating_author=self.user, rating=1)
+
+        self.other_user.delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.comment_count, self.recipe.rating_count, self.recipe.rating_sum), (1, 1, 1))
+
+        # The admin's "delete selected" action
+        Comment.objects.all().delete()
+        DifficultyRating.objects.all().delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.comment_count, self.recipe.rating_count, self.recipe.rating_sum), (0, 0, 0))
+
+    def test_unrated_recipe_has_no_average(self):
+        """Test that the average difficulty is None until the first rating"""
+        url = reverse('recipe-detail', args=[self.recipe.id])
+        response = self.client.get(url)
+        self.assertIsNone(response.data['average_difficulty'])
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command recalculates drifted aggregates"""
+        Comment.objects.create(recipe=self.recipe, author=self.user, content='Hello')
+        DifficultyRating.objects.create(recipe=self.recipe, rating_author=self.user, rating=3)
+        Recipe.objects.update(comment_count=10, rating_count=0, rating_sum=0)
+
+        out = StringIO()
+        call_command('rebuild_recipe_aggregates', stdout=out)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.comment_count, 1)
+        self.assertEqual((self.recipe.rating_count, self.recipe.rating_sum), (1, 3))
+        self.assertIn('Rebuilt aggregates for 1 recipes', out.getvalue())
+
+
+class ThrottleTests(BaseTestCase):
+    """Tests for the shared sliding-window throttle storage"""
+
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'throttle.sqlite3')
+
+    def test_store_counts_are_shared_between_connections(self):
+        """Test that separate store instances (as in separate workers) share counters"""
+        worker_a = SQLiteThrottleStore(self.path)
+        worker_b = SQLiteThrottleStore(self.path)
+        self.assertEqual(worker_a.hit('client', 10, ttl=120), (1, 0))
+        self.assertEqual(worker_b.hit('client', 10, ttl=120), (2, 0))
+        self.assertEqual(worker_a.hit('client', 11, ttl=120), (1, 2))
+
+    def test_throttle_limits_across_workers(self):
+        """Test that the configured rate holds for requests spread over workers"""
+        class ThreePerMinuteThrottle(RecipeAnonThrottle):
+            rate = '3/minute'
+            # Place the requests at the start of a window so the previous one has no weight
+            timer = staticmethod(lambda: 6000.0)
+
+        request = APIRequestFactory().get('/api/recipes/')
+        request.user = AnonymousUser()
+        results = []
+        with override_settings(RECIPE_THROTTLE_STORE={
+            'BACKEND': 'recipes.api.throttling.SQLiteThrottleStore',
+            'OPTIONS': {'path': self.path},
+        }):
+            for i in range(5):
+                # A fresh store per request, like a request landing on another worker
+                get_throttle_store.cache_clear()
+                results.append(ThreePerMinuteThrottle().allow_request(request, None))
+        self.assertEqual(results, [True, True, True, False, False])
+
+    def test_previous_window_is_weighted(self):
+        """Test that requests from the previous window still count towards the limit"""
+        class TwoPerMinuteThrottle(RecipeAnonThrottle):
+            rate = '2/minute'
+
+        request = APIRequestFactory().get('/api/recipes/')
+        request.user = AnonymousUser()
+        throttle = TwoPerMinuteThrottle()
+        # Two requests at the very end of one window ...
+        throttle.timer = lambda: 6059.0
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertTrue(throttle.allow_request(request, None))
+        # ... still block a request at the start of the next one
+        throttle.timer = lambda: 6061.0
+        self.assertFalse(throttle.allow_request(request, None))
+        self.assertGreater(throttle.wait(), 0)
+        # Halfway through the next window the old requests have decayed enough
+        throttle.timer = lambda: 6090.0
+        self.assertTrue(throttle.allow_request(request, None))
+
+
+class ResponseCacheTests(BaseTestCase):
+    """Tests for the anonymous recipe response cache"""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            **self.valid_recipe_data
+        )
+        self.list_url = reverse('recipe-list')
+        self.detail_url = reverse('recipe-detail', args=[self.recipe.id])
+
+    def test_anonymous_reads_are_cached(self):
+        """Test that repeated anonymous reads are served without queries"""
+        for url in (self.list_url, self.detail_url):
+            first = self.client.get(url)
+            self.assertEqual(first['X-Cache'], 'MISS')
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second['X-Cache'], 'HIT')
+            self.assertEqual(first.json(), second.json())
+        self.assertEqual(cache_stats.as_dict()['hits'], 2)
+        self.assertEqual(cache_stats.as_dict()['misses'], 2)
+
+    def test_pages_are_cached_separately(self):
+        """Test that different pages and cursors get their own entries"""
+        self.client.get(self.list_url)
+        response = self.client.get(self.list_url, {'pagination': 'cursor'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotIn('count', response.data)
+
+    def test_authenticated_reads_bypass_cache(self):
+        """Test that authenticated users always get a fresh response"""
+        self.client.get(self.detail_url)
+        self.authenticate_user(self.user)
+        response = self.client.get(self.detail_url)
+        self.assertNotIn('X-Cache', response)
+
+    def test_writes_invalidate_cache(self):
+        """Test that comment, rating and recipe writes through the API invalidate cached responses"""
+        self.client.get(self.detail_url)
+        self.authenticate_user(self.other_user)
+        # The generation is bumped once the write's transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id}),
+                self.valid_comment_data
+            )
+            self.client.post(
+                reverse('recipe-difficulty-ratings-list', kwargs={'recipe_pk': self.recipe.id}),
+                {'rating': 2}
+            )
+        self.client.credentials()
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['comment_count'], 1)
+        self.assertEqual(response.data['average_difficulty'], 2)
+
+        self.authenticate_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.detail_url, {'title': 'Renamed'})
+        self.client.credentials()
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['title'], 'Renamed')
+
+    def test_failed_writes_keep_cache(self):
+        """Test that rejected writes do not invalidate cached responses"""
+        self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id}),
+                self.valid_comment_data
+            )
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_cache_stats_endpoint(self):
+        """Test that admins can read the cache counters"""
+        self.client.get(self.list_url)
+        self.client.get(self.list_url)
+        url = reverse('cache-stats')
+        self.authenticate_user(self.user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.authenticate_user(self.admin_user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['hits'], 1)
+        self.assertEqual(response.data['misses'], 1)
+        self.assertEqual(response.data['hit_ratio'], 0.5)
+
+
+class ConditionalGetTests(BaseTestCase):
+    """Tests for ETag / Last-Modified handling on recipe, comment and rating endpoints"""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            **self.valid_recipe_data
+        )
+        self.comment = Comment.objects.create(
+            recipe=self.recipe,
+            author=self.user,
+            content=self.valid_comment_data['content']
+        )
+        self.detail_url = reverse('recipe-detail', args=[self.recipe.id])
+        self.authenticate_user(self.user)
+
+    def test_retrieve_not_modified(self):
+        """Test that a matching If-None-Match returns 304 without serializing"""
+        response = self.client.get(self.detail_url)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+        # The validator query only
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_retrieve_changes_with_child_rows(self):
+        """Test that comment edits and new ratings change the recipe's ETag"""
+        etag = self.client.get(self.detail_url)['ETag']
+
+        self.comment.content = 'Edited comment'
+        self.comment.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+
+        DifficultyRating.objects.create(recipe=self.recipe, rating_author=self.other_user, rating=3)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['average_difficulty'], 3)
+
+    def test_etag_differs_per_user(self):
+        """Test that users do not share ETags, since user_rating is personal"""
+        etag = self.client.get(self.detail_url)['ETag']
+        self.authenticate_user(self.other_user)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_not_modified(self):
+        """Test conditional GET on recipe list pages in both pagination modes"""
+        url = reverse('recipe-list')
+        for params in ({}, {'pagination': 'cursor'}):
+            etag = self.client.get(url, params)['ETag']
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            Recipe.objects.create(author=self.user, **self.valid_recipe_data)
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_comments_and_ratings_not_modified(self):
+        """Test conditional GET on the nested comment and rating endpoints"""
+        urls = [
+            reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id}),
+            reverse('recipe-comments-detail', kwargs={'recipe_pk': self.recipe.id, 'pk': self.comment.id}),
+            reverse('recipe-difficulty-ratings-list', kwargs={'recipe_pk': self.recipe.id}),
+        ]
+        for url in urls:
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Comment.objects.create(recipe=self.recipe, author=self.other_user, content='New')
+        response = self.client.get(urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_anonymous_not_modified_from_cache(self):
+        """Test that cached anonymous responses answer conditional requests without queries"""
+        self.client.credentials()
+        etag = self.client.get(self.detail_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_recipe_returns_404(self):
+        """Test that conditional requests for unknown recipes still return 404"""
+        url = reverse('recipe-detail', args=[99999])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"abc"')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(BaseTestCase):
+    """
+    Tests for read replica routing. A second, separately migrated SQLite
+    database stands in for the replica; as nothing replicates into it, reads
+    that find no data prove they were routed to the replica. The alias only
+    exists while the class runs, so it is added to `databases` here.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = connections.configure_settings({
+            'default': connections.settings['default'],
+            'replica': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.replica_dir.name, 'replica.sqlite3'),
+            },
+        })['replica']
+        call_command('migrate', database='replica', verbosity=0)
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(author=self.user, **self.valid_recipe_data)
+        self.comments_url = reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id})
+
+    def test_router(self):
+        """Test that only reads inside read_from_replica() go to the replica"""
+        self.assertEqual(Recipe.objects.all().db, 'default')
+        with read_from_replica():
+            self.assertEqual(Recipe.objects.all().db, 'replica')
+            self.assertEqual(router.db_for_write(Recipe), 'default')
+
+    def test_safe_requests_read_from_replica(self):
+        """Test that authenticated list and nested list requests use the replica"""
+        Comment.objects.create(recipe=self.recipe, author=self.user, content='On the primary')
+        self.authenticate_user(self.user)
+        response = self.client.get(reverse('recipe-list'))
+        self.assertEqual(response.data['count'], 0)
+        response = self.client.get(self.comments_url)
+        self.assertEqual(response.data['results'], [])
+
+    def test_cached_anonymous_reads_use_primary(self):
+        """Test that responses going into the shared cache are built from the primary"""
+        response = self.client.get(reverse('recipe-list'))
+        self.assertEqual(response.data['count'], 1)
+
+    def test_writer_sticks_to_primary(self):
+        """Test that a user's reads right after a write go to the primary"""
+        self.authenticate_user(self.user)
+        response = self.client.post(self.comments_url, self.valid_comment_data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(self.comments_url)
+        self.assertEqual(len(response.data['results']), 1)
+
+        # Other users are not pinned
+        self.authenticate_user(self.other_user)
+        response = self.client.get(self.comments_url)
+        self.assertEqual(response.data['results'], [])
+
+    @override_settings(ROOT_URLCONF='recipes.tests')
+    async def test_async_reads_read_from_replica(self):
+        """Test that the async views route to the replica, initial() running in a worker thread"""
+        await Comment.objects.acreate(recipe=self.recipe, author=self.user, content='On the primary')
+        access = self.get_tokens_for_user(self.other_user)['access']
+        response = await self.async_client.get(self.comments_url, headers={'Authorization': f'Bearer {access}'})
+        self.assertEqual(response.json()['results'], [])
+        self.assertIsNone(replica_alias.get())
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_pin_lookup_without_replicas(self):
+        """Test that without replicas reads don't look up the user's primary pin"""
+        self.authenticate_user(self.user)
+        pins = caches[settings.DATABASE_REPLICA_CACHE_ALIAS]
+        with mock.patch.object(pins, 'get', wraps=pins.get) as get:
+            response = self.client.get(self.comments_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        get.assert_not_called()
+
+    @override_settings(DATABASE_REPLICA_STICKY_SECONDS=0)
+    def test_sticky_window_can_be_disabled(self):
+        """Test that without a sticky window reads go back to the replica at once"""
+        self.authenticate_user(self.user)
+        self.client.post(self.comments_url, self.valid_comment_data)
+        response = self.client.get(self.comments_url)
+        self.assertEqual(response.data['results'], [])
+
+
+@override_settings(ROOT_URLCONF='recipes.tests')
+class AsyncReadTests(BaseTestCase):
+    """
+    Tests for the async read views (recipes/api/async_views.py). This module's
+    URLconf serves the API with async reads; responses are compared with the
+    ones of the regular sync views.
+    """
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(author=self.user, **self.valid_recipe_data)
+        self.comment = Comment.objects.create(recipe=self.recipe, author=self.other_user, content='Nice')
+        DifficultyRating.objects.create(recipe=self.recipe, rating_author=self.user, rating=3)
+        self.urls = [
+            reverse('recipe-list'),
+            reverse('recipe-list') + '?pagination=cursor',
+            reverse('recipe-detail', args=[self.recipe.id]),
+            reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id}),
+            reverse('recipe-comments-detail', kwargs={'recipe_pk': self.recipe.id, 'pk': self.comment.id}),
+            reverse('recipe-difficulty-ratings-list', kwargs={'recipe_pk': self.recipe.id}),
+        ]
+        self.access = self.get_tokens_for_user(self.user)['access']
+
+    def test_read_views_are_async(self):
+        """Test that list and detail routes resolve to coroutine views"""
+        for url in self.urls:
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(url.split('?')[0]).func), url)
+        self.assertFalse(asyncio.iscoroutinefunction(resolve(reverse('user-info')).func))
+
+    def test_responses_match_sync_views(self):
+        """Test that the async views return the same bodies and validators as the sync ones"""
+        self.authenticate_user(self.user)
+        for url in self.urls:
+            response = self.client.get(url)
+            with override_settings(ROOT_URLCONF='recipe_hub_backend.urls'):
+                expected = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            self.assertEqual(response.content, expected.content, url)
+            self.assertEqual(response['ETag'], expected['ETag'], url)
+            self.assertEqual(response['Content-Type'], expected['Content-Type'], url)
+
+    def test_sync_views_are_not_used(self):
+        """Test that reads are served without running the sync list/retrieve actions"""
+        self.authenticate_user(self.user)
+        with mock.patch.object(RecipeViewSet, 'list', side_effect=AssertionError), \
+                mock.patch.object(RecipeViewSet, 'retrieve', side_effect=AssertionError), \
+                mock.patch.object(CommentViewSet, 'list', side_effect=AssertionError):
+            for url in self.urls[:4]:
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK, url)
+
+    def test_query_counts(self):
+        """Test that the async list runs the same queries as the sync one"""
+        self.authenticate_user(self.user)
+        # Pagination COUNT, page query and the user's ratings
+        with self.assertNumQueries(3):
+            response = self.client.get(self.urls[0])
+        self.assertEqual(response.json()['results'][0]['user_rating'], 3)
+
+    def test_session_authentication(self):
+        """Test that browser sessions are authenticated by the async views"""
+        self.client.force_login(self.user)
+        response = self.client.get(self.urls[0])
+        self.assertEqual(response.json()['results'][0]['user_rating'], 3)
+
+    def test_anonymous_reads_are_cached(self):
+        """Test that the async views use the shared response cache"""
+        self.assertEqual(self.client.get(self.urls[2])['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.urls[2])
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    async def test_blocking_calls_leave_the_event_loop(self):
+        """Test that throttling and the response cache, which block, run in worker threads"""
+        on_event_loop = []
+
+        def record(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_event_loop.append(True)
+            except RuntimeError:
+                on_event_loop.append(False)
+
+        store = get_throttle_store()
+        with mock.patch.object(type(store), 'hit', autospec=True, side_effect=lambda *args, **kwargs: record() or (1, 0)), \
+                mock.patch.object(type(get_response_cache()), 'get', side_effect=record):
+            response = await self.async_client.get(self.urls[2])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(len(on_event_loop), 2)
+        self.assertNotIn(True, on_event_loop)
+
+    def test_not_modified(self):
+        """Test conditional GET through the async views"""
+        self.authenticate_user(self.user)
+        for url in self.urls:
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, url)
+
+    def test_errors(self):
+        """Test that auth failures, missing objects and throttling answer like the sync views"""
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer invalid')
+        response = self.client.get(self.urls[0])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+        self.assertIn('WWW-Authenticate', response)
+
+        self.authenticate_user(self.user)
+        response = self.client.get(reverse('recipe-detail', args=[99999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.user.is_active = False
+        self.user.save()
+        with override_settings(RECIPE_JWT_STATELESS=False):
+            response = self.client.get(self.urls[0])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials()
+        with mock.patch('recipes.api.throttling.RecipeAnonThrottle.rate', '1/minute'):
+            self.client.get(self.urls[0])
+            response = self.client.get(self.urls[0])
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    def test_other_requests_use_sync_views(self):
+        """Test that writes and the browsable API still go through the sync views"""
+        self.authenticate_user(self.user)
+        response = self.client.post(self.urls[3], self.valid_comment_data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(self.urls[0], HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+    async def test_asgi_request(self):
+        """Test an authenticated read through the full async request handler"""
+        response = await self.async_client.get(self.urls[0], headers={'Authorization': f'Bearer {self.access}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 1)
+
+
+class StatelessJWTTests(BaseTestCase):
+    """Tests for authenticating from the access token claims and the user cache"""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(author=self.user, **self.valid_recipe_data)
+        self.comments_url = reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id})
+
+    def test_access_token_claims(self):
+        """Test that access tokens carry the user claims"""
+        token = AccessToken(self.get_tokens_for_user(self.admin_user)['access'])
+        self.assertEqual(token['user_id'], self.admin_user.id)
+        self.assertEqual(token['username'], 'admin')
+        self.assertTrue(token['is_staff'])
+
+    def test_requests_do_not_load_the_user(self):
+        """Test that authenticated requests build the user from the token"""
+        self.authenticate_user(self.user)
+        # Only the page query of the comment list
+        with self.assertNumQueries(1):
+            response = self.client.get(self.comments_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.wsgi_request.user, TokenUser)
+        self.assertEqual(response.wsgi_request.user.username, 'testuser')
+
+    def test_writes_and_permissions(self):
+        """Test that token users can write and are checked against the right author"""
+        self.authenticate_user(self.user)
+        response = self.client.post(self.comments_url, self.valid_comment_data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['author']['username'], 'testuser')
+        comment_url = reverse('recipe-comments-detail', kwargs={
+            'recipe_pk': self.recipe.id, 'pk': response.data['id']
+        })
+
+        self.authenticate_user(self.other_user)
+        response = self.client.patch(comment_url, {'content': 'Not mine'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.authenticate_user(self.admin_user)
+        response = self.client.delete(comment_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_user_info_uses_cache(self):
+        """Test that the full user comes from the cache, which user changes invalidate"""
+        self.authenticate_user(self.user)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('user-info'))
+
+        self.user.email = 'changed@example.com'
+        self.user.save()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('user-info'))
+        self.assertEqual(response.data['email'], 'changed@example.com')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('user-info'))
+
+    def test_refresh_updates_claims(self):
+        """Test that refreshed access tokens pick up changed user attributes"""
+        refresh = self.get_tokens_for_user(self.user)['refresh']
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh})
+        self.assertTrue(AccessToken(response.data['access'])['is_staff'])
+
+    def test_refresh_ignores_cached_user(self):
+        """Test that refreshed claims come from the User row, not a copy cached before a change"""
+        refresh = self.get_tokens_for_user(self.admin_user)['refresh']
+        # Changed without signals, like a change made by another worker the cache hasn't seen yet
+        User.objects.filter(pk=self.admin_user.pk).update(is_staff=False)
+        self.assertTrue(get_cached_user(self.admin_user.pk).is_staff)
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh})
+        self.assertFalse(AccessToken(response.data['access'])['is_staff'])
+
+        User.objects.filter(pk=self.admin_user.pk).update(is_active=False)
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_cache_must_be_shared(self):
+        """Test that a per-process user cache fails the system checks"""
+        self.assertEqual(check_user_cache(None), [])
+        with override_settings(
+            CACHES={**settings.CACHES, 'users': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        ):
+            self.assertEqual([error.id for error in check_user_cache(None)], ['recipes.E001'])
+
+    def test_token_obtain_issues_claims(self):
+        """Test that the token endpoint issues access tokens with the claims"""
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'testuser', 'password': 'TestPass123!'
+        })
+        self.assertEqual(AccessToken(response.data['access'])['username'], 'testuser')
+
+    def test_tokens_without_claims(self):
+        """Test that tokens issued without the claims authenticate through the user cache"""
+        access = str(PlainRefreshToken.for_user(self.user).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = self.client.get(self.comments_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.wsgi_request.user, User)
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.comments_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(RECIPE_JWT_STATELESS=False)
+    def test_stateful_mode(self):
+        """Test that the user is loaded on every request when stateless mode is off"""
+        self.authenticate_user(self.user)
+        # User lookup and the page query
+        with self.assertNumQueries(2):
+            response = self.client.get(self.comments_url)
+        self.assertIsInstance(response.wsgi_request.user, User)
+
+
+class BulkWriteTests(BaseTestCase):
+    """Tests for the bulk rating and comment endpoint"""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('bulk-write')
+        self.recipes = [
+            Recipe.objects.create(author=self.other_user, **dict(self.valid_recipe_data, title=f'Recipe {i}'))
+            for i in range(3)
+        ]
+
+    def assertAggregatesConsistent(self):
+        aggregates = list(Recipe.objects.order_by('pk').values_list('comment_count', 'rating_count', 'rating_sum'))
+        Recipe.rebuild_aggregates()
+        self.assertEqual(
+            aggregates,
+            list(Recipe.objects.order_by('pk').values_list('comment_count', 'rating_count', 'rating_sum'))
+        )
+
+    def test_creates_and_updates_ratings(self):
+        """Test that ratings are created or updated and the aggregates follow"""
+        first, second, _ = self.recipes
+        rating = DifficultyRating.objects.create(recipe=first, rating_author=self.user, rating=2)
+        DifficultyRating.objects.create(recipe=first, rating_author=self.other_user, rating=4)
+        self.authenticate_user(self.user)
+        response = self.client.post(self.url, {
+            'ratings': [{'recipe_id': first.id, 'rating': 5}, {'recipe_id': second.id, 'rating': 3}],
+            'comments': [{'recipe_id': second.id, 'content': 'Great'}, {'recipe_id': second.id, 'content': 'Again'}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        new_rating = DifficultyRating.objects.get(recipe=second, rating_author=self.user)
+        self.assertEqual(response.data['ratings'], [
+            {'status': 'updated', 'id': rating.id},
+            {'status': 'created', 'id': new_rating.id},
+        ])
+        self.assertEqual([result['status'] for result in response.data['comments']], ['created', 'created'])
+        self.assertEqual(
+            sorted(result['id'] for result in response.data['comments']),
+            sorted(Comment.objects.filter(recipe=second).values_list('id', flat=True))
+        )
+        rating.refresh_from_db()
+        self.assertEqual(rating.rating, 5)
+        first.refresh_from_db()
+        self.assertEqual((first.rating_count, first.rating_sum), (2, 9))
+        second.refresh_from_db()
+        self.assertEqual((second.rating_count, second.rating_sum, second.comment_count), (1, 3, 2))
+        self.assertAggregatesConsistent()
+
+    def test_invalid_items_are_reported(self):
+        """Test that invalid items are reported per item and the valid ones are written"""
+        self.authenticate_user(self.user)
+        response = self.client.post(self.url, {
+            'ratings': [
+                {'recipe_id': self.recipes[0].id, 'rating': 7},
+                {'recipe_id': 999999, 'rating': 2},
+                {'recipe_id': self.recipes[1].id, 'rating': 2},
+            ],
+            'comments': [{'recipe_id': self.recipes[0].id, 'content': ''}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ratings = response.data['ratings']
+        self.assertEqual(ratings[0]['status'], 'invalid')
+        self.assertIn('rating', ratings[0]['errors'])
+        self.assertEqual(ratings[1], {'status': 'invalid', 'errors': {'recipe_id': ['Recipe not found.']}})
+        self.assertEqual(ratings[2]['status'], 'created')
+        self.assertEqual(response.data['comments'][0]['status'], 'invalid')
+        self.assertEqual(DifficultyRating.objects.count(), 1)
+        self.assertFalse(Comment.objects.exists())
+        self.assertAggregatesConsistent()
+
+    def test_last_rating_of_a_recipe_wins(self):
+        """Test that repeated ratings of a recipe are superseded by the last one"""
+        self.authenticate_user(self.user)
+        recipe = self.recipes[0]
+        response = self.client.post(self.url, {
+            'ratings': [{'recipe_id': recipe.id, 'rating': 1}, {'recipe_id': recipe.id, 'rating': 4}],
+        }, format='json')
+        self.assertEqual(response.data['ratings'][0], {'status': 'superseded'})
+        self.assertEqual(response.data['ratings'][1]['status'], 'created')
+        self.assertEqual(DifficultyRating.objects.get(recipe=recipe).rating, 4)
+        self.assertAggregatesConsistent()
+
+    def test_query_count_does_not_grow_with_items(self):
+        """Test that the number of queries doesn't depend on the number of items"""
+        self.authenticate_user(self.user)
+        recipes = self.recipes + [
+            Recipe.objects.create(author=self.other_user, **dict(self.valid_recipe_data, title=f'More {i}'))
+            for i in range(47)
+        ]
+
+        def payload(count):
+            return {
+                'ratings': [{'recipe_id': recipe.id, 'rating': 3} for recipe in recipes[:count]],
+                'comments': [{'recipe_id': recipe.id, 'content': 'Nice'} for recipe in recipes[:count]],
+            }
+
+        # Lock, previous ratings, upsert, aggregates, rating ids, comment insert,
+        # aggregates, plus the savepoints of the two nested atomic blocks
+        with self.assertNumQueries(11):
+            self.client.post(self.url, payload(10), format='json')
+        with self.assertNumQueries(11):
+            self.client.post(self.url, payload(50), format='json')
+        self.assertEqual(DifficultyRating.objects.count(), 50)
+        self.assertAggregatesConsistent()
+
+    def test_requires_authentication(self):
+        """Test that anonymous users can't write in bulk"""
+        response = self.client.post(self.url, {'ratings': [{'recipe_id': self.recipes[0].id, 'rating': 3}]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_envelope_validation(self):
+        """Test that empty and oversized requests are rejected"""
+        self.authenticate_user(self.user)
+        response = self.client.post(self.url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        items = [{'recipe_id': self.recipes[0].id, 'content': 'Hi'}] * 501
+        response = self.client.post(self.url, {'comments': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Comment.objects.exists())
+
+
+@isolated_state
+class RatingConcurrencyTests(APITransactionTestCase):
+    """Tests for concurrent ratings, with each request in its own thread and transaction"""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Threads share the in-memory database's cache, which fails concurrent
+            # writers at once instead of making them wait for the lock
+            self.skipTest('needs a test database that accepts concurrent connections')
+        get_throttle_store().clear()
+        get_user_cache().clear()
+        self.users = [
+            User.objects.create_user(username=f'rater{i}', password='RaterPass123!') for i in range(4)
+        ]
+        self.recipe = Recipe.objects.create(
+            author=self.users[0],
+            title='Contended recipe',
+            description='Rated by everyone at once',
+            ingredients='Flour',
+            instructions='Bake',
+            cooking_time=10
+        )
+        self.url = reverse('recipe-difficulty-ratings-list', kwargs={'recipe_pk': self.recipe.id})
+
+    def test_concurrent_ratings(self):
+        """Test that concurrent POSTs by the same users never fail and keep the aggregates exact"""
+        posts_per_user = 6
+        tokens = [str(RefreshToken.for_user(user).access_token) for user in self.users]
+        barrier = threading.Barrier(len(self.users) * posts_per_user)
+        statuses = []
+
+        def post(token, rating):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            try:
+                barrier.wait()
+                statuses.append(client.post(self.url, {'rating': rating}).status_code)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=post, args=(token, 1 + (i + n) % 5))
+            for i, token in enumerate(tokens) for n in range(posts_per_user)
+        ]
+        with mock.patch.object(RecipeUserThrottle, 'rate', '1000/minute'):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(statuses), len(threads))
+        self.assertTrue(set(statuses) <= {status.HTTP_200_OK, status.HTTP_201_CREATED}, statuses)
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), len(self.users))
+        self.assertEqual(DifficultyRating.objects.filter(recipe=self.recipe).count(), len(self.users))
+        self.recipe.refresh_from_db()
+        ratings = list(DifficultyRating.objects.filter(recipe=self.recipe).values_list('rating', flat=True))
+        self.assertEqual((self.recipe.rating_count, self.recipe.rating_sum), (len(ratings), sum(ratings)))
+
+
+class RecipeTransferTests(BaseTestCase):
+    """Tests for the NDJSON export_recipes and import_recipes commands"""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                author=self.user if i % 2 else self.other_user,
+                **dict(self.valid_recipe_data, title=f'Recipe {i}', ingredients='2 eggs\nMilk')
+            )
+            Comment.objects.create(recipe=recipe, author=self.other_user, content=f'Comment ü {i}')
+            DifficultyRating.objects.create(recipe=recipe, rating_author=self.user, rating=i + 1)
+        self.path = os.path.join(tempfile.mkdtemp(), 'recipes.ndjson')
+
+    def export(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('export_recipes', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_round_trip(self):
+        """Test that importing an export recreates the same recipes"""
+        exported, report = self.export()
+        scores = dict(Recipe.objects.values_list('title', 'trending_score'))
+        self.assertEqual(len(exported.splitlines()), 3)
+        self.assertIn('Exported 3 recipes, 3 comments and 3 ratings', report)
+        with open(self.path, 'w', encoding='utf-8') as output:
+            output.write(exported)
+        Recipe.objects.all().delete()
+
+        out = StringIO()
+        call_command('import_recipes', self.path, '--chunk-size', '2', stdout=out)
+        self.assertIn('Imported 3 recipes, 3 comments and 3 ratings', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        # Same data, timestamps and aggregates; structured ingredients are rebuilt
+        self.assertEqual(self.export()[0], exported)
+        recipe = Recipe.objects.get(title='Recipe 2')
+        self.assertEqual((recipe.comment_count, recipe.rating_count, recipe.rating_sum), (1, 1, 3))
+        self.assertEqual(list(recipe.ingredient_set.values_list('name', flat=True)), ['eggs', 'milk'])
+        # Trending scores are rebuilt from the imported activity
+        for title, score in Recipe.objects.values_list('title', 'trending_score'):
+            self.assertAlmostEqual(score, scores[title], places=4)
+
+    def test_export_to_file(self):
+        """Test that the export can be written to a file, for one author"""
+        out = StringIO()
+        call_command('export_recipes', self.path, '--author', 'testuser', stdout=out)
+        with open(self.path, encoding='utf-8') as exported:
+            self.assertEqual(len(exported.readlines()), 1)
+        self.assertIn('Exported 1 recipes', out.getvalue())
+
+    def test_query_count_per_chunk(self):
+        """Test that export and import queries depend on the number of chunks, not of rows"""
+        lines = list(RecipeExporter().lines()) * 10
+        with self.assertNumQueries(3):
+            list(RecipeExporter(chunk_size=100).lines())
+        # Users, savepoint, recipes, comments, ratings, ingredients (get/create,
+        # read, clear old, insert), trending scores (recipes, comments, ratings,
+        # update), release
+        with self.assertNumQueries(14):
+            RecipeImporter(chunk_size=100).run(lines[:6])
+        # The users are already known
+        importer = RecipeImporter(chunk_size=100)
+        importer.user_ids = dict(User.objects.values_list('username', 'id'))
+        with self.assertNumQueries(13):
+            importer.run(lines)
+
+    def test_import_without_returned_ids(self):
+        """Test that recipe ids are read back on databases that don't return them"""
+        lines = list(RecipeExporter().lines())
+        features = connections['default'].features
+        with mock.patch.object(type(features), 'can_return_rows_from_bulk_insert', False), \
+                mock.patch.object(type(features), 'can_return_columns_from_insert', False):
+            RecipeImporter().run(lines * 2)
+        self.assertEqual(Recipe.objects.count(), 9)
+        self.assertEqual(Comment.objects.filter(recipe__title='Recipe 1').count(), 3)
+        for recipe in Recipe.objects.all():
+            self.assertEqual(recipe.comments.count(), recipe.comment_count)
+
+    def test_unknown_users(self):
+        """Test that unknown users are an error unless they may be created"""
+        lines = [line.replace('"otheruser"', '"newcomer"') for line in RecipeExporter().lines()]
+        with open(self.path, 'w', encoding='utf-8') as output:
+            output.writelines(lines)
+        with self.assertRaisesMessage(CommandError, 'Unknown users: newcomer'):
+            call_command('import_recipes', self.path, stdout=StringIO())
+        self.assertEqual(Recipe.objects.count(), 3)
+
+        out = StringIO()
+        call_command('import_recipes', self.path, '--create-users', stdout=out)
+        self.assertIn('created 1 users', out.getvalue())
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertEqual(Recipe.objects.filter(author=newcomer).count(), 2)
+
+    def test_invalid_line(self):
+        """Test that invalid lines are reported with their line number"""
+        with open(self.path, 'w', encoding='utf-8') as output:
+            output.write('{"title": "No author"}\n')
+        with self.assertRaisesMessage(CommandError, 'Line 1: invalid recipe'):
+            call_command('import_recipes', self.path, stdout=StringIO())
+        with open(self.path, 'w', encoding='utf-8') as output:
+            output.write(next(RecipeExporter().lines()) + '\nnot json\n')
+        with self.assertRaisesMessage(CommandError, 'Line 3: invalid JSON'):
+            call_command('import_recipes', self.path, stdout=StringIO())
+
+    def test_malformed_comments_and_ratings(self):
+        """Test that comments and ratings that aren't lists are reported with their line number"""
+        record = json.loads(next(RecipeExporter().lines()))
+        for key, value in (('comments', 5), ('ratings', {'author': 'testuser', 'rating': 3})):
+            with open(self.path, 'w', encoding='utf-8') as output:
+                output.write('\n' + json.dumps({**record, key: value}) + '\n')
+            with self.assertRaisesMessage(CommandError, f'Line 2: "{key}" must be a list'):
+                call_command('import_recipes', self.path, stdout=StringIO())
+        self.assertEqual(Recipe.objects.count(), 3)
+
+    def test_invalid_values(self):
+        """Test that values of the wrong type are reported with their line number"""
+        record = json.loads(next(RecipeExporter().lines()))
+        comment, rating = record['comments'][0], record['ratings'][0]
+        cases = (
+            ({'cooking_time': 'abc'}, 'cooking_time: '),
+            ({'title': None}, 'title: '),
+            ({'comments': [{**comment, 'content': None}]}, 'content: '),
+            ({'ratings': [{**rating, 'rating': 6}]}, 'rating: '),
+            ({'created_at': 5}, 'TypeError'),
+        )
+        for changes, message in cases:
+            with self.subTest(changes=changes):
+                with open(self.path, 'w', encoding='utf-8') as output:
+                    output.write(json.dumps(record) + '\n' + json.dumps({**record, **changes}) + '\n')
+                with self.assertRaisesMessage(CommandError, f'Line 2: invalid recipe ({message}'):
+                    call_command('import_recipes', self.path, stdout=StringIO())
+        self.assertEqual(Recipe.objects.count(), 3)
+
+        # Values that convert to the field types are imported
+        with open(self.path, 'w', encoding='utf-8') as output:
+            output.write(json.dumps({**record, 'ingredients': 5, 'cooking_time': '45'}) + '\n')
+        call_command('import_recipes', self.path, stdout=StringIO())
+        recipe = Recipe.objects.latest('pk')
+        self.assertEqual((recipe.ingredients, recipe.cooking_time), ('5', 45))
+
+
+class GenerateDatasetTests(BaseTestCase):
+    """Tests for the synthetic dataset generator"""
+
+    def generate(self, **options):
+        out = StringIO()
+        call_command('generate_dataset', users=5, recipes=20, comments=60, ratings=30,
+                     username_prefix='gen', stdout=out, **options)
+        return out.getvalue()
+
+    def test_generates_consistent_data(self):
+        """Test that the dataset has the requested size and consistent aggregates"""
+        out = self.generate()
+        self.assertIn('Generated 5 users, 20 recipes, 60 comments and', out)
+        self.assertEqual(User.objects.filter(username__startswith='gen').count(), 5)
+        self.assertEqual(Recipe.objects.count(), 20)
+        self.assertEqual(Comment.objects.count(), 60)
+        # At most one rating per user and recipe
+        self.assertLessEqual(DifficultyRating.objects.count(), 30)
+        aggregates = list(Recipe.objects.order_by('pk').values_list('comment_count', 'rating_count', 'rating_sum'))
+        Recipe.rebuild_aggregates()
+        self.assertEqual(
+            aggregates,
+            list(Recipe.objects.order_by('pk').values_list('comment_count', 'rating_count', 'rating_sum'))
+        )
+        self.assertTrue(RecipeIngredient.objects.exists())
+        # Recipes are scored by their generated activity, not as created now
+        scores = list(Recipe.objects.order_by('pk').values_list('trending_score', flat=True))
+        self.assertLess(min(scores), trending.get_new_recipe_score() - 1)
+        call_command('rebuild_trending_scores', stdout=StringIO())
+        for score, rebuilt in zip(scores, Recipe.objects.order_by('pk').values_list('trending_score', flat=True)):
+            self.assertAlmostEqual(score, rebuilt, places=4)
+
+    def test_is_deterministic(self):
+        """Test that the same seed generates the same data, and existing users are reused"""
+        def snapshot():
+            return list(Recipe.objects.order_by('pk').values_list(
+                'title', 'ingredients', 'author__username', 'comment_count', 'rating_sum'
+            ))
+
+        self.generate(seed=7)
+        first = snapshot()
+        Recipe.objects.all().delete()
+        self.generate(seed=7)
+        self.assertEqual(snapshot(), first)
+        self.assertEqual(User.objects.filter(username__startswith='gen').count(), 5)
+
+
+@override_settings(RECIPE_METRICS_TOKEN='scraper-secret')
+class RequestMetricsTests(BaseTestCase):
+    """Tests for the request metrics middleware and the /metrics endpoint"""
+
+    def setUp(self):
+        super().setUp()
+        metrics_registry.reset()
+        self.recipe = Recipe.objects.create(author=self.user, **self.valid_recipe_data)
+        Comment.objects.create(recipe=self.recipe, author=self.other_user, content='Nice')
+        self.comments_url = reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id})
+        self.labels = ('api/recipes/<recipe_pk>/comments/', 'GET', 'list')
+
+    def get_series(self, name, labels=None):
+        """[bucket counts..., sum, count] of a histogram series"""
+        return metrics_registry.histograms[name].series.get(labels or self.labels)
+
+    def test_records_request(self):
+        """Test that queries, serializer time, size and latency are recorded per route and action"""
+        response = self.client.get(self.comments_url)
+        self.assertEqual(self.get_series('queries')[-2:], [1, 1])
+        self.assertGreater(self.get_series('query_time')[-2], 0)
+        self.assertGreater(self.get_series('serializer_time')[-2], 0)
+        self.assertEqual(self.get_series('size')[-2], len(response.content))
+        self.assertGreater(self.get_series('duration')[-2], self.get_series('query_time')[-2])
+
+        metrics = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scraper-secret')
+        self.assertEqual(metrics.status_code, status.HTTP_200_OK)
+        self.assertTrue(metrics['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = metrics.content.decode()
+        self.assertIn(
+            'recipe_hub_requests_total{route="api/recipes/<recipe_pk>/comments/",method="GET",action="list",'
+            'status="200"} 1', text
+        )
+        self.assertIn(
+            'recipe_hub_request_db_queries_bucket{route="api/recipes/<recipe_pk>/comments/",method="GET",'
+            'action="list",le="1"} 1', text
+        )
+        self.assertIn('# TYPE recipe_hub_request_duration_seconds histogram', text)
+
+    @override_settings(RECIPE_METRICS_SAMPLE_RATE=0)
+    def test_sampling(self):
+        """Test that requests outside the sample aren't measured"""
+        self.client.get(self.comments_url)
+        self.assertIsNone(self.get_series('queries'))
+
+    @override_settings(RECIPE_METRICS_QUERY_WARNING=2)
+    def test_query_warning(self):
+        """Test that requests running too many queries are logged"""
+        self.authenticate_user(self.user)
+        with self.assertLogs('recipes.metrics', 'WARNING') as logs:
+            self.client.post(self.comments_url, self.valid_comment_data)
+        self.assertIn(f'POST {self.comments_url} (create) ran', logs.output[0])
+        with self.assertNoLogs('recipes.metrics', 'WARNING'):
+            self.client.get(self.comments_url)
+
+    def test_metrics_token(self):
+        """Test that /metrics requires the configured bearer token"""
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong-secret')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scraper-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(RECIPE_METRICS_TOKEN='')
+    def test_metrics_without_token(self):
+        """Test that without a token /metrics is only served to staff users"""
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_404_NOT_FOUND)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_200_OK)
+
+    @override_settings(ROOT_URLCONF='recipes.tests')
+    async def test_async_request(self):
+        """Test that requests served by the async views are measured, queries included"""
+        access = self.get_tokens_for_user(self.user)['access']
+        response = await self.async_client.get(self.comments_url, headers={'Authorization': f'Bearer {access}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_series('queries')[-2:], [1, 1])
+        self.assertGreater(self.get_series('serializer_time')[-2], 0)
+
+
+class StreamingListTests(BaseTestCase):
+    """Tests for the streamed list responses (recipes/api/streaming.py)"""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            recipe = Recipe.objects.create(author=self.user, **dict(self.valid_recipe_data, title=f'Recipe {i}'))
+        self.recipe = recipe
+        DifficultyRating.objects.create(recipe=recipe, rating_author=self.user, rating=4)
+        for i in range(3):
+            Comment.objects.create(recipe=recipe, author=self.other_user, content=f'Comment {i}')
+        self.list_urls = [
+            reverse('recipe-list'),
+            reverse('recipe-comments-list', kwargs={'recipe_pk': recipe.id}),
+            reverse('recipe-difficulty-ratings-list', kwargs={'recipe_pk': recipe.id}),
+        ]
+
+    def get_streamed(self, url, params=None):
+        """The results and next link of a streamed page"""
+        response = self.client.get(url, {'stream': 'true', **(params or {})})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+        self.assertTrue(response.streaming, url)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        body = json.loads(b''.join(response.streaming_content))
+        return body['results'], body['next']
+
+    def test_streamed_lists_match_regular_lists(self):
+        """Test that streamed lists hold every object, serialized like in the regular list"""
+        self.authenticate_user(self.user)
+        with mock.patch.object(StreamingListMixin, 'stream_chunk_size', 2):
+            for url in self.list_urls:
+                regular = self.client.get(url).json()
+                expected = regular['results'] if isinstance(regular, dict) else regular
+                self.assertEqual(self.get_streamed(url), (expected, None), url)
+        recipes, _ = self.get_streamed(self.list_urls[0])
+        self.assertEqual([recipe['user_rating'] for recipe in recipes], [4, None, None, None, None])
+
+    def test_streams_are_paged(self):
+        """Test that a stream holds one page at most, linking to the next one"""
+        url = self.list_urls[0]
+        titles, params = [], {'page_size': 2}
+        with mock.patch.object(StreamingListMixin, 'stream_chunk_size', 1):
+            while True:
+                recipes, next_link = self.get_streamed(url, params)
+                self.assertLessEqual(len(recipes), 2)
+                titles += [recipe['title'] for recipe in recipes]
+                if next_link is None:
+                    break
+                params = dict(parse_qsl(urlsplit(next_link).query))
+                self.assertEqual(params['stream'], 'true')
+        self.assertEqual(titles, [f'Recipe {i}' for i in range(4, -1, -1)])
+
+        with mock.patch.object(StreamingListMixin, 'stream_max_page_size', 3):
+            recipes, next_link = self.get_streamed(self.list_urls[0], {'page_size': 1000})
+        self.assertEqual(len(recipes), 3)
+        self.assertIsNotNone(next_link)
+        with mock.patch.object(StreamingListMixin, 'stream_page_size', 4):
+            self.assertEqual(len(self.get_streamed(self.list_urls[0])[0]), 4)
+
+    def test_queries_per_chunk(self):
+        """Test that rows are read with one query and the user's ratings once per chunk"""
+        self.authenticate_user(self.user)
+        with mock.patch.object(StreamingListMixin, 'stream_chunk_size', 2):
+            response = self.client.get(self.list_urls[0], {'stream': 'true'})
+            # Nothing is read before the body is consumed
+            with self.assertNumQueries(4):
+                self.assertEqual(len(json.loads(b''.join(response.streaming_content))['results']), 5)
+
+    def test_empty_list(self):
+        """Test that an empty list streams as an empty page"""
+        Comment.objects.all().delete()
+        self.assertEqual(self.get_streamed(self.list_urls[1]), ([], None))
+
+    def test_not_cached(self):
+        """Test that streamed responses skip the response cache and validators"""
+        response = self.client.get(self.list_urls[0], {'stream': 'true'})
+        self.assertTrue(response.streaming)
+        self.assertNotIn('X-Cache', response)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(cache_stats.as_dict()['misses'], 0)
+
+    def test_browsable_api_is_not_streamed(self):
+        """Test that only JSON responses are streamed"""
+        response = self.client.get(self.list_urls[0], {'stream': 'true'}, HTTP_ACCEPT='text/html')
+        self.assertFalse(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+    def test_export(self):
+        """Test the NDJSON export endpoint, admins only"""
+        url = reverse('recipe-export')
+        self.authenticate_user(self.user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.authenticate_user(self.admin_user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, [line.rstrip('\n') for line in RecipeExporter().lines()])
+        self.assertEqual(len(json.loads(lines[-1])['comments']), 3)
+
+    @override_settings(ROOT_URLCONF='recipes.tests')
+    async def test_async_stream(self):
+        """Test that the async read views stream from an async iterator"""
+        access = self.get_tokens_for_user(self.user)['access']
+        response = await self.async_client.get(
+            self.list_urls[0], {'stream': 'true'}, headers={'Authorization': f'Bearer {access}'}
+        )
+        self.assertTrue(response.is_async)
+        body = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        recipes = body['results']
+        self.assertEqual([recipe['title'] for recipe in recipes], [f'Recipe {i}' for i in range(4, -1, -1)])
+        self.assertEqual(recipes[0]['user_rating'], 4)
+        self.assertIsNone(body['next'])
+
+
+class FieldSelectionTests(BaseTestCase):
+    """Tests for ?fields= and ?expand= (recipes/api/fields.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(author=self.user, **self.valid_recipe_data)
+        Comment.objects.create(recipe=self.recipe, author=self.other_user, content='Nice')
+        DifficultyRating.objects.create(recipe=self.recipe, rating_author=self.user, rating=2)
+        self.detail_url = reverse('recipe-detail', args=[self.recipe.id])
+        self.comments_url = reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id})
+        self.ratings_url = reverse('recipe-difficulty-ratings-list', kwargs={'recipe_pk': self.recipe.id})
+        self.authenticate_user(self.user)
+
+    def test_default_representation(self):
+        """Test that without parameters every field is sent, with nested relations"""
+        data = self.client.get(self.detail_url).json()
+        self.assertEqual(tuple(data), RecipeSerializer.Meta.fields)
+        self.assertEqual(data['author']['username'], 'testuser')
+        self.assertEqual(data['comments'][0]['author']['username'], 'otheruser')
+
+    def test_sparse_detail(self):
+        """Test that only the selected columns are read, without joins or extra queries"""
+        with self.assertNumQueries(1) as queries:
+            response = self.client.get(self.detail_url, {'fields': 'id,title,author', 'expand': ''})
+        self.assertEqual(response.json(), {'id': self.recipe.id, 'title': 'Test Recipe', 'author': self.user.id})
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('instructions', sql)
+
+    def test_expand(self):
+        """Test that ?expand= picks the nested relations, leaving the recipe's comments out"""
+        with self.assertNumQueries(2):
+            data = self.client.get(self.detail_url, {'expand': 'author'}).json()
+        self.assertNotIn('comments', data)
+        self.assertEqual(data['author']['username'], 'testuser')
+        self.assertEqual(data['user_rating'], 2)
+        self.assertEqual(data['average_difficulty'], 2.0)
+
+    def test_sparse_list(self):
+        """Test that the user's ratings aren't read unless user_rating is selected"""
+        # Pagination COUNT and the page query
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('recipe-list'), {'fields': 'id,description,author'})
+        self.assertEqual(response.json()['results'], [{
+            'id': self.recipe.id,
+            'description': 'A test recipe description',
+            'author': {'id': self.user.id, 'username': 'testuser', 'email': 'test@example.com'},
+        }])
+
+    def test_comments_and_ratings(self):
+        """Test the selection on the comment and rating lists"""
+        comments = self.client.get(self.comments_url, {'expand': ''}).json()['results']
+        self.assertEqual(comments[0]['author'], self.other_user.id)
+        self.assertEqual(tuple(comments[0]), CommentSerializer.Meta.fields)
+        # The ratings, without joining their authors, and the list validators
+        with self.assertNumQueries(2) as queries:
+            ratings = self.client.get(self.ratings_url, {'fields': 'rating'}).json()
+        self.assertNotIn('JOIN', queries.captured_queries[0]['sql'])
+        self.assertEqual(ratings, [{'rating': 2}])
+
+    def test_unknown_fields(self):
+        """Test that unknown names are rejected"""
+        response = self.client.get(self.detail_url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', response.json()['fields'][0])
+        response = self.client.get(self.comments_url, {'expand': 'recipe'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['expand'], ['Unknown field(s): recipe. Choose from: author.'])
+
+    def test_not_modified(self):
+        """Test that the validators of a selection match with and without the served recipe"""
+        for params in ({'expand': 'author'}, {'fields': 'id,comments'}):
+            etag = self.client.get(self.detail_url, params)['ETag']
+            response = self.client.get(self.detail_url, params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, params)
+
+    def test_writes_send_every_field(self):
+        """Test that the parameters only apply to reads"""
+        response = self.client.post(f'{self.comments_url}?fields=id', self.valid_comment_data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['author']['username'], 'testuser')
+
+    def test_async_views(self):
+        """Test that the async read views apply the selection like the sync ones"""
+        url = f'{self.detail_url}?fields=id,title,author&expand='
+        expected = self.client.get(url).content
+        with override_settings(ROOT_URLCONF='recipes.tests'):
+            self.assertEqual(self.client.get(url).content, expected)
+
+
+class CompiledSerializerParityTests(BaseTestCase):
+    """
+    Tests for the compiled read path (recipes/api/compiled.py): responses
+    must be byte-identical to the ones of the regular serializers.
+    """
+    def setUp(self):
+        super().setUp()
+        compiled_serializers.clear()
+        for i in range(3):
+            recipe = Recipe.objects.create(author=self.user, **dict(self.valid_recipe_data, title=f'Recipe {i}'))
+        # A long description, cut down to an excerpt
+        Recipe.objects.create(author=self.other_user, **dict(self.valid_recipe_data, description='Long ' * 100))
+        DifficultyRating.objects.create(recipe=recipe, rating_author=self.user, rating=4)
+        DifficultyRating.objects.create(recipe=recipe, rating_author=self.other_user, rating=1)
+        for i in range(3):
+            Comment.objects.create(recipe=recipe, author=self.other_user, content=f'Comment "{i}" \u00e9')
+        recipes_url = reverse('recipe-list')
+        comments_url = reverse('recipe-comments-list', kwargs={'recipe_pk': recipe.id})
+        ratings_url = reverse('recipe-difficulty-ratings-list', kwargs={'recipe_pk': recipe.id})
+        self.requests = [
+            (recipes_url, {}),
+            (recipes_url, {'pagination': 'cursor'}),
+            (recipes_url, {'fields': 'id,description,average_difficulty,user_rating'}),
+            (recipes_url, {'expand': ''}),
+            (recipes_url, {'stream': 'true'}),
+            (recipes_url, {'stream': 'true', 'page_size': 1}),
+            (comments_url, {}),
+            (comments_url, {'expand': '', 'fields': 'id,author,created_at'}),
+            (comments_url, {'stream': 'true'}),
+            (ratings_url, {}),
+            (ratings_url, {'fields': 'rating,rating_author', 'expand': ''}),
+        ]
+
+    def get_content(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, (url, params))
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def assert_parity(self):
+        for url, params in self.requests:
+            compiled = self.get_content(url, params)
+            with mock.patch.object(CompiledReadMixin, 'compiled_actions', ()):
+                expected = self.get_content(url, params)
+            self.assertEqual(compiled, expected, (url, params))
+
+    def test_compiled_lists_match_serializers(self):
+        """Test the lists of an authenticated user and of an anonymous one"""
+        self.authenticate_user(self.user)
+        self.assert_parity()
+        self.client.credentials()
+        self.assert_parity()
+
+    def test_async_views(self):
+        """Test that the async list views serve the same bodies"""
+        self.authenticate_user(self.user)
+        # Async streams are compared in StreamingListTests
+        self.requests = [(url, params) for url, params in self.requests if 'stream' not in params]
+        with override_settings(ROOT_URLCONF='recipes.tests'):
+            self.assert_parity()
+
+    def test_lists_are_compiled(self):
+        """Test that lists are read as rows, without loading model instances"""
+        self.authenticate_user(self.user)
+        with mock.patch.object(Recipe, 'from_db', side_effect=AssertionError), \
+                mock.patch.object(Comment, 'from_db', side_effect=AssertionError), \
+                mock.patch.object(DifficultyRating, 'from_db', side_effect=AssertionError):
+            for url, params in self.requests:
+                self.get_content(url, params)
+        self.assertTrue(compiled_serializers)
+        self.assertNotIn(None, compiled_serializers.values())
+
+    def test_browsable_api_uses_serializers(self):
+        """Test that other formats than JSON keep the regular path"""
+        url, params = self.requests[0]
+        response = self.client.get(url, params, HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(compiled_serializers)
+
+
+class FastJSONTests(BaseTestCase):
+    """Tests for the orjson renderer and parser (recipes/api/renderers.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = {
+            'title': 'Crème brûlée \u2028 \u2029 "quoted" \\ \n',
+            'created_at': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'naive': datetime.datetime(2024, 5, 1, 12, 30),
+            'day': datetime.date(2024, 5, 1),
+            'rating': decimal.Decimal('3.25'),
+            'average': 2.5,
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'label': gettext_lazy('Recipe'),
+            'counts': {1: 2, 'three': (4, None, True)},
+        }
+
+    def test_output_matches_stdlib_renderer(self):
+        """Test that responses are the same bytes as with DRF's renderer"""
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        # Values orjson can't encode are rendered by the stdlib
+        self.assertEqual(FastJSONRenderer().render({'big': 2 ** 70}), b'{"big":1180591620717411303424}')
+        indented = FastJSONRenderer().render(self.data, 'application/json; indent=4')
+        self.assertEqual(indented, JSONRenderer().render(self.data, 'application/json; indent=4'))
+
+    def test_stdlib_backend(self):
+        """Test that orjson isn't used with RECIPE_JSON_BACKEND = 'json'"""
+        with override_settings(RECIPE_JSON_BACKEND='json'), \
+                mock.patch('recipes.api.renderers.orjson.dumps', side_effect=AssertionError), \
+                mock.patch('recipes.api.renderers.orjson.loads', side_effect=AssertionError):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+            self.assertEqual(FastJSONParser().parse(BytesIO(b'{"a":1}')), {'a': 1})
+
+    def test_parser(self):
+        """Test that request bodies are parsed, and invalid ones rejected"""
+        body = '{"content":"Très bon","rating":3}'.encode()
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), {'content': 'Très bon', 'rating': 3})
+        for invalid in (b'{"content":', b'{"rating":NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(invalid))
+
+    def test_api(self):
+        """Test that the API renders and parses with the fast classes"""
+        self.authenticate_user(self.user)
+        response = self.client.post(reverse('recipe-list'), self.valid_recipe_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        response = self.client.post(reverse('recipe-list'), b'{"title":', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('JSON parse error', response.json()['detail'])
+
+
+class CompressionTests(BaseTestCase):
+    """Tests for the gzip/brotli response compression (recipes/compression.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(
+            author=self.user, **dict(self.valid_recipe_data, instructions='Stir gently. ' * 500)
+        )
+        for i in range(3):
+            Comment.objects.create(recipe=self.recipe, author=self.other_user, content=f'Comment {i}')
+        self.detail_url = reverse('recipe-detail', args=[self.recipe.id])
+        self.comments_url = reverse('recipe-comments-list', kwargs={'recipe_pk': self.recipe.id})
+
+    def test_choose_encoding(self):
+        """Test the Accept-Encoding negotiation"""
+        encodings = ('br', 'gzip')
+        self.assertEqual(choose_encoding('gzip, deflate, br', encodings), 'br')
+        self.assertEqual(choose_encoding('br;q=0.5, gzip', encodings), 'gzip')
+        self.assertEqual(choose_encoding('br;q=0, *', encodings), 'gzip')
+        self.assertIsNone(choose_encoding('identity', encodings))
+        self.assertIsNone(choose_encoding('gzip;q=0', encodings))
+        self.assertIsNone(choose_encoding('', encodings))
+
+    def test_large_responses_are_compressed(self):
+        """Test that large responses are compressed, with a weak ETag"""
+        self.authenticate_user(self.user)
+        plain = self.client.get(self.detail_url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        response = self.client.get(self.detail_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content) / 5)
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        # Either ETag validates the cached copy
+        response = self.client.get(self.detail_url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_small_responses_are_not_compressed(self):
+        """Test that bodies under RECIPE_COMPRESSION_MIN_SIZE are sent as they are"""
+        response = self.client.get(self.comments_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertLess(len(response.content), 1024)
+        self.assertNotIn('Content-Encoding', response)
+        with override_settings(RECIPE_COMPRESSION_MIN_SIZE=100):
+            response = self.client.get(self.comments_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_html_and_cookies_are_not_compressed(self):
+        """Test that pages carrying a CSRF token or setting cookies are sent uncompressed (BREACH)"""
+        response = self.client.get('/admin/login/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'csrfmiddlewaretoken', response.content)
+        self.assertGreaterEqual(len(response.content), settings.RECIPE_COMPRESSION_MIN_SIZE)
+        self.assertNotIn('Content-Encoding', response)
+
+        response = HttpResponse(b'{"items": []}' * 200, content_type='application/json')
+        response.set_cookie('session', 'secret')
+        request = APIRequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', compress_response(request, response))
+
+    def test_streamed_responses(self):
+        """Test that streamed lists are compressed chunk by chunk"""
+        with mock.patch.object(StreamingListMixin, 'stream_chunk_size', 1):
+            response = self.client.get(self.comments_url, {'stream': 'true'}, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertNotIn('Content-Length', response)
+            decompressor = zlib.decompressobj(31)
+            chunks = [decompressor.decompress(chunk) for chunk in response.streaming_content]
+        # Every chunk can be decompressed on arrival
+        self.assertEqual(chunks[0], b'{"results":[')
+        self.assertTrue(chunks[1].startswith(b'{"id":'))
+        self.assertEqual(len(json.loads(b''.join(chunks))['results']), 3)
+        self.assertTrue(decompressor.eof)
+
+    @override_settings(ROOT_URLCONF='recipes.tests')
+    async def test_async_streamed_responses(self):
+        """Test that async streams are compressed as well"""
+        response = await self.async_client.get(self.comments_url, {'stream': 'true'}, headers={'Accept-Encoding': 'gzip'})
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(json.loads(gzip.decompress(content))['results']), 3)
+
+    def test_cached_responses_are_stored_compressed(self):
+        """Test that cache hits are served compressed without compressing again"""
+        first = self.client.get(self.detail_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with mock.patch('recipes.compression.gzip.compress', side_effect=AssertionError), \
+                mock.patch('recipes.compression.zlib.compressobj', side_effect=AssertionError):
+            hit = self.client.get(self.detail_url, HTTP_ACCEPT_ENCODING='gzip')
+            plain = self.client.get(self.detail_url)
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        self.assertEqual(hit['Content-Encoding'], 'gzip')
+        self.assertEqual(hit['ETag'], first['ETag'])
+        self.assertEqual(gzip.decompress(hit.content), gzip.decompress(first.content))
+        self.assertEqual(gzip.decompress(hit.content), plain.content)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        response = self.client.get(self.detail_url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=hit['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @unittest.skipUnless(brotli, 'brotli is not installed')
+    def test_brotli(self):
+        """Test that brotli is preferred when installed"""
+        response = self.client.get(self.detail_url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.client.get(self.detail_url).content)
+
+
+class TrendingTests(BaseTestCase):
+    """Tests for the time-decayed trending scores and the trending recipes"""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('recipe-trending')
+        self.quiet, self.commented, self.rated = (
+            Recipe.objects.create(author=self.user, **{**self.valid_recipe_data, 'title': title})
+            for title in ('Quiet', 'Commented', 'Rated')
+        )
+        for content in ('Great', 'Lovely'):
+            Comment.objects.create(recipe=self.commented, author=self.other_user, content=content)
+        DifficultyRating.objects.create(recipe=self.rated, rating_author=self.other_user, rating=3)
+
+    def get_scores(self):
+        return dict(Recipe.objects.values_list('pk', 'trending_score'))
+
+    def test_activity_raises_score(self):
+        """Test that comments and ratings raise the score, comments weighing more"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([recipe['id'] for recipe in response.data],
+                         [self.commented.id, self.rated.id, self.quiet.id])
+        # Creation (1) + two comments (3 each) against creation (1)
+        scores = self.get_scores()
+        self.assertAlmostEqual(trending.get_popularity(scores[self.commented.id]) /
+                               trending.get_popularity(scores[self.quiet.id]), 7, places=3)
+
+        self.authenticate_user(self.other_user)
+        response = self.client.get(self.url)
+        self.assertEqual([recipe['user_rating'] for recipe in response.data], [None, 3, None])
+
+    def test_rating_again_is_not_activity(self):
+        """Test that changing a rating, by any path, leaves the score as it is"""
+        score = self.get_scores()[self.rated.id]
+        self.authenticate_user(self.other_user)
+        ratings_url = reverse('recipe-difficulty-ratings-list', kwargs={'recipe_pk': self.rated.id})
+        rating = DifficultyRating.objects.get(recipe=self.rated)
+        for value in (1, 5, 2):
+            response = self.client.post(ratings_url, {'rating': value})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.patch(f'{ratings_url}{rating.id}/', {'rating': value})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.post(
+                reverse('bulk-write'), {'ratings': [{'recipe_id': self.rated.id, 'rating': value}]}, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(DifficultyRating.objects.get(pk=rating.pk).rating, 2)
+        self.assertAlmostEqual(self.get_scores()[self.rated.id], score, places=9)
+
+    def test_rebuild_matches_incremental_scores(self):
+        """Test that the rebuild command recomputes the maintained scores and drops removed activity"""
+        incremental = self.get_scores()
+        call_command('rebuild_trending_scores', stdout=StringIO())
+        rebuilt = self.get_scores()
+        for pk, score in incremental.items():
+            self.assertAlmostEqual(rebuilt[pk], score, places=4)
+
+        self.commented.comments.all().delete()
+        call_command('rebuild_trending_scores', stdout=StringIO())
+        self.assertAlmostEqual(self.get_scores()[self.commented.id], rebuilt[self.quiet.id], places=4)
+
+    def test_older_activity_weighs_less(self):
+        """Test that fresh activity outranks more activity from a few half-lives ago"""
+        Comment.objects.create(recipe=self.quiet, author=self.user, content='Fresh')
+        hours = settings.RECIPE_TRENDING_HALF_LIFE_HOURS * 4
+        Comment.objects.filter(recipe=self.commented).update(
+            created_at=timezone.now() - datetime.timedelta(hours=hours)
+        )
+        Recipe.objects.filter(pk=self.commented.pk).update(
+            created_at=timezone.now() - datetime.timedelta(hours=hours)
+        )
+        call_command('rebuild_trending_scores', stdout=StringIO())
+        response = self.client.get(self.url)
+        self.assertEqual([recipe['id'] for recipe in response.data][:2], [self.quiet.id, self.rated.id])
+
+    def test_query_count_and_limit(self):
+        """Test that the top recipes are read in one query, and the limit is validated"""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'limit': 2})
+        self.assertEqual(len(response.data), 2)
+        for limit in (0, 101, 'many'):
+            response = self.client.get(self.url, {'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,130 @@
+# recipes/trending.py
+
+'''
+Time-decayed trending scores of recipes.
+
+A recipe's popularity is the sum of its activity (its creation, comments,
+ratings; changing a rating isn't new activity), each event weighted by its kind and decayed by half every
+RECIPE_TRENDING_HALF_LIFE_HOURS hours:
+    popularity(now) = sum(weight * 2 ** -((now - at) / half_life))
+
+The decay applies to all recipes alike, so their order doesn't change with
+time, only with new activity. Recipe.trending_score therefore stores the
+popularity decayed to a fixed EPOCH instead of to now ("forward decay"),
+as a natural logarithm so it never overflows:
+    trending_score = ln(sum(weight * exp(rate * (at - EPOCH))))
+with rate = ln(2) / half_life. Ordering by trending_score is ordering by
+popularity, with an index. A new event adds its term to the stored
+logarithm in the UPDATE of the write (see add_activity), so scores are
+maintained without reading the activity tables.
+
+Removed comments and ratings aren't subtracted: their activity happened.
+`manage.py rebuild_trending_scores`, run periodically, recomputes the scores
+from the activity of the last WINDOW_HALF_LIVES half-lives (older activity
+weighs less than a billionth), which also picks up rows written in bulk
+without the model methods. Changing the half-life changes the meaning of
+the stored scores: rebuild them afterwards.
+'''
+
+import math
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db.models import Case, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone as django_timezone
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+# Weight of each kind of event
+CREATION_WEIGHT = 1
+COMMENT_WEIGHT = 3
+RATING_WEIGHT = 2
+
+# Activity older than this many half-lives is left out by rebuilds
+WINDOW_HALF_LIVES = 30
+
+# Score of "no activity" in SQL expressions, where a logarithm of 0 can't be used
+NO_ACTIVITY = -1e9
+
+
+def get_decay_rate():
+    """The decay rate, per second"""
+    return math.log(2) / (settings.RECIPE_TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def get_score(weight, at):
+    """The trending score of activity of the given weight at the given time"""
+    return math.log(weight) + get_decay_rate() * (at - EPOCH).total_seconds()
+
+
+def get_new_recipe_score():
+    """The trending score of a recipe created now (default of Recipe.trending_score)"""
+    return get_score(CREATION_WEIGHT, django_timezone.now())
+
+
+def get_popularity(score, now=None):
+    """The popularity of a trending score at a given time (now by default)"""
+    now = now or django_timezone.now()
+    return math.exp(score - get_decay_rate() * (now - EPOCH).total_seconds())
+
+
+def combine_scores(scores):
+    """The trending score of the activity of several scores (log-sum-exp)"""
+    highest = max(scores)
+    return highest + math.log(sum(math.exp(score - highest) for score in scores))
+
+
+def log_sum_exp(first, second):
+    """SQL expression combining two trending score expressions, see combine_scores"""
+    return Greatest(first, second) + Ln(Value(1.0) + Exp(-Abs(first - second)))
+
+
+def add_activity(score, weights, now=None):
+    """
+    SQL expression adding activity happening now to the score expression.
+    `weights` is the total weight of the activity, or a {recipe_id: weight}
+    dict for an UPDATE of several recipes.
+    """
+    now = now or django_timezone.now()
+    if isinstance(weights, dict):
+        added = Case(
+            *(When(pk=pk, then=Value(get_score(weight, now))) for pk, weight in weights.items() if weight),
+            default=Value(NO_ACTIVITY),
+            output_field=FloatField()
+        )
+    else:
+        added = Value(get_score(weights, now), output_field=FloatField())
+    return log_sum_exp(score, added)
+
+
+def get_window_start(now=None):
+    """The time before which activity is left out by rebuilds"""
+    now = now or django_timezone.now()
+    return now - timedelta(hours=settings.RECIPE_TRENDING_HALF_LIFE_HOURS * WINDOW_HALF_LIVES)
+
+
+def rebuild_scores(recipe_model, comment_model, rating_model, recipe_ids, now=None):
+    """
+    Recompute the trending scores of the given recipes from their creation
+    and recent activity, with one query per table and one UPDATE.
+    Takes the models as arguments, for migrations. Returns the number of
+    updated recipes.
+    """
+    since = get_window_start(now)
+    scores = {
+        pk: [get_score(CREATION_WEIGHT, created_at)]
+        for pk, created_at in recipe_model.objects.filter(pk__in=recipe_ids).values_list('pk', 'created_at')
+    }
+    activity = (
+        (comment_model.objects.filter(recipe_id__in=scores, created_at__gte=since), 'created_at', COMMENT_WEIGHT),
+        # A rating counts once, when it is created, however often it is changed
+        (rating_model.objects.filter(recipe_id__in=scores, created_at__gte=since), 'created_at', RATING_WEIGHT),
+    )
+    for queryset, field, weight in activity:
+        for recipe_id, at in queryset.order_by().values_list('recipe_id', field):
+            scores[recipe_id].append(get_score(weight, at))
+
+    recipes = [recipe_model(pk=pk, trending_score=combine_scores(values)) for pk, values in scores.items()]
+    recipe_model.objects.bulk_update(recipes, ['trending_score'])
+    return len(recipes)
@@ -1,7 +1,9 @@
 # recipe_hub_backend\recipes\urls.py
 
 from django.urls import path, include
+from .views import metrics_view
 
 urlpatterns = [
     path('api/', include('recipes.api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,3 +1,25 @@
-from django.shortcuts import render
+# recipe_hub_backend\recipes\views.py
 
-# Create your views here.
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from .metrics import registry
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Request metrics of this process in the Prometheus text format (see
+    recipes/metrics.py), for scrapers sending RECIPE_METRICS_TOKEN as a
+    bearer token and for staff users signed in to the admin. Without a token
+    configured, the endpoint doesn't exist for anyone else.
+    """
+    token = settings.RECIPE_METRICS_TOKEN
+    authorized = token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (authorized or request.user.is_staff):
+        if not token:
+            raise Http404
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,53 @@
+'''
+Setup shared by the benchmark scripts.
+
+setup() configures Django before the scripts import anything from it. All
+state a run creates is kept out of the project: the database is a SQLite file
+and the response and user caches are directories in a temporary work
+directory, and the throttle counters stay in process memory. run() calls the
+benchmark's main() and removes the work directory when it ends, however it
+ends.
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Get the project root directory (one level up from the script location)
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+work_dir = tempfile.mkdtemp(prefix='recipe_hub_benchmark_')
+
+
+def setup():
+    """Configure and set up Django, with all state in the work directory"""
+    os.environ['RESPONSE_CACHE_DIR'] = os.path.join(work_dir, 'response_cache')
+    os.environ['USER_CACHE_DIR'] = os.path.join(work_dir, 'user_cache')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recipe_hub_backend.settings')
+
+    import django
+    from django.conf import settings
+
+    settings.DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(work_dir, 'db.sqlite3'),
+        }
+    }
+    # Throttle counters in process memory, so that only the request handling is measured
+    settings.RECIPE_THROTTLE_STORE = {
+        'BACKEND': 'recipes.api.throttling.CacheThrottleStore',
+        'OPTIONS': {'alias': 'default'},
+    }
+    django.setup()
+
+
+def run(main):
+    """Run a benchmark's main(), then remove the work directory"""
+    try:
+        main()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
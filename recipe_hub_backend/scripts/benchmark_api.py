@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+'''
+Benchmark suite of the recipe API at realistic data sizes.
+
+Generates a synthetic dataset (manage.py generate_dataset: skewed popularity,
+deterministic for a given --seed) in a temporary SQLite database, then plays
+scripted scenarios through the full WSGI stack, one request at a time:
+- anonymous browse: recipe list pages, searches and comment lists, the way
+  visitors browse (served by the anonymous response cache when possible)
+- deep pagination: a signed-in user paging far into the recipe feed and into
+  the comments of the most commented recipe, with page numbers and cursors
+- rating storm: many users rating the most popular recipes at once, rating
+  some of them again
+- comment-heavy detail: signed-in users opening the most commented recipes
+  and their comments
+
+For every endpoint of every scenario it reports the latency percentiles, the
+average number of SQL queries per request, and the requests and result rows
+served per second.
+
+Baselines: --save-baseline writes the results to a JSON file, --baseline
+compares the run against one and exits with status 1 if any endpoint makes
+more queries per request than the baseline (beyond --query-tolerance). Query
+counts don't depend on the machine, so scripts/benchmark_baseline.json holds
+on any of them. Latencies do: with --latency-tolerance, an endpoint whose p95
+latency is that much above the baseline's (and at least --latency-floor ms
+above it, so that sub-millisecond noise doesn't count) is a regression too,
+which only makes sense against a baseline recorded on the same machine.
+
+Usage:
+    python scripts/benchmark_api.py [--users 100] [--recipes 1000] [--comments 10000]
+                                    [--ratings 5000] [--requests 200] [--seed 1]
+                                    [--save-baseline FILE] [--baseline FILE]
+                                    [--latency-tolerance 0.5]
+'''
+
+import argparse
+import io
+import json
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+import _bench
+
+_bench.setup()
+
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import connection
+from recipes.api.throttling import RecipeAnonThrottle, RecipeUserThrottle
+from recipes.api.tokens import RefreshToken
+from recipes.models import Recipe
+from recipes.management.commands.generate_dataset import DISHES, INGREDIENTS, WORDS
+
+DATASET_OPTIONS = ('users', 'recipes', 'comments', 'ratings', 'seed')
+
+
+class Client:
+    """Sends requests through the WSGI handler and records their latency and queries per endpoint"""
+    def __init__(self):
+        self.application = WSGIHandler()
+        self.results = {}
+        self.scenario = None
+        self.address = 0
+
+    def request(self, endpoint, method, url, token=None, data=None):
+        url = urlsplit(url)
+        body = json.dumps(data).encode() if data is not None else b''
+        # Every anonymous request comes from its own address, like visitors do
+        self.address += 1
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'HTTP_HOST': 'localhost',
+            'REMOTE_ADDR': f'10.{self.address >> 16 & 255}.{self.address >> 8 & 255}.{self.address & 255}',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.url_scheme': 'http',
+        }
+        if token:
+            environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        statuses = []
+        with connection.execute_wrapper(count_queries):
+            started = time.perf_counter()
+            response = self.application(environ, lambda status, headers: statuses.append(status))
+            content = b''.join(response)
+            response.close()
+            elapsed = time.perf_counter() - started
+        if not statuses[0].startswith(('200', '201')):
+            raise RuntimeError(f'{method} {url.path}?{url.query} answered {statuses[0]}')
+
+        payload = json.loads(content)
+        results = payload.get('results') if isinstance(payload, dict) else payload
+        rows = len(results) if isinstance(results, list) else 1
+        stats = self.results.setdefault((self.scenario, endpoint), {'latencies': [], 'queries': 0, 'rows': 0})
+        stats['latencies'].append(elapsed)
+        stats['queries'] += queries
+        stats['rows'] += rows
+        return payload
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def skewed_choice(rng, values):
+    """Pick from values sorted by popularity, the first ones much more often"""
+    return values[min(len(values) - 1, int(rng.paretovariate(1.2)) - 1)]
+
+
+def anonymous_browse(client, rng, data, requests):
+    pages = -(-data['recipe_count'] // 10)
+    for _ in range(requests):
+        kind = rng.random()
+        if kind < 0.5:
+            page = min(pages, skewed_choice(rng, range(1, 11)))
+            client.request('GET /recipes/', 'GET', f'/api/recipes/?page={page}')
+        elif kind < 0.75:
+            query = rng.choice((rng.choice(WORDS), rng.choice(DISHES), rng.choice(INGREDIENTS)))
+            client.request('GET /recipes/search/', 'GET', f'/api/recipes/search/?q={query}')
+        else:
+            recipe_id = skewed_choice(rng, data['popular'])
+            client.request('GET /recipes/{id}/comments/', 'GET', f'/api/recipes/{recipe_id}/comments/')
+
+
+def deep_pagination(client, rng, data, requests):
+    token = data['tokens'][0]
+    pages = -(-data['recipe_count'] // 10)
+    for _ in range(requests // 4):
+        page = rng.randint(max(1, pages - pages // 4), pages)
+        client.request('GET /recipes/?page=N', 'GET', f'/api/recipes/?page={page}', token)
+    remaining = requests - requests // 4
+    feed_url = '/api/recipes/?pagination=cursor'
+    comments_url = f'/api/recipes/{data["popular"][0]}/comments/'
+    for number in range(remaining):
+        if number % 2:
+            payload = client.request('GET /recipes/?cursor', 'GET', feed_url, token)
+            feed_url = payload['next'] or '/api/recipes/?pagination=cursor'
+        else:
+            payload = client.request('GET /recipes/{id}/comments/?cursor', 'GET', comments_url, token)
+            comments_url = payload['next'] or f'/api/recipes/{data["popular"][0]}/comments/'
+
+
+def rating_storm(client, rng, data, requests):
+    hot = data['popular'][:5]
+    for _ in range(requests):
+        recipe_id = rng.choice(hot)
+        client.request(
+            'POST /recipes/{id}/difficulty-ratings/', 'POST', f'/api/recipes/{recipe_id}/difficulty-ratings/',
+            rng.choice(data['tokens']), {'rating': rng.randint(1, 5)}
+        )
+
+
+def comment_heavy_detail(client, rng, data, requests):
+    for _ in range(requests // 2):
+        recipe_id = skewed_choice(rng, data['popular'][:20])
+        token = rng.choice(data['tokens'])
+        client.request('GET /recipes/{id}/', 'GET', f'/api/recipes/{recipe_id}/', token)
+        client.request('GET /recipes/{id}/comments/', 'GET', f'/api/recipes/{recipe_id}/comments/', token)
+
+
+SCENARIOS = (
+    ('anonymous browse', anonymous_browse),
+    ('deep pagination', deep_pagination),
+    ('rating storm', rating_storm),
+    ('comment-heavy detail', comment_heavy_detail),
+)
+
+
+def summarize(results):
+    summary = {}
+    for (scenario, endpoint), stats in results.items():
+        latencies = stats['latencies']
+        total = sum(latencies)
+        summary[f'{scenario} | {endpoint}'] = {
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'queries_per_request': round(stats['queries'] / len(latencies), 3),
+            'requests_per_second': round(len(latencies) / total, 1),
+            'rows_per_second': round(stats['rows'] / total, 1),
+        }
+    return summary
+
+
+def compare(summary, baseline, args):
+    """Return the list of regressions of the summary against the baseline"""
+    regressions = []
+    for name, base in baseline['endpoints'].items():
+        current = summary.get(name)
+        if current is None:
+            regressions.append(f'{name}: missing from this run')
+            continue
+        if current['queries_per_request'] > base['queries_per_request'] + args.query_tolerance:
+            regressions.append(
+                f'{name}: {current["queries_per_request"]:g} queries per request, '
+                f'baseline {base["queries_per_request"]:g}'
+            )
+        if args.latency_tolerance is None:
+            continue
+        limit = max(base['p95_ms'] * (1 + args.latency_tolerance), base['p95_ms'] + args.latency_floor)
+        if current['p95_ms'] > limit:
+            regressions.append(f'{name}: p95 {current["p95_ms"]:.2f} ms, baseline {base["p95_ms"]:.2f} ms')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100, help='Generated users (default: 100)')
+    parser.add_argument('--recipes', type=int, default=1000, help='Generated recipes (default: 1000)')
+    parser.add_argument('--comments', type=int, default=10000, help='Generated comments (default: 10000)')
+    parser.add_argument('--ratings', type=int, default=5000, help='Generated ratings (default: 5000)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the dataset and the scenarios (default: 1)')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario (default: 200)')
+    parser.add_argument('--baseline', help='Compare against this baseline file and fail on regressions')
+    parser.add_argument('--save-baseline', help='Write the results to this baseline file')
+    parser.add_argument('--query-tolerance', type=float, default=0,
+                        help='Allowed increase of the queries per request (default: 0)')
+    parser.add_argument('--latency-tolerance', type=float,
+                        help='Also fail when the p95 latency grew by more than this fraction, e.g. 0.5 for +50%%, '
+                             'against a baseline from the same machine (default: latencies are not compared)')
+    parser.add_argument('--latency-floor', type=float, default=2,
+                        help='p95 increases below this many ms are ignored (default: 2)')
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    started = time.perf_counter()
+    call_command(
+        'generate_dataset', users=args.users, recipes=args.recipes, comments=args.comments,
+        ratings=args.ratings, seed=args.seed, username_prefix='benchmark'
+    )
+    print(f'Dataset generated in {time.perf_counter() - started:.1f}s\n')
+
+    # Rate limits out of the way, the scenarios send far more requests than one client would
+    RecipeUserThrottle.rate = RecipeAnonThrottle.rate = '1000000/minute'
+    users = list(User.objects.filter(username__startswith='benchmark').order_by('pk'))
+    data = {
+        'recipe_count': Recipe.objects.count(),
+        'popular': list(Recipe.objects.order_by('-comment_count', 'pk').values_list('pk', flat=True)[:100]),
+        'tokens': [str(RefreshToken.for_user(user).access_token) for user in users],
+    }
+
+    client = Client()
+    for scenario, play in SCENARIOS:
+        client.scenario = scenario
+        play(client, random.Random(f'{args.seed}-{scenario}'), data, args.requests)
+    summary = summarize(client.results)
+
+    print(f'{"scenario | endpoint":<66}{"reqs":>6}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+          f'{"queries":>9}{"req/s":>8}{"rows/s":>9}')
+    for name, stats in summary.items():
+        print(f'{name:<66}{stats["requests"]:>6}{stats["p50_ms"]:>9.2f}{stats["p95_ms"]:>9.2f}'
+              f'{stats["p99_ms"]:>9.2f}{stats["queries_per_request"]:>9.2f}'
+              f'{stats["requests_per_second"]:>8.0f}{stats["rows_per_second"]:>9.0f}')
+
+    dataset = {option: getattr(args, option) for option in DATASET_OPTIONS}
+    dataset['requests'] = args.requests
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump({'dataset': dataset, 'endpoints': summary}, baseline_file, indent=2)
+            baseline_file.write('\n')
+        print(f'\nBaseline written to {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['dataset'] != dataset:
+            print(f'\nThe baseline was recorded with other options: {baseline["dataset"]}')
+            sys.exit(2)
+        regressions = compare(summary, baseline, args)
+        if regressions:
+            print(f'\n{len(regressions)} regressions against {args.baseline}:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print(f'\nNo regressions against {args.baseline}')
+
+
+if __name__ == '__main__':
+    _bench.run(main)
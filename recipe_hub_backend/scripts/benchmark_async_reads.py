@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+'''
+Load test of the async read path against the sync views.
+
+Serves recipe and comment reads through the full Django stack, the way the
+two kinds of deployments do:
+- WSGI: the sync views, in a worker with --wsgi-threads threads
+- ASGI: the async read views (RECIPE_ASYNC_READS), on one event loop
+In both cases --concurrency clients keep a request in flight at all times, so
+with more clients than WSGI threads the extra requests queue for a thread.
+Reports the throughput and the latency percentiles seen by the clients.
+
+Requests are authenticated with a JWT issued like the API's, with the user's
+claims, so they are authenticated without a query or cache read and are not
+answered by the anonymous response cache. The database is a temporary SQLite file, and every
+query is delayed by --query-delay milliseconds to stand in for the network
+round trip to a MySQL server, which is the time async views don't spend
+holding a thread.
+
+Usage:
+    python scripts/benchmark_async_reads.py [--requests 2000] [--concurrency 32]
+                                            [--wsgi-threads 8] [--query-delay 2]
+'''
+
+import argparse
+import asyncio
+import io
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import _bench
+
+_bench.setup()
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import include, path
+from django.contrib.auth.models import User
+from recipes.api.throttling import RecipeAnonThrottle, RecipeUserThrottle
+from recipes.api.tokens import RefreshToken
+from recipes.api.urls import build_urlpatterns
+from recipes.models import Recipe, Comment, DifficultyRating
+
+
+def build_urlconf(async_reads):
+    """A URLconf module serving the API with or without the async read views"""
+    urlconf = types.ModuleType(f'benchmark_urls_{"async" if async_reads else "sync"}')
+    urlconf.urlpatterns = [path('api/', include(build_urlpatterns(async_reads=async_reads)))]
+    return urlconf
+
+
+def delay_queries(delay):
+    """Delay every query of every new connection by `delay` seconds"""
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    def add_wrapper(sender, connection, **kwargs):
+        connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(add_wrapper, weak=False)
+
+
+def create_data(recipes, comments):
+    """Create recipes with comments and ratings to serve, return (recipe, token)"""
+    author = User.objects.create_user(username='benchmark', password='Benchmark123')
+    for i in range(recipes):
+        recipe = Recipe.objects.create(
+            title=f'Benchmark recipe {i}',
+            description='Recipe used by the async read benchmark',
+            ingredients='Flour\nWater',
+            instructions='Mix and bake',
+            cooking_time=30,
+            author=author
+        )
+    Comment.objects.bulk_create([
+        Comment(recipe=recipe, author=author, content=f'Comment {i}') for i in range(comments)
+    ])
+    DifficultyRating.objects.create(recipe=recipe, rating_author=author, rating=3)
+    return recipe, str(RefreshToken.for_user(author).access_token)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_clients(send, requests, concurrency):
+    """Keep `concurrency` requests in flight until `requests` were sent, return their latencies"""
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def client():
+        for _ in remaining:
+            started = time.perf_counter()
+            await send()
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+def wsgi_sender(path, token, executor):
+    application = WSGIHandler()
+    loop = asyncio.get_running_loop()
+
+    def call():
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'HTTP_HOST': 'localhost',
+            'HTTP_AUTHORIZATION': f'Bearer {token}',
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.url_scheme': 'http',
+        }
+        statuses = []
+        response = application(environ, lambda status, headers: statuses.append(status))
+        b''.join(response)
+        response.close()
+        if not statuses[0].startswith('200'):
+            raise RuntimeError(f'{path} answered {statuses[0]}')
+
+    async def send():
+        await loop.run_in_executor(executor, call)
+
+    return send
+
+
+def asgi_sender(path, token):
+    application = get_asgi_application()
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 50000),
+        'server': ('localhost', 80),
+    }
+
+    async def send():
+        messages = []
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # The client stays connected until the response is complete
+            await asyncio.Event().wait()
+
+        async def send_message(message):
+            messages.append(message)
+
+        await application(dict(scope), receive, send_message)
+        if messages[0]['status'] != 200:
+            raise RuntimeError(f'{path} answered {messages[0]["status"]}')
+
+    return send
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per run (default: 2000)')
+    parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight (default: 32)')
+    parser.add_argument('--wsgi-threads', type=int, default=8, help='Threads of the WSGI worker (default: 8)')
+    parser.add_argument('--query-delay', type=float, default=2,
+                        help='Simulated database round trip per query in ms (default: 2)')
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    recipe, token = create_data(recipes=30, comments=30)
+    connections.close_all()
+    delay_queries(args.query_delay / 1000)
+    # Rate limits out of the way, all requests come from the same user
+    RecipeUserThrottle.rate = RecipeAnonThrottle.rate = '1000000/minute'
+
+    urlconfs = {False: build_urlconf(async_reads=False), True: build_urlconf(async_reads=True)}
+    scenarios = [
+        ('recipe list', '/api/recipes/'),
+        ('recipe detail', f'/api/recipes/{recipe.pk}/'),
+        ('comment list', f'/api/recipes/{recipe.pk}/comments/'),
+    ]
+
+    print(f'{args.requests} requests per run, {args.concurrency} in flight, '
+          f'{args.wsgi_threads} WSGI threads, {args.query_delay:g} ms per query\n')
+    print(f'{"scenario":<16}{"mode":<6}{"req/s":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}')
+    for label, url in scenarios:
+        for mode in ('WSGI', 'ASGI'):
+            settings.ROOT_URLCONF = urlconfs[mode == 'ASGI']
+
+            async def run():
+                if mode == 'ASGI':
+                    return await run_clients(asgi_sender(url, token), args.requests, args.concurrency)
+                with ThreadPoolExecutor(max_workers=args.wsgi_threads) as executor:
+                    return await run_clients(wsgi_sender(url, token, executor), args.requests, args.concurrency)
+
+            started = time.perf_counter()
+            latencies = asyncio.run(run())
+            elapsed = time.perf_counter() - started
+
+            print(f'{label:<16}{mode:<6}{args.requests / elapsed:>8.0f}'
+                  f'{percentile(latencies, 0.5) * 1000:>9.2f}{percentile(latencies, 0.95) * 1000:>9.2f}'
+                  f'{percentile(latencies, 0.99) * 1000:>9.2f}')
+
+
+if __name__ == '__main__':
+    _bench.run(main)
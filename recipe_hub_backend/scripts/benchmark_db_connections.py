@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+'''
+Benchmark of the per-request database connection overhead.
+
+Serves the comment list of a recipe through the full WSGI stack, from several
+threads at once, the way a threaded worker does: once with CONN_MAX_AGE=0 (a
+new connection for every request) and once with persistent connections and
+health checks.
+
+The database is a temporary SQLite file. SQLite connects in microseconds,
+so each new connection is delayed by --connect-delay milliseconds to stand in
+for the TCP handshake and authentication of a MySQL server.
+
+Usage:
+    python scripts/benchmark_db_connections.py [--requests 2000] [--concurrency 8]
+                                               [--connect-delay 5] [--conn-max-age 60]
+'''
+
+import argparse
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import _bench
+
+_bench.setup()
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.contrib.auth.models import User
+from recipes.models import Recipe, Comment
+
+
+class ConnectionCounter:
+    """Counts new database connections and delays each one by a fixed time"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.delay = 0
+        self.count = 0
+
+    def install(self):
+        connect = DatabaseWrapper.get_new_connection
+        counter = self
+
+        def get_new_connection(wrapper, conn_params):
+            with counter.lock:
+                counter.count += 1
+            time.sleep(counter.delay)
+            return connect(wrapper, conn_params)
+
+        DatabaseWrapper.get_new_connection = get_new_connection
+
+
+def create_data(comments):
+    """Create a recipe with some comments to serve"""
+    author = User.objects.create_user(username='benchmark', password='Benchmark123')
+    recipe = Recipe.objects.create(
+        title='Benchmark recipe',
+        description='Recipe used by the connection benchmark',
+        ingredients='Flour\nWater',
+        instructions='Mix and bake',
+        cooking_time=30,
+        author=author
+    )
+    Comment.objects.bulk_create([
+        Comment(recipe=recipe, author=author, content=f'Comment {i}') for i in range(comments)
+    ])
+    return recipe
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(application, path, requests, concurrency):
+    """Send `requests` GET requests from `concurrency` threads and return their latencies"""
+    latencies = []
+    lock = threading.Lock()
+
+    def send(number):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'HTTP_HOST': 'localhost',
+            # Every request comes from its own address, so the rate limits don't cap the load
+            'REMOTE_ADDR': f'10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.url_scheme': 'http',
+        }
+        statuses = []
+        started = time.perf_counter()
+        response = application(environ, lambda status, headers: statuses.append(status))
+        b''.join(response)
+        response.close()  # Fires request_finished, where Django closes expired connections
+        elapsed = time.perf_counter() - started
+        if not statuses[0].startswith('200'):
+            raise RuntimeError(f'{path} answered {statuses[0]}')
+        with lock:
+            latencies.append(elapsed)
+
+    # A fresh pool per run: every thread opens its own connection, as in a threaded worker
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(requests)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per run (default: 2000)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent threads (default: 8)')
+    parser.add_argument('--connect-delay', type=float, default=5,
+                        help='Simulated connection setup time in ms (default: 5)')
+    parser.add_argument('--conn-max-age', type=int, default=60,
+                        help='CONN_MAX_AGE of the persistent run in seconds (default: 60)')
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    recipe = create_data(comments=20)
+    connections.close_all()
+
+    counter = ConnectionCounter()
+    counter.install()
+    counter.delay = args.connect_delay / 1000
+    application = WSGIHandler()
+    path = f'/api/recipes/{recipe.pk}/comments/'
+
+    print(f'{args.requests} requests to {path} from {args.concurrency} threads, '
+          f'{args.connect_delay:g} ms per new connection\n')
+    print(f'{"mode":<34}{"req/s":>8}{"p50 ms":>9}{"p95 ms":>9}{"connections":>13}')
+    for label, max_age, health_checks in (
+        ('CONN_MAX_AGE=0', 0, False),
+        (f'CONN_MAX_AGE={args.conn_max_age} + health checks', args.conn_max_age, True),
+    ):
+        # Connections created by the new threads read these settings
+        connections.settings['default']['CONN_MAX_AGE'] = max_age
+        connections.settings['default']['CONN_HEALTH_CHECKS'] = health_checks
+        counter.count = 0
+
+        started = time.perf_counter()
+        latencies = run(application, path, args.requests, args.concurrency)
+        elapsed = time.perf_counter() - started
+
+        print(f'{label:<34}{args.requests / elapsed:>8.0f}'
+              f'{percentile(latencies, 0.5) * 1000:>9.2f}{percentile(latencies, 0.95) * 1000:>9.2f}'
+              f'{counter.count:>13}')
+
+
+if __name__ == '__main__':
+    _bench.run(main)
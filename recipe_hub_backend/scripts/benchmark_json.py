@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+'''
+Micro-benchmark of the API's JSON renderer and parser: DRF's stdlib
+JSONRenderer/JSONParser against FastJSONRenderer/FastJSONParser with orjson
+(recipes/api/renderers.py).
+
+Payloads have the shape of real responses: a recipe list page, a recipe
+detail with its comments, and a streamed list of recipes. Instructions and
+descriptions are long and hold non-ASCII text (--instructions characters).
+Reports the MB/s rendered and parsed by both implementations, and fails if
+the two renderers' outputs differ.
+
+Usage:
+    python scripts/benchmark_json.py [--repeat 200] [--instructions 4000]
+'''
+
+import argparse
+import sys
+import time
+from io import BytesIO
+
+import _bench
+
+_bench.setup()
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from recipes.api.renderers import FastJSONParser, FastJSONRenderer, orjson
+
+TEXT = 'Préchauffer le four à 180 °C, mélanger la crème et les œufs. Step "2": bake \\ rest. '
+
+
+def user(i):
+    return {'id': i, 'username': f'cook{i}', 'email': f'cook{i}@example.com'}
+
+
+def recipe(i, instructions_length):
+    return {
+        'id': i,
+        'title': f'Crème brûlée n°{i}',
+        'description': (TEXT * 4)[:300],
+        'ingredients': 'Cream\nEggs\nSugar\nVanilla',
+        'instructions': (TEXT * (instructions_length // len(TEXT) + 1))[:instructions_length],
+        'cooking_time': 45,
+        'created_at': '2024-05-01T12:30:15.123456Z',
+        'updated_at': '2024-05-02T08:00:00Z',
+        'author': user(i % 50),
+        'comment_count': 12,
+        'average_difficulty': 3.25,
+        'user_rating': None,
+    }
+
+
+def build_payloads(instructions_length):
+    summary = {key: value for key, value in recipe(0, 0).items() if key not in ('ingredients', 'instructions')}
+    comments = [
+        {'id': i, 'recipe': 1, 'author': user(i), 'content': TEXT * 3,
+         'created_at': '2024-05-01T12:30:15Z', 'updated_at': '2024-05-01T12:30:15Z'}
+        for i in range(50)
+    ]
+    return [
+        ('list page', {'count': 5000, 'next': 'http://localhost/api/recipes/?page=2', 'previous': None,
+                       'results': [dict(summary, id=i) for i in range(10)]}),
+        ('detail', dict(recipe(1, instructions_length), comments=comments)),
+        ('stream chunk', [recipe(i, instructions_length) for i in range(500)]),
+    ]
+
+
+def best_time(function, repeat):
+    """The best time of a call, over `repeat` batches of calls"""
+    best = float('inf')
+    batch = 10
+    for _ in range(max(1, repeat // batch)):
+        started = time.perf_counter()
+        for _ in range(batch):
+            function()
+        best = min(best, (time.perf_counter() - started) / batch)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200, help='Calls per measurement (default: 200)')
+    parser.add_argument('--instructions', type=int, default=4000,
+                        help='Characters of recipe instructions (default: 4000)')
+    args = parser.parse_args()
+    if orjson is None:
+        sys.exit('orjson is not installed: FastJSONRenderer falls back to the stdlib')
+
+    stdlib_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+    stdlib_parser, fast_parser = JSONParser(), FastJSONParser()
+    print(f'{"payload":<14}{"step":<8}{"KB":>8}{"stdlib MB/s":>13}{"orjson MB/s":>13}{"speedup":>9}')
+    for label, data in build_payloads(args.instructions):
+        encoded = stdlib_renderer.render(data)
+        if fast_renderer.render(data) != encoded:
+            raise RuntimeError(f'{label}: the renderers returned different bodies')
+        size = len(encoded) / 1e6
+        steps = [
+            ('render', lambda: stdlib_renderer.render(data), lambda: fast_renderer.render(data)),
+            ('parse', lambda: stdlib_parser.parse(BytesIO(encoded)), lambda: fast_parser.parse(BytesIO(encoded))),
+        ]
+        for step, stdlib, fast in steps:
+            stdlib_time = best_time(stdlib, args.repeat)
+            fast_time = best_time(fast, args.repeat)
+            print(f'{label:<14}{step:<8}{size * 1000:>8.0f}{size / stdlib_time:>13.0f}'
+                  f'{size / fast_time:>13.0f}{stdlib_time / fast_time:>8.1f}x')
+
+
+if __name__ == '__main__':
+    _bench.run(main)
@@ -33,6 +33,11 @@ def populate_database():
         
         # Load the fixture
         call_command('loaddata', 'recipe_hub_sample_data', verbosity=1)
+        # loaddata bypasses model save(), so recalculate the recipe aggregates,
+        # structured ingredients and trending scores
+        call_command('rebuild_recipe_aggregates')
+        call_command('rebuild_recipe_ingredients')
+        call_command('rebuild_trending_scores')
         print('Successfully loaded sample data!')
         
     except Exception as e: